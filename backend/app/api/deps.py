@@ -1,55 +1,92 @@
 """
-通用依赖：限流等
+通用依赖：限流、客户端信息、条件请求等
 """
 from typing import Optional
 
-from fastapi import Depends, HTTPException, Request
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.database import get_db
 from app.schemas.auth import UserResponse
 from app.api.v1.auth import get_current_active_user
 from app.services.rate_limit_service import (
     check_and_incr_upload,
     check_and_incr_conversation,
     check_and_incr_search_qps,
+    seconds_until_utc_midnight,
 )
+from app.services.file_service import FileService
+from app.services.knowledge_base_service import KnowledgeBaseService
+
+
+def get_file_service(db: AsyncSession = Depends(get_db)) -> FileService:
+    """每个请求一个 FileService，与处理函数中的 db 为同一会话（FastAPI 依赖按请求缓存）。"""
+    return FileService(db)
+
+
+def get_kb_service(db: AsyncSession = Depends(get_db)) -> KnowledgeBaseService:
+    """每个请求一个 KnowledgeBaseService，与处理函数中的 db 为同一会话。"""
+    return KnowledgeBaseService(db)
+
+
+def _rate_limit_headers(limit: float, count: int, reset_sec: int) -> dict:
+    """X-RateLimit-* 响应头：上限、剩余次数、距重置秒数。"""
+    limit_int = int(limit)
+    return {
+        "X-RateLimit-Limit": str(limit_int),
+        "X-RateLimit-Remaining": str(max(0, limit_int - count)),
+        "X-RateLimit-Reset": str(reset_sec),
+    }
 
 
 async def require_upload_rate_limit(
+    response: Response,
     current_user: UserResponse = Depends(get_current_active_user),
 ) -> UserResponse:
     """上传限流：超出每日上传次数返回 429。"""
-    allowed, n, limit = check_and_incr_upload(current_user.id)
+    allowed, n, limit = await check_and_incr_upload(current_user.id)
+    headers = _rate_limit_headers(limit, n, seconds_until_utc_midnight())
     if not allowed:
         raise HTTPException(
             status_code=429,
             detail=f"每日上传次数已达上限（{limit}），请明日再试或联系管理员",
+            headers=headers,
         )
+    response.headers.update(headers)
     return current_user
 
 
 async def require_chat_rate_limit(
+    response: Response,
     current_user: UserResponse = Depends(get_current_active_user),
 ) -> UserResponse:
     """对话限流：超出每日对话条数返回 429。"""
-    allowed, n, limit = check_and_incr_conversation(current_user.id)
+    allowed, n, limit = await check_and_incr_conversation(current_user.id)
+    headers = _rate_limit_headers(limit, n, seconds_until_utc_midnight())
     if not allowed:
         raise HTTPException(
             status_code=429,
             detail=f"每日对话条数已达上限（{limit}），请明日再试或联系管理员",
+            headers=headers,
         )
+    response.headers.update(headers)
     return current_user
 
 
 async def require_search_rate_limit(
+    response: Response,
     current_user: UserResponse = Depends(get_current_active_user),
 ) -> UserResponse:
     """检索限流：超出 QPS 返回 429。"""
-    allowed, n, limit_qps = check_and_incr_search_qps(current_user.id)
+    allowed, n, limit_qps = await check_and_incr_search_qps(current_user.id)
+    headers = _rate_limit_headers(limit_qps if limit_qps >= 1 else 1, n, 1)
     if not allowed:
         raise HTTPException(
             status_code=429,
             detail=f"检索请求过于频繁，请稍后再试（QPS 上限 {limit_qps}）",
+            headers=headers,
         )
+    response.headers.update(headers)
     return current_user
 
 
@@ -74,3 +111,18 @@ def trace_id_from_request(request: Request) -> Optional[str]:
         or request.headers.get("X-Request-ID")
         or getattr(request.state, "request_id", None)
     )
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 是否命中给定 ETag（支持逗号分隔多值与 *；弱比较，忽略 W/ 前缀）。"""
+    inm = request.headers.get("if-none-match")
+    if not inm:
+        return False
+    if inm.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for tag in inm.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == target:
+            return True
+    return False
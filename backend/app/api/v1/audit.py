@@ -1,13 +1,19 @@
 """操作审计 API"""
+from datetime import datetime
+from typing import Optional
+
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select, func
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select, func, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_db_ro
+from app.core.config import settings
 from app.models.audit_log import AuditLog
-from app.schemas.audit import AuditLogItem, AuditLogListResponse
+from app.schemas.audit import AuditLogListResponse
 from app.api.v1.auth import get_current_active_user
 from app.schemas.auth import UserResponse
+from app.services import cache_service
 
 router = APIRouter()
 
@@ -18,26 +24,77 @@ async def list_audit_logs(
     page_size: int = Query(20, ge=1, le=100),
     action: str = Query(None, description="按操作类型筛选"),
     resource_type: str = Query(None, description="按资源类型筛选"),
+    before_id: Optional[int] = Query(None, description="游标分页：上一页 next_cursor.id"),
+    before_created_at: Optional[datetime] = Query(None, description="游标分页：上一页 next_cursor.created_at"),
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db_ro),
 ):
-    """查询审计日志（当前用户自己的操作记录）。"""
-    offset = (page - 1) * page_size
-    stmt = select(AuditLog).where(AuditLog.user_id == current_user.id)
-    count_stmt = select(func.count()).select_from(AuditLog).where(AuditLog.user_id == current_user.id)
+    """查询审计日志（当前用户自己的操作记录）。传入游标时按 (created_at, id) 倒序续读，不再 OFFSET 扫描。"""
+    conditions = [AuditLog.user_id == current_user.id]
     if action:
-        stmt = stmt.where(AuditLog.action == action)
-        count_stmt = count_stmt.where(AuditLog.action == action)
+        conditions.append(AuditLog.action == action)
     if resource_type:
-        stmt = stmt.where(AuditLog.resource_type == resource_type)
-        count_stmt = count_stmt.where(AuditLog.resource_type == resource_type)
-    total = (await db.execute(count_stmt)).scalar() or 0
-    stmt = stmt.order_by(AuditLog.created_at.desc()).offset(offset).limit(page_size)
-    result = await db.execute(stmt)
-    items = result.scalars().all()
-    return AuditLogListResponse(
-        items=[AuditLogItem.model_validate(x) for x in items],
-        total=total,
-        page=page,
-        page_size=page_size,
-    )
+        conditions.append(AuditLog.resource_type == resource_type)
+
+    # total 按筛选条件短时缓存；未命中且是首页（非游标）时用 COUNT(*) OVER() 与列表同一次往返取回
+    count_key = cache_service.key_audit_count(current_user.id, action, resource_type)
+    total = await cache_service.aget(count_key)
+    use_cursor = before_id is not None and before_created_at is not None
+    with_window_count = total is None and not use_cursor and page == 1
+
+    if with_window_count:
+        stmt = select(AuditLog, func.count().over().label("total"))
+    else:
+        stmt = select(AuditLog)
+    stmt = stmt.where(*conditions)
+    if use_cursor:
+        stmt = stmt.where(
+            or_(
+                AuditLog.created_at < before_created_at,
+                and_(AuditLog.created_at == before_created_at, AuditLog.id < before_id),
+            )
+        )
+    else:
+        stmt = stmt.offset((page - 1) * page_size)
+    stmt = stmt.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(page_size)
+    # 流式读取并直接组装 dict，由 orjson 序列化；跳过 ORM -> Pydantic -> JSON 的逐行二次构造
+    result = await db.stream(stmt.execution_options(yield_per=50))
+    items = []
+    async for row in result:
+        x = row[0]
+        if with_window_count and total is None:
+            total = row[1]
+        items.append({
+            "id": x.id,
+            "user_id": x.user_id,
+            "action": x.action,
+            "resource_type": x.resource_type,
+            "resource_id": x.resource_id,
+            "detail": x.detail,
+            "ip": x.ip,
+            "request_id": x.request_id,
+            "trace_id": x.trace_id,
+            "created_at": x.created_at,
+        })
+
+    if total is None:
+        if with_window_count:
+            total = 0  # 首页无行即总数为 0
+        else:
+            count_stmt = select(func.count()).select_from(AuditLog).where(*conditions)
+            total = (await db.execute(count_stmt)).scalar() or 0
+        ttl = getattr(settings, "CACHE_TTL_AUDIT_COUNT", 30)
+        await cache_service.aset(count_key, total, ttl)
+
+    next_cursor = None
+    if len(items) == page_size:
+        last = items[-1]
+        next_cursor = {"id": last["id"], "created_at": last["created_at"]}
+    # response_model 仅用于 OpenAPI 文档；直接返回 Response 不再做出参校验
+    return ORJSONResponse({
+        "items": items,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "next_cursor": next_cursor,
+    })
@@ -2,7 +2,7 @@
 认证相关API
 """
 import logging
-from fastapi import APIRouter, Depends, Form, HTTPException, status
+from fastapi import APIRouter, Depends, Form, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
@@ -11,7 +11,8 @@ from jose import JWTError, jwt
 from app.core.database import get_db
 from app.core.config import settings
 from app.schemas.auth import Token, UserCreate, UserResponse, UpdatePasswordRequest
-from app.services.auth_service import AuthService
+from app.services.auth_service import AuthService, get_auth_service, invalidate_user_cache, resolve_user_from_token
+from app.services.token_cache import invalidate_token_cache
 from app.services.user_service import UserService
 
 router = APIRouter()
@@ -22,13 +23,13 @@ logger = logging.getLogger(__name__)
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(
     user_data: UserCreate,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    auth_service: AuthService = Depends(get_auth_service),
 ):
     """用户注册"""
     logger.debug("auth register attempt username=%s", user_data.username)
-    auth_service = AuthService(db)
     try:
-        user = await auth_service.register_user(user_data)
+        user = await auth_service.register_user(db, user_data)
         logger.debug("auth register success user_id=%s username=%s", user.id, user.username)
         return user
     except ValueError as e:
@@ -46,11 +47,11 @@ async def login(
     username: str = Form(..., description="用户名"),
     password: str = Form(..., description="密码"),
     db: AsyncSession = Depends(get_db),
+    auth_service: AuthService = Depends(get_auth_service),
 ):
     """用户登录（使用 Form 避免 FastAPI 0.104 + Pydantic v2 下 OAuth2PasswordRequestForm 的 field_info.in_ 兼容问题）"""
     logger.debug("auth login attempt username=%s", username)
-    auth_service = AuthService(db)
-    user = await auth_service.authenticate_user(username, password)
+    user = await auth_service.authenticate_user(db, username, password)
     
     if not user:
         logger.debug("auth login failed username=%s", username)
@@ -65,6 +66,7 @@ async def login(
     await db.execute(update(User).where(User.id == user.id).values(last_login_at=func.now()))
     await db.commit()
     await db.refresh(user)
+    await invalidate_user_cache(user.username)
     logger.debug("auth login success user_id=%s username=%s", user.id, user.username)
 
     access_token_expires = timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -81,21 +83,37 @@ async def login(
 
 
 async def get_current_user(
+    request: Request,
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
 ) -> UserResponse:
-    """获取当前用户信息"""
-    logger.debug("auth get_current_user called token_len=%s", len(token) if token else 0)
-    auth_service = AuthService(db)
-    user = await auth_service.get_current_user(token)
-    logger.debug("auth get_current_user success user_id=%s", user.id)
-    return UserResponse.model_validate(user)
+    """获取当前用户信息：优先取 AuthMiddleware 已解析的 request.state.user，未挂中间件时就地解析（带缓存）。"""
+    user = getattr(request.state, "user", None)
+    if user is None:
+        logger.debug("auth get_current_user resolve inline token_len=%s", len(token) if token else 0)
+        try:
+            user = await resolve_user_from_token(token)
+        except Exception as e:
+            # 数据库/缓存故障不是凭据问题：返回 503，前端不会因 401 把用户登出
+            logger.warning("鉴权查询用户失败: %s", e)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="认证服务暂不可用，请稍后重试",
+            )
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效的认证凭据",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
 
 
 async def get_current_active_user(
-    current_user: UserResponse = Depends(get_current_user)
+    request: Request,
+    token: str = Depends(oauth2_scheme),
 ) -> UserResponse:
-    """获取当前活跃用户"""
+    """获取当前活跃用户（oauth2_scheme 仅解析请求头，JWT 与查库已由中间件完成）"""
+    current_user = await get_current_user(request, token)
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="用户未激活")
     return current_user
@@ -110,13 +128,15 @@ async def get_me(current_user: UserResponse = Depends(get_current_user)):
 @router.put("/me/password", status_code=status.HTTP_204_NO_CONTENT)
 async def update_password(
     body: UpdatePasswordRequest,
+    token: str = Depends(oauth2_scheme),
     current_user: UserResponse = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db),
+    auth_service: AuthService = Depends(get_auth_service),
 ):
     """修改当前用户密码"""
-    auth_service = AuthService(db)
     try:
         await auth_service.update_password(
+            db,
             current_user.id,
             body.old_password,
             body.new_password,
@@ -125,3 +145,5 @@ async def update_password(
         if "原密码错误" in str(e):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    invalidate_token_cache(token)
+    await invalidate_user_cache(current_user.username)
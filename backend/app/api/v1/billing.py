@@ -1,29 +1,47 @@
 """
 计费相关API
 """
-import asyncio
-from fastapi import APIRouter, Depends, HTTPException, status
+import hashlib
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
-from app.core.database import get_db
+from app.core.database import get_db, get_db_ro
 from app.core.config import settings
+from app.core.singleflight import single_flight
 from app.schemas.billing import UsageResponse, UsageLimitsResponse, PlanResponse, PlanListResponse, OrderCreate, OrderResponse
 from app.schemas.auth import UserResponse
 from app.api.v1.auth import get_current_active_user
+from app.api.deps import etag_matches
 from app.services.billing_service import BillingService
-from app.services.rate_limit_service import get_usage_snapshot
+from app.services.rate_limit_service import aget_usage_snapshot
 from app.services import cache_service
 
 router = APIRouter()
 
+# 套餐目录变化极少：强 ETag + 公共缓存，命中时由浏览器/反向代理直接 304
+_PLAN_CACHE_CONTROL = "public, max-age=300"
+
+
+def _cacheable_json(request: Request, payload: dict) -> Response:
+    """按内容计算强 ETag；If-None-Match 命中返回 304，否则返回带缓存头的 JSON。"""
+    body = orjson.dumps(payload)
+    etag = '"%s"' % hashlib.md5(body).hexdigest()
+    headers = {"ETag": etag, "Cache-Control": _PLAN_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 @router.get("/usage", response_model=UsageResponse)
 async def get_usage(
     start_date: datetime = None,
     end_date: datetime = None,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_ro)
 ):
     """获取使用量统计"""
     billing_service = BillingService(db)
@@ -42,36 +60,46 @@ async def get_usage_limits(
     """获取当前用量与限流快照（当日上传/对话数、当前秒检索数及上限），带短时缓存加速。"""
     user_id = current_user.id
     cache_key = cache_service.key_usage_limits(user_id)
-    cached = await asyncio.to_thread(cache_service.get, cache_key)
+    cached = await cache_service.aget(cache_key)
     if cached is not None:
         return UsageLimitsResponse(**cached)
-    snapshot = get_usage_snapshot(user_id)
-    ttl = getattr(settings, "CACHE_TTL_STATS", 60)
-    await asyncio.to_thread(cache_service.set, cache_key, snapshot, ttl)
+
+    async def _fill() -> dict:
+        snapshot = await aget_usage_snapshot(user_id)
+        ttl = getattr(settings, "CACHE_TTL_STATS", 60)
+        await cache_service.aset(cache_key, snapshot, ttl)
+        return snapshot
+
+    # 缓存过期瞬间的并发请求只回填一次
+    snapshot = await single_flight(cache_key, _fill)
     return UsageLimitsResponse(**snapshot)
 
 
-@router.get("/plans", response_model=PlanListResponse)
+@router.get("/plans", response_model=PlanListResponse, response_class=ORJSONResponse)
 async def get_plans(
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db_ro)
 ):
     """获取套餐列表"""
     billing_service = BillingService(db)
     plans = await billing_service.get_plans()
-    return {"plans": plans, "total": len(plans)}
+    payload = PlanListResponse(plans=plans, total=len(plans)).model_dump(mode="json")
+    return _cacheable_json(request, payload)
 
 
-@router.get("/plans/{plan_id}", response_model=PlanResponse)
+@router.get("/plans/{plan_id}", response_model=PlanResponse, response_class=ORJSONResponse)
 async def get_plan(
     plan_id: int,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db_ro)
 ):
     """获取套餐详情"""
     billing_service = BillingService(db)
     plan = await billing_service.get_plan(plan_id)
     if not plan:
         raise HTTPException(status_code=404, detail="套餐不存在")
-    return plan
+    payload = PlanResponse.model_validate(plan).model_dump(mode="json")
+    return _cacheable_json(request, payload)
 
 
 @router.post("/subscribe", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
@@ -4,18 +4,24 @@
 import asyncio
 import json
 import logging
+import time
 import uuid
+
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 
 from app.core.database import get_db, AsyncSessionLocal
 from app.core.config import settings
+from app.core.singleflight import single_flight
+from app.core.request_context import get_trace_id
 from app.schemas.chat import ChatMessage, ChatResponse, ConversationResponse, ConversationListResponse, MessageResponse
 from app.schemas.auth import UserResponse
 from app.api.v1.auth import get_current_active_user
-from app.api.deps import get_client_ip, require_chat_rate_limit, trace_id_from_request
+from app.api.deps import require_chat_rate_limit
 from app.application.chat_facade import ChatFacade
 from app.core.audit_text import summarize_text_for_audit
 from app.services import cache_service
@@ -27,6 +33,49 @@ from app.services.memory_service import list_memories, clear_memories
 
 router = APIRouter()
 
+# SSE 帧：预编码前后缀，事件体用 orjson 直接产出 UTF-8 bytes
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+_SSE_DONE = b"data: [DONE]\n\n"
+
+
+def _sse_frame(event) -> bytes:
+    return _SSE_PREFIX + orjson.dumps(event, option=orjson.OPT_NON_STR_KEYS) + _SSE_SUFFIX
+
+
+# token 事件合批：最多攒 N 帧或距上次下发超过若干秒即 flush（由定时等待驱动，模型停顿时不会滞留）；非 token 事件（trace/done 等）立即下发
+_SSE_BATCH_MAX_FRAMES = 4
+_SSE_BATCH_MAX_DELAY_SEC = 0.025
+
+# 流式断连检测节流：每 N 个事件或每隔若干秒才真正 poll 一次 receive 通道
+_DISCONNECT_POLL_EVERY = 16
+_DISCONNECT_POLL_INTERVAL_SEC = 0.25
+
+
+class _DisconnectPoller:
+    """节流版 request.is_disconnected()：一旦检测到断开即保持 True。"""
+
+    def __init__(self, request: Request):
+        self._request = request
+        self._count = 0
+        self._last = 0.0
+        self.disconnected = False
+
+    async def check(self) -> bool:
+        if self.disconnected:
+            return True
+        self._count += 1
+        now = time.monotonic()
+        if self._count >= _DISCONNECT_POLL_EVERY or now - self._last >= _DISCONNECT_POLL_INTERVAL_SEC:
+            self._count = 0
+            self._last = now
+            self.disconnected = await self._request.is_disconnected()
+        return self.disconnected
+
+
+# 消息列表整体校验（一次进入 pydantic-core），替代逐条 MessageResponse.model_validate
+_MSG_LIST = TypeAdapter(List[MessageResponse])
+
 
 @router.get("/settings/chat-attachment")
 async def get_chat_attachment_settings(
@@ -65,7 +114,6 @@ async def clear_chat_memories(
 @router.post("/completions", response_model=ChatResponse)
 async def chat_completion(
     message: ChatMessage,
-    request: Request,
     conversation_id: Optional[int] = None,
     knowledge_base_id: Optional[int] = None,
     stream: bool = False,
@@ -91,7 +139,7 @@ async def chat_completion(
             stream=stream,
             super_mode=super_mode,
             attachments=attachments_list,
-            trace_id=trace_id_from_request(request),
+            trace_id=get_trace_id(),
         )
         if getattr(settings, "AUDIT_LOG_CHAT_COMPLETION", False):
             detail = {
@@ -108,9 +156,6 @@ async def chat_completion(
                 "conversation",
                 str(response.conversation_id),
                 detail,
-                get_client_ip(request),
-                getattr(request.state, "request_id", None),
-                trace_id_from_request(request),
             )
         return response
     except Exception as e:
@@ -144,7 +189,7 @@ def _is_image_extension(ext: str) -> bool:
 
 
 def _is_video_extension(ext: str) -> bool:
-    return (ext or "").lower() in getattr(settings, "chat_attachment_video_extensions_list", ["mp4", "webm", "mov"])
+    return (ext or "").lower() in settings.chat_attachment_video_extensions_set
 
 
 @router.post("/attachments/upload")
@@ -215,7 +260,7 @@ async def chat_upload_file(
         extracted = extracted[:_STREAM_FILE_CONTENT_MAX_CHARS] + "\n\n…（已截断）"
     upload_id = uuid.uuid4().hex
     attach_type = "image" if is_image else ("video" if is_video else "file")
-    ok = cache_service.set(
+    ok = await cache_service.aset(
         cache_service.key_chat_upload(upload_id),
         {"file_name": filename, "type": attach_type, "extracted_text": extracted},
         ttl=cache_service.get_chat_upload_ttl(),
@@ -272,6 +317,15 @@ async def chat_completion_stream(
     raw_attachments = body.get("attachments")
     attachments_list = []
     file_content_parts: List[str] = []
+    # 附件引用的上传缓存一次 MGET 取回，下文注入内容与持久化 meta 共用
+    uploads: dict = {}
+    if raw_attachments and isinstance(raw_attachments, list):
+        upload_ids = list(dict.fromkeys(
+            str(a["upload_id"]) for a in raw_attachments if isinstance(a, dict) and a.get("upload_id")
+        ))
+        if upload_ids:
+            got_list = await cache_service.amget([cache_service.key_chat_upload(u) for u in upload_ids])
+            uploads = dict(zip(upload_ids, got_list))
     if raw_attachments and isinstance(raw_attachments, list):
         for a in raw_attachments:
             if not isinstance(a, dict):
@@ -279,7 +333,7 @@ async def chat_completion_stream(
             atype = a.get("type") or "file"
             upload_id = a.get("upload_id")
             if upload_id:
-                got = await asyncio.to_thread(cache_service.get, cache_service.key_chat_upload(upload_id))
+                got = uploads.get(str(upload_id))
                 if isinstance(got, dict) and got.get("extracted_text"):
                     fn = got.get("file_name") or "附件"
                     file_content_parts.append(f"## {fn}\n\n{got['extracted_text']}")
@@ -321,7 +375,7 @@ async def chat_completion_stream(
             # 文件：从上传缓存取解析文本，供侧栏可滚动查看
             uid = a.get("upload_id")
             if uid:
-                got = await asyncio.to_thread(cache_service.get, cache_service.key_chat_upload(uid))
+                got = uploads.get(str(uid))
                 if isinstance(got, dict) and got.get("extracted_text"):
                     meta["extracted_text"] = got["extracted_text"]
             attachments_meta.append(meta)
@@ -330,6 +384,9 @@ async def chat_completion_stream(
         import logging
         last_conv_id: Optional[int] = None
         chat_stream_gen = None
+        poller = _DisconnectPoller(request)
+        buf: List[bytes] = []
+        next_event: Optional[asyncio.Future] = None
         try:
             # 流式独立 session：响应结束/中断即归还连接，避免连接被 GC 清理告警
             async with AsyncSessionLocal() as db:
@@ -344,18 +401,52 @@ async def chat_completion_stream(
                     attachments=attachments_list,
                     attachments_meta=attachments_meta,
                     content_for_save=content_for_save,
-                    trace_id=trace_id_from_request(request),
+                    trace_id=get_trace_id(),
                 )
-                async for event in chat_stream_gen:
-                    if await request.is_disconnected():
+                batch_start = time.monotonic()
+                while True:
+                    if buf or next_event is not None:
+                        # 缓冲非空：下一个事件最多等到合批截止时间，超时先冲刷已攒的 token，再继续等同一个事件（此时不限时）
+                        if next_event is None:
+                            next_event = asyncio.ensure_future(chat_stream_gen.__anext__())
+                        timeout = max(0.0, _SSE_BATCH_MAX_DELAY_SEC - (time.monotonic() - batch_start)) if buf else None
+                        done, _ = await asyncio.wait((next_event,), timeout=timeout)
+                        if not done:
+                            yield b"".join(buf)
+                            buf.clear()
+                            continue
+                        fut, next_event = next_event, None
+                        try:
+                            event = fut.result()
+                        except StopAsyncIteration:
+                            break
+                    else:
+                        try:
+                            event = await chat_stream_gen.__anext__()
+                        except StopAsyncIteration:
+                            break
+                    if await poller.check():
                         break
                     if isinstance(event, dict) and event.get("type") == "done" and event.get("conversation_id") is not None:
                         last_conv_id = event["conversation_id"]
-                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
-            if not await request.is_disconnected():
-                yield "data: [DONE]\n\n"
+                    now = time.monotonic()
+                    if not buf:
+                        batch_start = now
+                    buf.append(_sse_frame(event))
+                    is_token = isinstance(event, dict) and event.get("type") == "token"
+                    if (
+                        not is_token
+                        or len(buf) >= _SSE_BATCH_MAX_FRAMES
+                        or now - batch_start >= _SSE_BATCH_MAX_DELAY_SEC
+                    ):
+                        yield b"".join(buf)
+                        buf.clear()
+            if not poller.disconnected:
+                buf.append(_SSE_DONE)
+                yield b"".join(buf)
+                buf.clear()
             if last_conv_id is not None:
-                await asyncio.to_thread(cache_service.delete, cache_service.key_conv_detail(last_conv_id))
+                await cache_service.adelete(cache_service.key_conv_detail(last_conv_id))
             if last_conv_id is not None and getattr(settings, "AUDIT_LOG_CHAT_COMPLETION", False):
                 async with AsyncSessionLocal() as audit_db:
                     detail = {
@@ -373,18 +464,24 @@ async def chat_completion_stream(
                         "conversation",
                         str(last_conv_id),
                         detail,
-                        get_client_ip(request),
-                        getattr(request.state, "request_id", None),
-                        trace_id_from_request(request),
                     )
         except Exception as e:
             logging.exception("智能问答流式生成异常")
             err_msg = str(e).strip() or "生成中断"
             if len(err_msg) > 200:
                 err_msg = err_msg[:200] + "…"
-            if not await request.is_disconnected():
-                yield f"data: {json.dumps({'type': 'error', 'message': err_msg}, ensure_ascii=False)}\n\n"
+            if not poller.disconnected:
+                buf.append(_sse_frame({"type": "error", "message": err_msg}))
+                yield b"".join(buf)
+                buf.clear()
         finally:
+            if next_event is not None and not next_event.done():
+                # 客户端在等待期间断开：先取消仍在推进生成器的任务，否则 aclose 会因生成器正在运行而失败
+                next_event.cancel()
+                try:
+                    await next_event
+                except (asyncio.CancelledError, Exception):
+                    pass
             if chat_stream_gen is not None:
                 try:
                     await chat_stream_gen.aclose()
@@ -405,56 +502,66 @@ async def chat_completion_stream(
     )
 
 
-@router.get("/conversations", response_model=ConversationListResponse)
+@router.get("/conversations", response_model=ConversationListResponse, response_class=ORJSONResponse)
 async def get_conversations(
-    request: Request,
     page: int = 1,
     page_size: int = 20,
     current_user: UserResponse = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取对话列表（带 Redis 缓存）"""
+    """获取对话列表（带 Redis 缓存；缓存内容已是校验后的 JSON，直接返回不再二次校验）"""
     user_id = current_user.id
-    cache_key = cache_service.key_conv_list(user_id, page, page_size)
-    cached = await asyncio.to_thread(cache_service.get, cache_key)
+    cache_key = cache_service.key_conv_list(user_id)
+    cache_field = cache_service.field_page(page, page_size)
+    cached = await cache_service.ahget(cache_key, cache_field)
     if cached is not None:
-        return ConversationListResponse(**cached)
-    chat = ChatFacade(db)
-    result = await chat.get_conversations(user_id, page, page_size, trace_id=trace_id_from_request(request))
-    ttl = getattr(settings, "CACHE_TTL_CONV", 30)
-    await asyncio.to_thread(cache_service.set, cache_key, result.model_dump(), ttl)
-    return result
+        return ORJSONResponse(cached)
+
+    async def _fill() -> dict:
+        chat = ChatFacade(db)
+        result = await chat.get_conversations(user_id, page, page_size, trace_id=get_trace_id())
+        data = result.model_dump(mode="json")
+        ttl = getattr(settings, "CACHE_TTL_CONV", 30)
+        await cache_service.ahset(cache_key, cache_field, data, ttl)
+        return data
 
+    return ORJSONResponse(await single_flight(f"{cache_key}:{cache_field}", _fill))
 
-@router.get("/conversations/{conv_id}", response_model=ConversationResponse)
+
+@router.get("/conversations/{conv_id}", response_model=ConversationResponse, response_class=ORJSONResponse)
 async def get_conversation(
     conv_id: int,
-    request: Request,
     current_user: UserResponse = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取对话详情（含消息列表，带 Redis 缓存）"""
+    """获取对话详情（含消息列表，带 Redis 缓存；命中时直接返回缓存 JSON）"""
     cache_key = cache_service.key_conv_detail(conv_id)
-    cached = await asyncio.to_thread(cache_service.get, cache_key)
+    cached = await cache_service.aget(cache_key)
     if cached is not None:
-        return ConversationResponse(**cached)
-    chat = ChatFacade(db)
-    conv = await chat.get_conversation(conv_id, current_user.id, trace_id=trace_id_from_request(request))
-    if not conv:
-        raise HTTPException(status_code=404, detail="对话不存在")
-    messages = await chat.get_conversation_messages(conv_id, current_user.id, trace_id=trace_id_from_request(request))
-    from app.schemas.chat import MessageResponse
-    out = ConversationResponse(
-        id=conv.id,
-        title=conv.title,
-        knowledge_base_id=conv.knowledge_base_id,
-        created_at=conv.created_at,
-        updated_at=conv.updated_at,
-        messages=[MessageResponse.model_validate(m) for m in messages],
-    )
-    ttl = getattr(settings, "CACHE_TTL_CONV", 30)
-    await asyncio.to_thread(cache_service.set, cache_key, out.model_dump(), ttl)
-    return out
+        return ORJSONResponse(cached)
+
+    async def _fill() -> dict:
+        chat = ChatFacade(db)
+        conv, messages = await chat.get_conversation_with_messages(
+            conv_id, current_user.id, trace_id=get_trace_id()
+        )
+        if not conv:
+            raise HTTPException(status_code=404, detail="对话不存在")
+        out = ConversationResponse(
+            id=conv.id,
+            title=conv.title,
+            knowledge_base_id=conv.knowledge_base_id,
+            created_at=conv.created_at,
+            updated_at=conv.updated_at,
+            messages=_MSG_LIST.validate_python(messages, from_attributes=True),
+        )
+        data = out.model_dump(mode="json")
+        ttl = getattr(settings, "CACHE_TTL_CONV", 30)
+        await cache_service.aset(cache_key, data, ttl)
+        return data
+
+    # single-flight key 带上 user_id：归属校验在回填函数内，不能跨用户共享结果
+    return ORJSONResponse(await single_flight(f"{cache_key}:u:{current_user.id}", _fill))
 
 
 @router.get("/conversations/{conv_id}/messages")
@@ -465,22 +572,20 @@ async def get_conversation_messages(
     db: AsyncSession = Depends(get_db)
 ):
     """获取对话的消息列表"""
-    chat_service = ChatService(db)
-    messages = await chat_service.get_conversation_messages(conv_id, current_user.id, limit)
-    from app.schemas.chat import MessageResponse
-    return {"messages": [MessageResponse.model_validate(m) for m in messages]}
+    chat = ChatFacade(db)
+    messages = await chat.get_conversation_messages(conv_id, current_user.id, limit)
+    return {"messages": _MSG_LIST.validate_python(messages, from_attributes=True)}
 
 
 @router.delete("/conversations/{conv_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_conversation(
     conv_id: int,
-    request: Request,
     current_user: UserResponse = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """删除对话"""
     chat = ChatFacade(db)
-    await chat.delete_conversation(conv_id, current_user.id, trace_id=trace_id_from_request(request))
+    await chat.delete_conversation(conv_id, current_user.id, trace_id=get_trace_id())
     await log_audit(
         db,
         current_user.id,
@@ -488,12 +593,13 @@ async def delete_conversation(
         "conversation",
         str(conv_id),
         None,
-        get_client_ip(request),
-        getattr(request.state, "request_id", None),
-        trace_id_from_request(request),
     )
     user_id = current_user.id
-    await asyncio.to_thread(cache_service.delete, cache_service.key_conv_detail(conv_id))
-    await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_conv_list(user_id))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_dashboard_stats(user_id))
+    await cache_service.apipeline_delete(
+        [
+            cache_service.key_conv_detail(conv_id),
+            cache_service.key_conv_list(user_id),
+            cache_service.key_dashboard_stats(user_id),
+        ]
+    )
     return None
@@ -21,8 +21,9 @@ async def computer_steward_run(
     """执行电脑管家任务：根据用户目标看屏、移动鼠标、敲键盘，结合 skills 技能综合完成。"""
     try:
         success, summary, steps, error = await run_computer_steward(body.instruction)
-        step_items = [StewardStepItem(tool=s["tool"], args=s["args"], result=s["result"]) for s in steps]
-        return StewardRunResponse(
+        # steps 由 agent 按 StewardStepItem 结构产出，model_construct 跳过构造时校验（响应模型输出时仍会校验一次）
+        step_items = [StewardStepItem.model_construct(tool=s["tool"], args=s["args"], result=s["result"]) for s in steps]
+        return StewardRunResponse.model_construct(
             success=success,
             summary=summary,
             steps=step_items,
@@ -1,13 +1,14 @@
 """
 仪表盘统计 API
 """
-import asyncio
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
 from app.core.database import get_db
 from app.core.config import settings
+from app.core.singleflight import single_flight
+from app.core.ttl_cache import TTLCache
 from app.schemas.auth import UserResponse
 from app.api.v1.auth import get_current_active_user
 from app.models.file import File
@@ -18,33 +19,60 @@ from app.services import cache_service
 router = APIRouter()
 
 
+# 进程内 L1（按 user_id）：同一用户短时间内重复请求不再访问 Redis；写操作只失效 Redis，L1 最多陈旧数秒
+_l1 = TTLCache(
+    maxsize=getattr(settings, "DASHBOARD_L1_MAXSIZE", 10000),
+    ttl=getattr(settings, "DASHBOARD_L1_TTL_SEC", 5),
+)
+
+
+async def _load_stats(user_id: int, db: AsyncSession) -> dict:
+    """Redis（软过期 + 刷新锁）→ 数据库。"""
+    cache_key = cache_service.key_dashboard_stats(user_id)
+    cached, stale = await cache_service.aget_with_soft_ttl(cache_key)
+    if cached is not None and not stale:
+        return cached
+
+    async def _refresh() -> dict:
+        # 三个计数合并为一条 SQL（标量子查询），一次往返
+        stmt = select(
+            select(func.count()).select_from(File).where(File.user_id == user_id).scalar_subquery(),
+            select(func.count()).select_from(KnowledgeBase).where(KnowledgeBase.user_id == user_id).scalar_subquery(),
+            select(func.count()).select_from(Conversation).where(Conversation.user_id == user_id).scalar_subquery(),
+        )
+        file_count, kb_count, conv_count = (await db.execute(stmt)).one()
+        data = {
+            "file_count": file_count or 0,
+            "knowledge_base_count": kb_count or 0,
+            "conversation_count": conv_count or 0,
+        }
+        ttl = getattr(settings, "CACHE_TTL_STATS", 60)
+        await cache_service.aset_with_soft_ttl(cache_key, data, ttl)
+        return data
+
+    if cached is not None:
+        # 已过软过期：只有抢到锁的请求刷新，其余（含其他实例）继续返回旧值
+        lock_key = cache_service.key_dashboard_stats_lock(user_id)
+        if not await cache_service.aacquire_lock(lock_key, 5):
+            return cached
+        try:
+            return await _refresh()
+        finally:
+            await cache_service.adelete(lock_key)
+
+    # 完全未命中：进程内并发只查一次库
+    return await single_flight(cache_key, _refresh)
+
+
 @router.get("/stats")
 async def get_dashboard_stats(
     current_user: UserResponse = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """获取仪表盘统计：文件总数、知识库数量、对话次数（带 Redis 缓存）"""
+    """获取仪表盘统计：文件总数、知识库数量、对话次数（进程内 L1 + Redis 缓存，软过期 + 刷新锁防击穿）"""
     user_id = current_user.id
-    cache_key = cache_service.key_dashboard_stats(user_id)
-    cached = await asyncio.to_thread(cache_service.get, cache_key)
-    if cached is not None:
-        return cached
-
-    file_count = await db.scalar(
-        select(func.count()).select_from(File).where(File.user_id == user_id)
-    )
-    kb_count = await db.scalar(
-        select(func.count()).select_from(KnowledgeBase).where(KnowledgeBase.user_id == user_id)
-    )
-    conv_count = await db.scalar(
-        select(func.count()).select_from(Conversation).where(Conversation.user_id == user_id)
-    )
-
-    data = {
-        "file_count": file_count or 0,
-        "knowledge_base_count": kb_count or 0,
-        "conversation_count": conv_count or 0,
-    }
-    ttl = getattr(settings, "CACHE_TTL_STATS", 60)
-    await asyncio.to_thread(cache_service.set, cache_key, data, ttl)
+    data = _l1.get(user_id)
+    if data is None:
+        data = await _load_stats(user_id, db)
+        _l1.set(user_id, data)
     return data
@@ -1,21 +1,27 @@
 """
 文件相关API
 """
-import asyncio
 from urllib.parse import quote
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query, Request
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic_core import to_json
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.core.database import get_db
 from app.core.config import settings
-from app.schemas.file import FileResponse, FileListResponse
+from app.schemas.file import (
+    FileResponse,
+    FileListResponse,
+    FilePresignRequest,
+    FilePresignResponse,
+    FileFinalizeRequest,
+)
 from app.schemas.auth import UserResponse
 from app.api.v1.auth import get_current_active_user
-from app.api.deps import get_client_ip, require_upload_rate_limit, trace_id_from_request
+from app.api.deps import etag_matches, get_file_service, require_upload_rate_limit
 from app.services.file_service import FileService
-from app.services.audit_service import log_audit
+from app.services.audit_service import log_audit, log_audit_bulk
 from app.services import cache_service
 
 router = APIRouter()
@@ -23,48 +29,90 @@ router = APIRouter()
 
 @router.post("/upload", response_model=FileResponse, status_code=status.HTTP_201_CREATED)
 async def upload_file(
-    request: Request,
     file: UploadFile = File(...),
     knowledge_base_id: int = None,
     current_user: UserResponse = Depends(require_upload_rate_limit),
+    file_service: FileService = Depends(get_file_service),
     db: AsyncSession = Depends(get_db)
 ):
     """上传文件"""
-    file_service = FileService(db)
     file_record = await file_service.upload_file(
         file=file,
         user_id=current_user.id,
         knowledge_base_id=knowledge_base_id
     )
-    await log_audit(db, current_user.id, "upload_file", "file", str(file_record.id), {"filename": file_record.original_filename}, get_client_ip(request), getattr(request.state, "request_id", None), trace_id_from_request(request))
-    await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_file_list(current_user.id))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_dashboard_stats(current_user.id))
+    await log_audit(db, current_user.id, "upload_file", "file", str(file_record.id), {"filename": file_record.original_filename}, defer=True)
+    await cache_service.apipeline_delete(
+        [cache_service.key_dashboard_stats(current_user.id), *cache_service.file_list_keys(current_user.id)],
+    )
+    return file_record
+
+
+@router.post("/presign", response_model=FilePresignResponse)
+async def presign_upload(
+    body: FilePresignRequest,
+    current_user: UserResponse = Depends(require_upload_rate_limit),
+    file_service: FileService = Depends(get_file_service),
+):
+    """申请直传：返回预签名 POST 表单（限定对象 key 与文件大小），客户端把文件直接写入对象存储后调用 /finalize"""
+    try:
+        return await file_service.presign_upload(current_user.id, body.filename, body.size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/finalize", response_model=FileResponse, status_code=status.HTTP_201_CREATED)
+async def finalize_upload(
+    body: FileFinalizeRequest,
+    current_user: UserResponse = Depends(get_current_active_user),
+    file_service: FileService = Depends(get_file_service),
+    db: AsyncSession = Depends(get_db)
+):
+    """确认直传完成：校验对象后登记文件记录"""
+    try:
+        file_record = await file_service.finalize_upload(current_user.id, body.upload_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await log_audit(db, current_user.id, "upload_file", "file", str(file_record.id), {"filename": file_record.original_filename, "direct": True}, defer=True)
+    await cache_service.apipeline_delete(
+        [cache_service.key_dashboard_stats(current_user.id), *cache_service.file_list_keys(current_user.id)],
+    )
     return file_record
 
 
 @router.post("/batch-upload", response_model=List[FileResponse], status_code=status.HTTP_201_CREATED)
 async def batch_upload_files(
-    request: Request,
     files: List[UploadFile] = File(...),
     knowledge_base_id: int = None,
     on_duplicate: str = Query("use_existing", description="同 MD5 时：use_existing=返回已有，overwrite=覆盖并清空分块"),
     current_user: UserResponse = Depends(require_upload_rate_limit),
+    file_service: FileService = Depends(get_file_service),
     db: AsyncSession = Depends(get_db)
 ):
     """批量上传文件"""
-    file_service = FileService(db)
     file_records = await file_service.batch_upload_files(
         files=files,
         user_id=current_user.id,
         knowledge_base_id=knowledge_base_id,
         on_duplicate=on_duplicate,
     )
-    ip = get_client_ip(request)
-    for rec in file_records:
-        await log_audit(db, current_user.id, "upload_file", "file", str(rec.id), {"filename": rec.original_filename}, ip, getattr(request.state, "request_id", None), trace_id_from_request(request))
-    await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_file_list(current_user.id))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_dashboard_stats(current_user.id))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_usage_limits(current_user.id))
+    await log_audit_bulk(db, [
+        {
+            "user_id": current_user.id,
+            "action": "upload_file",
+            "resource_type": "file",
+            "resource_id": str(rec.id),
+            "detail": {"filename": rec.original_filename},
+        }
+        for rec in file_records
+    ], defer=True)
+    await cache_service.apipeline_delete(
+        [
+            cache_service.key_dashboard_stats(current_user.id),
+            cache_service.key_usage_limits(current_user.id),
+            *cache_service.file_list_keys(current_user.id),
+        ],
+    )
     return file_records
 
 
@@ -72,53 +120,63 @@ async def batch_upload_files(
 async def download_file(
     file_id: int,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db),
+    file_service: FileService = Depends(get_file_service),
 ):
     """下载/预览文件（图片会返回正确 Content-Type 便于展示）"""
-    file_service = FileService(db)
     file_stream = await file_service.download_file(file_id, current_user.id)
     if not file_stream:
         raise HTTPException(status_code=404, detail="文件不存在")
     filename = file_stream["filename"] or "download"
     # 使用 RFC 5987 编码，避免中文等非 ASCII 导致 latin-1 报错
     encoded_filename = quote(filename, safe="")
-    return Response(
-        content=file_stream["content"],
+    headers = {"Content-Disposition": f"inline; filename*=UTF-8''{encoded_filename}"}
+    if file_stream.get("content_length"):
+        headers["Content-Length"] = str(file_stream["content_length"])
+    return StreamingResponse(
+        file_stream["content"],
         media_type=file_stream["content_type"],
-        headers={
-            "Content-Disposition": f"inline; filename*=UTF-8''{encoded_filename}",
-        },
+        headers=headers,
     )
 
 
 @router.get("", response_model=FileListResponse)
 async def get_files(
+    request: Request,
     page: int = 1,
     page_size: int = 20,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    file_service: FileService = Depends(get_file_service)
 ):
-    """获取文件列表（带 Redis 缓存）"""
+    """获取文件列表（带 Redis 缓存，缓存的是序列化后的 JSON bytes，命中时原样返回；按列表版本号返回弱 ETag，未变化时 304）"""
     user_id = current_user.id
-    cache_key = cache_service.key_file_list(user_id, page, page_size)
-    cached = await asyncio.to_thread(cache_service.get, cache_key)
+    cache_key = cache_service.key_file_list(user_id)
+    cache_field = cache_service.field_page(page, page_size)
+    # 版本号与分页缓存在同一事务中读取（一次往返，二者对应同一时刻）
+    version, cached = await cache_service.aget_list_version_and_page(
+        cache_service.key_file_list_version(user_id), cache_key, cache_field
+    )
+    headers = {}
+    if version is not None:
+        etag = f'W/"{user_id}-{version}-{page}-{page_size}"'
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        headers["ETag"] = etag
     if cached is not None:
-        return FileListResponse(**cached)
-    file_service = FileService(db)
+        return Response(content=cached, media_type="application/json", headers=headers)
     result = await file_service.get_files(user_id=user_id, page=page, page_size=page_size)
+    body = to_json(result)
     ttl = getattr(settings, "CACHE_TTL_LIST", 60)
-    await asyncio.to_thread(cache_service.set, cache_key, result.model_dump(), ttl)
-    return result
+    await cache_service.ahset(cache_key, cache_field, body, ttl)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/{file_id}", response_model=FileResponse)
 async def get_file(
     file_id: int,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    file_service: FileService = Depends(get_file_service)
 ):
     """获取文件详情"""
-    file_service = FileService(db)
     file_record = await file_service.get_file(file_id, current_user.id)
     if not file_record:
         raise HTTPException(status_code=404, detail="文件不存在")
@@ -128,14 +186,14 @@ async def get_file(
 @router.delete("/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_file(
     file_id: int,
-    request: Request,
     current_user: UserResponse = Depends(get_current_active_user),
+    file_service: FileService = Depends(get_file_service),
     db: AsyncSession = Depends(get_db)
 ):
     """删除文件"""
-    file_service = FileService(db)
     await file_service.delete_file(file_id, current_user.id)
-    await log_audit(db, current_user.id, "delete_file", "file", str(file_id), None, get_client_ip(request), getattr(request.state, "request_id", None), trace_id_from_request(request))
-    await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_file_list(current_user.id))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_dashboard_stats(current_user.id))
+    await log_audit(db, current_user.id, "delete_file", "file", str(file_id), None, defer=True)
+    await cache_service.apipeline_delete(
+        [cache_service.key_dashboard_stats(current_user.id), *cache_service.file_list_keys(current_user.id)],
+    )
     return None
@@ -2,29 +2,17 @@
 知识库相关API
 """
 import asyncio
-import io
-import json
 import logging
 import zipfile
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
-from fastapi.responses import StreamingResponse, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse, Response
+from pydantic_core import to_json
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Callable, Any
+from typing import List
 
 logger = logging.getLogger(__name__)
 
-# 提交 Celery 任务时的超时（秒），避免 delay() 连接 result backend 时无限阻塞
-CELERY_SUBMIT_TIMEOUT = 10.0
-
-
-async def _submit_celery_task(submit_fn: Callable[[], Any]):
-    """在线程池中执行 submit_fn（即 task.delay()），超时则抛 asyncio.TimeoutError。"""
-    loop = asyncio.get_event_loop()
-    return await asyncio.wait_for(
-        loop.run_in_executor(None, submit_fn),
-        timeout=CELERY_SUBMIT_TIMEOUT,
-    )
-
 from app.core.database import get_db
 from app.schemas.knowledge_base import (
     KnowledgeBaseCreate,
@@ -39,106 +27,133 @@ from app.schemas.knowledge_base import (
 from app.schemas.auth import UserResponse
 from app.schemas.tasks import TaskEnqueueResponse
 from app.api.v1.auth import get_current_active_user
-from app.api.deps import require_upload_rate_limit, get_client_ip, trace_id_from_request
+from app.api.deps import etag_matches, get_kb_service, require_upload_rate_limit
 from app.services.knowledge_base_service import KnowledgeBaseService
 from app.services.audit_service import log_audit
 from app.services import cache_service
 from app.tasks.kb_tasks import add_files_to_kb_task, reindex_file_in_kb_task, reindex_all_in_kb_task
+from app.tasks.submit import CELERY_SUBMIT_TIMEOUT, send_without_result_wait, submit_celery_task
 
 router = APIRouter()
 
+# 流式添加文件：生产方（切分/向量化）最多领先发送方的 SSE 帧数，客户端慢时在此处形成背压
+_STREAM_BUFFER_FRAMES = 32
+
 
 @router.post("", response_model=KnowledgeBaseResponse, status_code=status.HTTP_201_CREATED)
 async def create_knowledge_base(
     kb_data: KnowledgeBaseCreate,
-    request: Request,
     current_user: UserResponse = Depends(get_current_active_user),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
     db: AsyncSession = Depends(get_db)
 ):
     """创建知识库"""
-    kb_service = KnowledgeBaseService(db)
     kb = await kb_service.create_knowledge_base(kb_data, current_user.id)
-    await log_audit(db, current_user.id, "create_kb", "knowledge_base", str(kb.id), {"name": kb.name}, get_client_ip(request), getattr(request.state, "request_id", None), trace_id_from_request(request))
-    await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_kb_list(current_user.id))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_dashboard_stats(current_user.id))
+    # 审计写入与缓存失效互不依赖，并发执行；DB 变更已提交，单项失败不影响响应
+    await asyncio.gather(
+        log_audit(db, current_user.id, "create_kb", "knowledge_base", str(kb.id), {"name": kb.name}),
+        cache_service.apipeline_delete(
+            [cache_service.key_dashboard_stats(current_user.id), *cache_service.kb_list_keys(current_user.id)],
+        ),
+        return_exceptions=True,
+    )
     return kb
 
 
 @router.get("", response_model=KnowledgeBaseListResponse)
 async def get_knowledge_bases(
+    request: Request,
     page: int = 1,
     page_size: int = 20,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    kb_service: KnowledgeBaseService = Depends(get_kb_service)
 ):
-    """获取知识库列表（带 Redis 缓存）"""
+    """获取知识库列表（带 Redis 缓存，缓存的是序列化后的 JSON bytes，命中时原样返回；按列表版本号返回弱 ETag，未变化时 304）"""
     from app.core.config import settings
-    cache_key = cache_service.key_kb_list(current_user.id, page, page_size)
-    cached = await asyncio.to_thread(cache_service.get, cache_key)
+    cache_key = cache_service.key_kb_list(current_user.id)
+    cache_field = cache_service.field_page(page, page_size)
+    # 版本号与分页缓存在同一事务中读取（一次往返，二者对应同一时刻）
+    version, cached = await cache_service.aget_list_version_and_page(
+        cache_service.key_kb_list_version(current_user.id), cache_key, cache_field
+    )
+    headers = {}
+    if version is not None:
+        etag = f'W/"{current_user.id}-{version}-{page}-{page_size}"'
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        headers["ETag"] = etag
     if cached is not None:
-        return KnowledgeBaseListResponse(**cached)
-    kb_service = KnowledgeBaseService(db)
+        return Response(content=cached, media_type="application/json", headers=headers)
     result = await kb_service.get_knowledge_bases(current_user.id, page, page_size)
+    body = to_json(result)
     ttl = getattr(settings, "CACHE_TTL_LIST", 60)
-    await asyncio.to_thread(cache_service.set, cache_key, result.model_dump(), ttl)
-    return result
+    await cache_service.ahset(cache_key, cache_field, body, ttl)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/{kb_id}", response_model=KnowledgeBaseResponse)
 async def get_knowledge_base(
     kb_id: int,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    kb_service: KnowledgeBaseService = Depends(get_kb_service)
 ):
-    """获取知识库详情（带 Redis 缓存）"""
+    """获取知识库详情（带 Redis 缓存，命中时直接返回缓存的 JSON bytes）"""
     from app.core.config import settings
     cache_key = cache_service.key_kb_detail(kb_id)
-    cached = await asyncio.to_thread(cache_service.get, cache_key)
+    cached = await cache_service.aget(cache_key, raw=True)
     if cached is not None:
-        return KnowledgeBaseResponse(**cached)
-    kb_service = KnowledgeBaseService(db)
+        return Response(content=cached, media_type="application/json")
     kb = await kb_service.get_knowledge_base(kb_id, current_user.id)
     if not kb:
         raise HTTPException(status_code=404, detail="知识库不存在")
-    out = KnowledgeBaseResponse.model_validate(kb)
+    body = to_json(KnowledgeBaseResponse.model_validate(kb))
     ttl = getattr(settings, "CACHE_TTL_DETAIL", 60)
-    await asyncio.to_thread(cache_service.set, cache_key, out.model_dump(), ttl)
-    return out
+    await cache_service.aset(cache_key, body, ttl)
+    return Response(content=body, media_type="application/json")
 
 
 @router.put("/{kb_id}", response_model=KnowledgeBaseResponse)
 async def update_knowledge_base(
     kb_id: int,
     kb_data: KnowledgeBaseCreate,
-    request: Request,
     current_user: UserResponse = Depends(get_current_active_user),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
     db: AsyncSession = Depends(get_db)
 ):
     """更新知识库"""
-    kb_service = KnowledgeBaseService(db)
     kb = await kb_service.update_knowledge_base(kb_id, kb_data, current_user.id)
     if not kb:
         raise HTTPException(status_code=404, detail="知识库不存在")
-    await log_audit(db, current_user.id, "update_kb", "knowledge_base", str(kb_id), {"name": kb.name}, get_client_ip(request), getattr(request.state, "request_id", None), trace_id_from_request(request))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_kb_detail(kb_id))
-    await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_kb_list(current_user.id))
+    await asyncio.gather(
+        log_audit(db, current_user.id, "update_kb", "knowledge_base", str(kb_id), {"name": kb.name}),
+        cache_service.apipeline_delete(
+            [cache_service.key_kb_detail(kb_id), *cache_service.kb_list_keys(current_user.id)],
+        ),
+        return_exceptions=True,
+    )
     return kb
 
 
 @router.delete("/{kb_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_knowledge_base(
     kb_id: int,
-    request: Request,
     current_user: UserResponse = Depends(get_current_active_user),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
     db: AsyncSession = Depends(get_db)
 ):
     """删除知识库"""
-    kb_service = KnowledgeBaseService(db)
     await kb_service.delete_knowledge_base(kb_id, current_user.id)
-    await log_audit(db, current_user.id, "delete_kb", "knowledge_base", str(kb_id), None, get_client_ip(request), getattr(request.state, "request_id", None), trace_id_from_request(request))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_kb_detail(kb_id))
-    await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_kb_list(current_user.id))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_dashboard_stats(current_user.id))
+    await asyncio.gather(
+        log_audit(db, current_user.id, "delete_kb", "knowledge_base", str(kb_id), None),
+        cache_service.apipeline_delete(
+            [
+                cache_service.key_kb_detail(kb_id),
+                cache_service.key_dashboard_stats(current_user.id),
+                *cache_service.kb_list_keys(current_user.id),
+            ],
+        ),
+        return_exceptions=True,
+    )
     return None
 
 
@@ -148,10 +163,9 @@ async def get_files_in_knowledge_base(
     page: int = 1,
     page_size: int = 20,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
     """查询知识库内的文件列表（含分块数）"""
-    kb_service = KnowledgeBaseService(db)
     try:
         return await kb_service.get_files_in_knowledge_base(kb_id, current_user.id, page, page_size)
     except ValueError as e:
@@ -163,14 +177,15 @@ async def get_chunks_for_file(
     kb_id: int,
     file_id: int,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
     """查询某文件在知识库中的分块内容列表"""
-    kb_service = KnowledgeBaseService(db)
     try:
-        return await kb_service.get_chunks_for_file_in_kb(kb_id, file_id, current_user.id)
+        data = await kb_service.get_chunks_for_file_in_kb(kb_id, file_id, current_user.id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    # 分块文本量大：结构已与 ChunkListResponse 一致，跳过 pydantic 校验直接 orjson 编码
+    return ORJSONResponse(data)
 
 
 @router.post("/{kb_id}/files", response_model=AddFilesToKnowledgeBaseResponse)
@@ -178,21 +193,23 @@ async def add_files_to_knowledge_base(
     kb_id: int,
     body: AddFilesToKnowledgeBase,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    kb_service: KnowledgeBaseService = Depends(get_kb_service)
 ):
     """添加文件到知识库（会进行 RAG 切分与向量化）。若有文件被跳过（如存储中不存在），会在 skipped 中返回原因。"""
-    kb_service = KnowledgeBaseService(db)
     kb, skipped = await kb_service.add_files(kb_id, body.file_ids, current_user.id)
     if not kb:
         raise HTTPException(status_code=404, detail="知识库不存在")
-    await asyncio.to_thread(cache_service.delete, cache_service.key_kb_detail(kb_id))
-    await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_kb_list(current_user.id))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_dashboard_stats(current_user.id))
-    base = KnowledgeBaseResponse.model_validate(kb)
-    return AddFilesToKnowledgeBaseResponse(
-        **base.model_dump(),
-        skipped=[SkippedFileItem(**s) for s in skipped],
+    await cache_service.apipeline_delete(
+        [
+            cache_service.key_kb_detail(kb_id),
+            cache_service.key_dashboard_stats(current_user.id),
+            *cache_service.kb_list_keys(current_user.id),
+        ],
     )
+    # 直接从 ORM 校验一次；skipped 由服务层构造，字段可信，跳过校验
+    resp = AddFilesToKnowledgeBaseResponse.model_validate(kb)
+    resp.skipped = [SkippedFileItem.model_construct(**s) for s in skipped]
+    return resp
 
 
 @router.post("/{kb_id}/files/async", response_model=TaskEnqueueResponse)
@@ -200,16 +217,15 @@ async def add_files_to_knowledge_base_async(
     kb_id: int,
     body: AddFilesToKnowledgeBase,
     current_user: UserResponse = Depends(require_upload_rate_limit),
-    db: AsyncSession = Depends(get_db),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
     """异步添加文件到知识库：接口立即返回 task_id，前端轮询 GET /api/v1/tasks/{task_id} 查看状态与结果。Redis/Celery 不可用或提交超时时自动降级为同步执行。"""
     logger.info("[async] 收到添加文件到知识库请求 kb_id=%s file_ids=%s", kb_id, body.file_ids)
-    kb_service = KnowledgeBaseService(db)
     kb = await kb_service.get_knowledge_base(kb_id, current_user.id)
     if not kb:
         raise HTTPException(status_code=404, detail="知识库不存在")
     try:
-        task = await _submit_celery_task(lambda: add_files_to_kb_task.delay(kb_id, body.file_ids, current_user.id))
+        task = await submit_celery_task(add_files_to_kb_task.delay, kb_id, body.file_ids, current_user.id)
         logger.info("[async] 任务已提交 task_id=%s", task.id)
         return TaskEnqueueResponse(task_id=task.id, message="任务已提交，请轮询 GET /api/v1/tasks/{task_id} 查看状态")
     except asyncio.TimeoutError:
@@ -243,26 +259,44 @@ async def add_files_to_knowledge_base_stream(
     kb_id: int,
     body: AddFilesToKnowledgeBase,
     current_user: UserResponse = Depends(require_upload_rate_limit),
-    db: AsyncSession = Depends(get_db),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
     """添加文件到知识库（流式进度）。SSE 事件：file_start / file_done / file_skip / done / error。"""
-    kb_service = KnowledgeBaseService(db)
-
-    def _json_serial(obj):
-        from datetime import datetime
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
     async def generate():
+        # 入库在独立任务中运行并预先编码好帧，经有界队列交给发送方；客户端写得慢不会卡住向量化
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_STREAM_BUFFER_FRAMES)
+
+        async def produce():
+            try:
+                async for event in kb_service.add_files_stream(kb_id, body.file_ids, current_user.id):
+                    await queue.put(b"data: " + orjson.dumps(event, default=str, option=orjson.OPT_NON_STR_KEYS) + b"\n\n")
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(None)
+
+        producer = asyncio.create_task(produce())
         try:
-            async for event in kb_service.add_files_stream(kb_id, body.file_ids, current_user.id):
-                yield f"data: {json.dumps(event, ensure_ascii=False, default=_json_serial)}\n\n"
-            yield "data: [DONE]\n\n"
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    break
+                if isinstance(frame, Exception):
+                    raise frame
+                yield frame
+            yield b"data: [DONE]\n\n"
         finally:
-            await asyncio.to_thread(cache_service.delete, cache_service.key_kb_detail(kb_id))
-            await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_kb_list(current_user.id))
-            await asyncio.to_thread(cache_service.delete, cache_service.key_dashboard_stats(current_user.id))
+            if not producer.done():
+                producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+            await cache_service.apipeline_delete(
+                [
+                    cache_service.key_kb_detail(kb_id),
+                    cache_service.key_dashboard_stats(current_user.id),
+                    *cache_service.kb_list_keys(current_user.id),
+                ],
+            )
 
     return StreamingResponse(generate(), media_type="text/event-stream")
 
@@ -271,19 +305,22 @@ async def add_files_to_knowledge_base_stream(
 async def remove_file_from_knowledge_base(
     kb_id: int,
     file_id: int,
-    request: Request,
     current_user: UserResponse = Depends(get_current_active_user),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
     db: AsyncSession = Depends(get_db),
 ):
     """从知识库中移除文件（删除该文件在本库中的分块与向量）"""
-    kb_service = KnowledgeBaseService(db)
     try:
         await kb_service.remove_file_from_knowledge_base(kb_id, file_id, current_user.id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    await log_audit(db, current_user.id, "remove_file_from_kb", "knowledge_base", str(kb_id), {"file_id": file_id}, get_client_ip(request), getattr(request.state, "request_id", None), trace_id_from_request(request))
-    await asyncio.to_thread(cache_service.delete, cache_service.key_kb_detail(kb_id))
-    await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_kb_list(current_user.id))
+    await asyncio.gather(
+        log_audit(db, current_user.id, "remove_file_from_kb", "knowledge_base", str(kb_id), {"file_id": file_id}),
+        cache_service.apipeline_delete(
+            [cache_service.key_kb_detail(kb_id), *cache_service.kb_list_keys(current_user.id)],
+        ),
+        return_exceptions=True,
+    )
     return None
 
 
@@ -292,15 +329,15 @@ async def reindex_file_in_knowledge_base(
     kb_id: int,
     file_id: int,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
-    """重新索引：先移除该文件在本库中的分块与向量，再重新切分与向量化"""
-    kb_service = KnowledgeBaseService(db)
+    """重新索引（同步，请求内完成切分与向量化，大文件耗时较长；前端走 reindex-async，本接口保留兼容）：先移除该文件在本库中的分块与向量，再重新切分与向量化"""
     kb = await kb_service.reindex_file_in_knowledge_base(kb_id, file_id, current_user.id)
     if not kb:
         raise HTTPException(status_code=404, detail="知识库或文件不存在")
-    await asyncio.to_thread(cache_service.delete, cache_service.key_kb_detail(kb_id))
-    await asyncio.to_thread(cache_service.delete_by_prefix, cache_service.prefix_user_kb_list(current_user.id))
+    await cache_service.apipeline_delete(
+        [cache_service.key_kb_detail(kb_id), *cache_service.kb_list_keys(current_user.id)],
+    )
     return kb
 
 
@@ -309,18 +346,17 @@ async def reindex_file_in_knowledge_base_async(
     kb_id: int,
     file_id: int,
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
     """异步重新索引该文件：立即返回 task_id，轮询 GET /api/v1/tasks/{task_id} 查看状态。Redis/Celery 不可用或提交超时时自动降级为同步执行。"""
     logger.info("[async] 收到重新索引请求 kb_id=%s file_id=%s", kb_id, file_id)
-    kb_service = KnowledgeBaseService(db)
     kb = await kb_service.get_knowledge_base(kb_id, current_user.id)
     if not kb:
         raise HTTPException(status_code=404, detail="知识库不存在")
     try:
-        task = await _submit_celery_task(lambda: reindex_file_in_kb_task.delay(kb_id, file_id, current_user.id))
-        logger.info("[async] 任务已提交 task_id=%s", task.id)
-        return TaskEnqueueResponse(task_id=task.id, message="任务已提交，请轮询 GET /api/v1/tasks/{task_id} 查看状态")
+        task_id = await submit_celery_task(send_without_result_wait, reindex_file_in_kb_task, kb_id, file_id, current_user.id)
+        logger.info("[async] 任务已提交 task_id=%s", task_id)
+        return TaskEnqueueResponse(task_id=task_id, message="任务已提交，请轮询 GET /api/v1/tasks/{task_id} 查看状态")
     except asyncio.TimeoutError:
         logger.warning("[async] 提交 Celery 任务超时（%ss），不执行同步重索引以避免与 Worker 并发导致死锁", CELERY_SUBMIT_TIMEOUT)
         return TaskEnqueueResponse(
@@ -347,18 +383,18 @@ async def reindex_file_in_knowledge_base_async(
 async def reindex_all_in_knowledge_base_async(
     kb_id: int,
     current_user: UserResponse = Depends(get_current_active_user),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
     db: AsyncSession = Depends(get_db),
 ):
     """全库重新索引：对该知识库内所有文件逐个重新索引，立即返回 task_id，轮询 GET /api/v1/tasks/{task_id} 查看状态。Redis/Celery 不可用或提交超时时自动降级为同步执行。"""
     logger.info("[async] 收到全库重索引请求 kb_id=%s", kb_id)
-    kb_service = KnowledgeBaseService(db)
     kb = await kb_service.get_knowledge_base(kb_id, current_user.id)
     if not kb:
         raise HTTPException(status_code=404, detail="知识库不存在")
     try:
-        task = await _submit_celery_task(lambda: reindex_all_in_kb_task.delay(kb_id, current_user.id))
-        logger.info("[async] 任务已提交 task_id=%s", task.id)
-        return TaskEnqueueResponse(task_id=task.id, message="任务已提交，请轮询 GET /api/v1/tasks/{task_id} 查看状态")
+        task_id = await submit_celery_task(send_without_result_wait, reindex_all_in_kb_task, kb_id, current_user.id)
+        logger.info("[async] 任务已提交 task_id=%s", task_id)
+        return TaskEnqueueResponse(task_id=task_id, message="任务已提交，请轮询 GET /api/v1/tasks/{task_id} 查看状态")
     except asyncio.TimeoutError:
         logger.warning("[async] 提交 Celery 任务超时（%ss），不执行同步全库重索引以避免与 Worker 并发导致死锁", CELERY_SUBMIT_TIMEOUT)
         return TaskEnqueueResponse(
@@ -373,14 +409,10 @@ async def reindex_all_in_knowledge_base_async(
             from app.models.knowledge_base import KnowledgeBaseFile
             result = await db.execute(select(KnowledgeBaseFile.file_id).where(KnowledgeBaseFile.knowledge_base_id == kb_id))
             file_ids = [r[0] for r in result.all()]
-            reindexed = 0
-            for fid in file_ids:
-                try:
-                    await kb_service.reindex_file_in_knowledge_base(kb_id, fid, current_user.id)
-                    reindexed += 1
-                except Exception as inner:
-                    logger.warning("同步重索引 file_id=%s 失败: %s", fid, inner)
+            reindexed = await kb_service.reindex_files_concurrently(kb_id, file_ids, current_user.id)
             kb = await kb_service.get_knowledge_base(kb_id, current_user.id)
+            if kb:
+                await db.refresh(kb)
             return TaskEnqueueResponse(
                 task_id=None,
                 message="Redis/Celery 不可用，已同步执行完成",
@@ -395,28 +427,77 @@ async def export_knowledge_base(
     kb_id: int,
     format: str = Query("json", description="导出格式：json 或 zip"),
     current_user: UserResponse = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
-    """导出知识库为 JSON 或 ZIP（元数据 + 分块文本），便于迁移与备份。"""
-    kb_service = KnowledgeBaseService(db)
+    """导出知识库为 JSON 或 ZIP（元数据 + 分块文本），便于迁移与备份。两种格式都边查边发送，内存中只保留一个文件的分块。"""
     try:
-        data = await kb_service.export_knowledge_base(kb_id, current_user.id)
+        meta = await kb_service.get_export_meta(kb_id, current_user.id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     if format == "zip":
-        buf = io.BytesIO()
-        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-            zf.writestr("knowledge_base_meta.json", json.dumps(data["knowledge_base"], ensure_ascii=False, indent=2))
-            zf.writestr("files_chunks.json", json.dumps(data["files"], ensure_ascii=False, indent=2))
-        buf.seek(0)
         filename = f"kb_{kb_id}_export.zip"
         return StreamingResponse(
-            buf,
+            _stream_export_zip(kb_service, kb_id, current_user.id, meta),
             media_type="application/zip",
             headers={"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"},
         )
-    return Response(
-        content=json.dumps(data, ensure_ascii=False, indent=2),
+    return StreamingResponse(
+        _stream_export_json(kb_service, kb_id, current_user.id, meta),
         media_type="application/json",
         headers={"Content-Disposition": f"attachment; filename*=UTF-8''kb_{kb_id}_export.json"},
     )
+
+
+async def _stream_export_json(kb_service: KnowledgeBaseService, kb_id: int, user_id: int, meta: dict):
+    """按 {"knowledge_base": ..., "files": [...]} 结构逐文件产出 JSON 片段（紧凑格式）。"""
+    yield b'{"knowledge_base":' + orjson.dumps(meta) + b',"files":['
+    sep = b""
+    async for item in kb_service.iter_export_files(kb_id, user_id):
+        yield sep + orjson.dumps(item)
+        sep = b","
+    yield b"]}"
+
+
+class _ZipSink:
+    """ZipFile 的只写输出：暂存已写出的字节，由生成器按块取走。不提供 seek，zipfile 会改用数据描述符写法。"""
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._pos = 0
+
+    def write(self, data) -> int:
+        self._buf += data
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+async def _stream_export_zip(kb_service: KnowledgeBaseService, kb_id: int, user_id: int, meta: dict):
+    """逐文件查询分块、写入压缩流并立即产出已压缩的字节；files_chunks.json 不缩进。"""
+    sink = _ZipSink()
+    zf = zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED)
+    try:
+        zf.writestr("knowledge_base_meta.json", orjson.dumps(meta, option=orjson.OPT_INDENT_2))
+        with zf.open("files_chunks.json", "w", force_zip64=True) as fp:
+            fp.write(b"[")
+            sep = b""
+            async for item in kb_service.iter_export_files(kb_id, user_id):
+                fp.write(sep + orjson.dumps(item))
+                sep = b","
+                data = sink.drain()
+                if data:
+                    yield data
+            fp.write(b"]")
+    finally:
+        zf.close()
+    yield sink.drain()
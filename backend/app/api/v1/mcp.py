@@ -1,14 +1,19 @@
 """MCP 服务管理 API：CRUD、列举工具、测试调用"""
-import json
+import hashlib
 import logging
+import re
 from typing import List
+
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
 
 logger = logging.getLogger(__name__)
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.ttl_cache import TTLCache
 from app.models.mcp_server import McpServer
 from app.schemas.mcp import (
     McpServerCreate,
@@ -20,6 +25,7 @@ from app.schemas.mcp import (
 )
 from app.schemas.auth import UserResponse
 from app.api.v1.auth import get_current_active_user
+from app.services import cache_service
 from app.services.mcp_client_service import (
     list_tools_from_server,
     call_tool_on_server,
@@ -28,22 +34,43 @@ from app.services.mcp_client_service import (
 
 router = APIRouter()
 
+# 单个服务配置的进程内短缓存（查看详情 / 列举工具 / 测试调用反复读取同一行）；更新、删除时按 id 失效
+_server_cache = TTLCache(maxsize=256, ttl=getattr(settings, "MCP_SERVER_CACHE_TTL_SEC", 5))
 
-def _mcp_error_message(exc: Exception) -> str:
-    """从 Exception 或 ExceptionGroup 中取出可读错误信息，避免 502 里堆栈刷屏。"""
-    if hasattr(exc, "exceptions") and len(getattr(exc, "exceptions", ())) > 0:
-        first = getattr(exc, "exceptions", ())[0]
-        return _mcp_error_message(first) if hasattr(first, "exceptions") else str(first)
-    return str(exc)
 
+async def _load_server(db: AsyncSession, server_id: int) -> dict:
+    """按 id 取服务配置（先查进程内缓存，再 db.get），不存在抛 404。"""
+    row = _server_cache.get(server_id)
+    if row is None:
+        server = await db.get(McpServer, server_id)
+        if not server:
+            raise HTTPException(status_code=404, detail="MCP 服务不存在")
+        row = {
+            "id": server.id,
+            "name": server.name,
+            "transport_type": server.transport_type,
+            "config": server.config,
+            "enabled": server.enabled,
+        }
+        _server_cache.set(server_id, row)
+    return row
 
-def _config_to_dict(config_text: str) -> dict:
-    if not config_text:
-        return {}
-    try:
-        return json.loads(config_text)
-    except json.JSONDecodeError:
-        return {}
+
+# 列举工具失败时按错误文本归类，给出排查提示（模块加载时编译一次）
+_SSE_CONTENT_TYPE_RE = re.compile(r"(?=.*text/event-stream)(?=.*(?:Expected|contain|got ''))", re.S)
+_EMPTY_CONTENT_RE = re.compile(r"(?=.*empty)(?=.*content)", re.S | re.I)
+_CONTENT_TYPE_RE = re.compile(r"content type", re.I)
+_INVALID_JSON_RE = re.compile(r"Invalid JSON|EOF while parsing|Error parsing JSON|input_value=b''")
+
+
+def _mcp_error_message(exc: Exception) -> str:
+    """从 Exception 或 ExceptionGroup 中取出可读错误信息（逐层取第一个子异常），避免 502 里堆栈刷屏。"""
+    cur = exc
+    while True:
+        subs = getattr(cur, "exceptions", None)
+        if not subs:
+            return str(cur)
+        cur = subs[0]
 
 
 @router.get("", response_model=List[McpServerResponse])
@@ -52,17 +79,19 @@ async def list_mcp_servers(
     db: AsyncSession = Depends(get_db),
 ):
     """获取 MCP 服务列表"""
-    result = await db.execute(select(McpServer).order_by(McpServer.id))
-    servers = result.scalars().all()
+    # 分批流式读取，逐行转为响应对象，不再先把整张表的 ORM 对象攒成列表
+    servers = await db.stream_scalars(
+        select(McpServer).order_by(McpServer.id).execution_options(yield_per=100)
+    )
     return [
         McpServerResponse(
             id=s.id,
             name=s.name,
             transport_type=s.transport_type,
-            config=_config_to_dict(s.config),
+            config=s.config or {},
             enabled=s.enabled,
         )
-        for s in servers
+        async for s in servers
     ]
 
 
@@ -76,7 +105,7 @@ async def create_mcp_server(
     server = McpServer(
         name=body.name,
         transport_type=body.transport_type,
-        config=json.dumps(body.config, ensure_ascii=False),
+        config=body.config,
         enabled=body.enabled,
     )
     db.add(server)
@@ -106,16 +135,13 @@ async def get_mcp_server(
     db: AsyncSession = Depends(get_db),
 ):
     """获取单个 MCP 服务"""
-    result = await db.execute(select(McpServer).where(McpServer.id == server_id))
-    server = result.scalar_one_or_none()
-    if not server:
-        raise HTTPException(status_code=404, detail="MCP 服务不存在")
+    server = await _load_server(db, server_id)
     return McpServerResponse(
-        id=server.id,
-        name=server.name,
-        transport_type=server.transport_type,
-        config=_config_to_dict(server.config),
-        enabled=server.enabled,
+        id=server["id"],
+        name=server["name"],
+        transport_type=server["transport_type"],
+        config=server["config"] or {},
+        enabled=server["enabled"],
     )
 
 
@@ -127,8 +153,7 @@ async def update_mcp_server(
     db: AsyncSession = Depends(get_db),
 ):
     """更新 MCP 服务配置"""
-    result = await db.execute(select(McpServer).where(McpServer.id == server_id))
-    server = result.scalar_one_or_none()
+    server = await db.get(McpServer, server_id)
     if not server:
         raise HTTPException(status_code=404, detail="MCP 服务不存在")
     if body.name is not None:
@@ -136,16 +161,18 @@ async def update_mcp_server(
     if body.transport_type is not None:
         server.transport_type = body.transport_type
     if body.config is not None:
-        server.config = json.dumps(body.config, ensure_ascii=False)
+        server.config = body.config
     if body.enabled is not None:
         server.enabled = body.enabled
     await db.commit()
+    _server_cache.pop(server_id)
+    await cache_service.apipeline_delete([], prefixes=[cache_service.prefix_mcp_tools(server_id)])
     await db.refresh(server)
     return McpServerResponse(
         id=server.id,
         name=server.name,
         transport_type=server.transport_type,
-        config=_config_to_dict(server.config),
+        config=server.config or {},
         enabled=server.enabled,
     )
 
@@ -157,12 +184,13 @@ async def delete_mcp_server(
     db: AsyncSession = Depends(get_db),
 ):
     """删除 MCP 服务配置"""
-    result = await db.execute(select(McpServer).where(McpServer.id == server_id))
-    server = result.scalar_one_or_none()
+    server = await db.get(McpServer, server_id)
     if not server:
         raise HTTPException(status_code=404, detail="MCP 服务不存在")
     await db.delete(server)
     await db.commit()
+    _server_cache.pop(server_id)
+    await cache_service.apipeline_delete([], prefixes=[cache_service.prefix_mcp_tools(server_id)])
 
 
 @router.get("/{server_id}/tools", response_model=McpToolsListResponse)
@@ -174,42 +202,52 @@ async def list_server_tools(
     """列举指定 MCP 服务的工具（用于管理后台测试与展示）"""
     if not MCP_AVAILABLE:
         raise HTTPException(status_code=503, detail="MCP SDK 未安装")
-    result = await db.execute(select(McpServer).where(McpServer.id == server_id))
-    server = result.scalar_one_or_none()
-    if not server:
-        raise HTTPException(status_code=404, detail="MCP 服务不存在")
+    server = await _load_server(db, server_id)
+    # 工具列表按 (server_id, 配置指纹) 短时缓存，管理后台轮询不必每次重新握手
+    config_fp = hashlib.blake2b(
+        orjson.dumps(server["config"] or {}, option=orjson.OPT_SORT_KEYS), digest_size=8
+    ).hexdigest()
+    cache_key = cache_service.key_mcp_tools(server_id, config_fp)
+    tools = await cache_service.aget(cache_key)
+    if tools is not None:
+        return _tools_response(server, tools)
     try:
-        tools = await list_tools_from_server(server.transport_type, server.config)
+        tools = await list_tools_from_server(server["transport_type"], server["config"])
     except Exception as e:
         detail = _mcp_error_message(e)
-        logger.exception("MCP 服务 %s (id=%s) 列举工具失败: %s", server.name, server_id, detail)
-        if "text/event-stream" in detail and ("Expected" in detail or "contain" in detail or "got ''" in detail):
+        logger.exception("MCP 服务 %s (id=%s) 列举工具失败: %s", server["name"], server_id, detail)
+        if _SSE_CONTENT_TYPE_RE.match(detail):
             detail = (
                 "SSE 连接失败：服务端对 GET 请求的响应未返回 Content-Type: text/event-stream（当前为空或不符合）。"
                 "请确认：1) 该 URL 是否为 MCP SSE 端点（非 Streamable HTTP POST 端点）；"
                 "2) 阿里云/天气等 MCP 若使用 SSE，需提供返回 text/event-stream 的 GET 地址；"
                 "3) 若该服务仅支持 Streamable HTTP，请选用 streamable_http 传输类型并确认服务端实现。"
             )
-        elif "empty or missing Content-Type" in detail or "empty" in detail.lower() and "content" in detail.lower():
+        elif _EMPTY_CONTENT_RE.match(detail):
             detail = (
                 "MCP 服务端对 initialize 的 POST 返回了空 body 且未带 Content-Type，"
                 "与 MCP Streamable HTTP 协议不符。若为阿里云百炼 MCP，请确认：1) 该端点是否声明兼容 MCP Streamable HTTP；"
                 "2) 是否有其他兼容的 URL 或接入方式；3) 向阿里云反馈需返回标准 JSON-RPC 响应。"
             )
-        elif "Unexpected content type" in detail or "content type" in detail.lower():
+        elif _CONTENT_TYPE_RE.search(detail):
             detail = (
                 f"{detail} "
                 "（MCP 服务端对 POST 的响应须为 Content-Type: application/json；SSE 对 GET 的响应须为 text/event-stream）"
             )
-        elif "Invalid JSON" in detail or "EOF while parsing" in detail or "Error parsing JSON" in detail or "input_value=b''" in detail:
+        elif _INVALID_JSON_RE.search(detail):
             detail = (
                 f"{detail} "
                 "（服务端可能返回了空 body 或非 JSON；请确认该 MCP 端点与 MCP Streamable HTTP 协议一致）"
             )
         raise HTTPException(status_code=502, detail=f"连接 MCP 服务失败: {detail}")
+    await cache_service.aset(cache_key, tools, ttl=getattr(settings, "CACHE_TTL_MCP_TOOLS", 30))
+    return _tools_response(server, tools)
+
+
+def _tools_response(server: dict, tools: list) -> McpToolsListResponse:
     return McpToolsListResponse(
-        server_id=server.id,
-        server_name=server.name,
+        server_id=server["id"],
+        server_name=server["name"],
         tools=[McpToolItem(name=t["name"], description=t.get("description") or "", inputSchema=t.get("inputSchema") or {}) for t in tools],
     )
 
@@ -224,14 +262,11 @@ async def call_server_tool(
     """测试调用：在指定 MCP 服务上执行工具（用于管理后台测试）"""
     if not MCP_AVAILABLE:
         raise HTTPException(status_code=503, detail="MCP SDK 未安装")
-    result = await db.execute(select(McpServer).where(McpServer.id == server_id))
-    server = result.scalar_one_or_none()
-    if not server:
-        raise HTTPException(status_code=404, detail="MCP 服务不存在")
+    server = await _load_server(db, server_id)
     try:
         out = await call_tool_on_server(
-            server.transport_type,
-            server.config,
+            server["transport_type"],
+            server["config"],
             body.tool_name,
             body.arguments,
         )
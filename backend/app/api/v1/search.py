@@ -1,27 +1,31 @@
 """
 以文搜图、图搜图、多模态统一检索 API
 """
-import base64
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+import hashlib
+import time
+
+import pybase64
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import List, Optional, Union
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.schemas.auth import UserResponse
-from app.schemas.knowledge_base import (
-    ImageSearchItem,
-    ImageSearchResponse,
-    UnifiedSearchItem,
-    UnifiedSearchResponse,
-)
+from app.schemas.knowledge_base import ImageSearchResponse, UnifiedSearchResponse
 from app.api.v1.auth import get_current_active_user
-from app.api.deps import require_search_rate_limit
+from app.api.deps import etag_matches, require_search_rate_limit
+from app.services.knowledge_access import missing_kb_ids
 from app.services.knowledge_base_service import KnowledgeBaseService
+from app.services.semantic_cache_service import aget_query_embedding, semantic_query_cache
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
 router = APIRouter()
 
+_UPLOAD_READ_CHUNK = 1024 * 1024
+
 
 class ImageSearchRequest(BaseModel):
     """以文搜图请求"""
@@ -48,133 +52,264 @@ class ByImageSearchRequest(BaseModel):
     top_k: int = 20
 
 
-@router.post("/images", response_model=ImageSearchResponse)
+def _decode_data_url(raw: Union[str, bytes, memoryview]) -> bytes:
+    """
+    解码 base64 图片（可带 data:image/...;base64, 前缀）。前缀只会出现在开头几十个字符内，
+    只在前 64 个字符里找逗号再切片，不对整段（可能数 MB）做 in + split 两次全量扫描；
+    bytes / memoryview 直接交给 b64decode，不经 str 解码。
+    """
+    try:
+        if isinstance(raw, str):
+            comma = raw.find(",", 0, 64)
+        else:
+            raw = memoryview(raw)
+            comma = bytes(raw[:64]).find(b",")
+        if comma != -1:
+            raw = raw[comma + 1:]
+        return pybase64.b64decode(raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="image_base64 解析失败")
+
+
+async def _read_upload(file: UploadFile) -> bytearray:
+    """
+    按块读取上传图片，累计超过 MAX_FILE_SIZE 立即 413；已知大小（multipart 解析后的 file.size）超限时不读任何内容。
+    返回 bytearray 直接交给检索服务（向量化只做 base64 编码，接受任意 bytes-like），省去 read() 后再拼一份整图。
+    """
+    max_size = int(getattr(settings, "MAX_FILE_SIZE", 104857600))
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(status_code=413, detail="文件过大")
+    buf = bytearray()
+    while True:
+        chunk = await file.read(_UPLOAD_READ_CHUNK)
+        if not chunk:
+            break
+        buf += chunk
+        if len(buf) > max_size:
+            raise HTTPException(status_code=413, detail="文件过大")
+    if not buf:
+        raise HTTPException(status_code=400, detail="请上传图片文件")
+    return buf
+
+
+async def _resolve_kb_ids(
+    db: AsyncSession,
+    user_id: int,
+    knowledge_base_id: Optional[int],
+    knowledge_base_ids: Optional[List[int]],
+) -> Optional[List[int]]:
+    """合并单选/多选知识库参数（多选优先）并校验归属（带进程内缓存，见 knowledge_access），任一不存在即 404；都未传返回 None 表示检索全部知识库。"""
+    kb_ids = knowledge_base_ids if knowledge_base_ids else ([knowledge_base_id] if knowledge_base_id is not None else None)
+    if kb_ids:
+        missing = await missing_kb_ids(db, user_id, kb_ids)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"知识库 {missing[0]} 不存在")
+    return kb_ids
+
+
+def _search_etag(kind: str, user_id: int, query: str, knowledge_base_id: Optional[int], knowledge_base_ids: Optional[List[int]], top_k: int) -> Optional[str]:
+    """
+    GET 以文检索的弱 ETag：按 (检索类型, 用户, 查询, 知识库范围, top_k) 与 SEARCH_HTTP_CACHE_SEC 时间窗口哈希，
+    窗口内同一查询 ETag 不变，换窗口后自动失效（最长陈旧时间与 max-age 一致）。未开启返回 None。
+    """
+    window = int(getattr(settings, "SEARCH_HTTP_CACHE_SEC", 30))
+    if window <= 0:
+        return None
+    kbs = ",".join(str(i) for i in sorted(knowledge_base_ids)) if knowledge_base_ids else str(knowledge_base_id)
+    raw = f"{kind}\n{user_id}\n{query}\n{kbs}\n{top_k}\n{int(time.time()) // window}"
+    return f'W/"{hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()}"'
+
+
+def _cache_headers(etag: Optional[str]) -> dict:
+    if etag is None:
+        return {}
+    return {"ETag": etag, "Cache-Control": f"private, max-age={int(getattr(settings, 'SEARCH_HTTP_CACHE_SEC', 30))}"}
+
+
+async def _text_search_rows(kind: str, db: AsyncSession, user_id: int, query: str, kb_ids: Optional[List[int]], top_k: int) -> List[dict]:
+    """以文检索（images / unified）：先查语义缓存，未命中再检索并回填。"""
+    query_vec = await aget_query_embedding(query)
+    ns = semantic_query_cache.namespace(kind, user_id, kb_ids, top_k)
+    rows = await semantic_query_cache.alookup(ns, query_vec)
+    if rows is None:
+        kb_service = KnowledgeBaseService(db)
+        search = kb_service.search_images_by_text if kind == "images" else kb_service.search_unified
+        rows = await search(query=query, user_id=user_id, knowledge_base_ids=kb_ids, top_k=top_k, query_vec=query_vec)
+        await semantic_query_cache.astore(ns, query_vec, rows)
+    return rows
+
+
+@router.get("/images", response_model=ImageSearchResponse, response_class=ORJSONResponse)
+async def search_images_by_text_get(
+    request: Request,
+    query: str,
+    knowledge_base_id: Optional[int] = None,
+    knowledge_base_ids: Optional[List[int]] = Query(None),
+    top_k: int = 20,
+    current_user: UserResponse = Depends(require_search_rate_limit),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    以文搜图（GET，参数同 POST /images）：响应带弱 ETag 与 Cache-Control: private, max-age=SEARCH_HTTP_CACHE_SEC，
+    窗口内携带 If-None-Match 重复同一查询直接 304，不做任何检索。条件请求只对 GET 有效，POST 接口不带这两个头。
+    """
+    q = query.strip()
+    if not q:
+        return ORJSONResponse({"files": []})
+    top_k = min(top_k, 50)
+    etag = _search_etag("images", current_user.id, q, knowledge_base_id, knowledge_base_ids, top_k)
+    if etag is not None and etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_cache_headers(etag))
+    kb_ids = await _resolve_kb_ids(db, current_user.id, knowledge_base_id, knowledge_base_ids)
+    response = _image_response(await _text_search_rows("images", db, current_user.id, q, kb_ids, top_k))
+    response.headers.update(_cache_headers(etag))
+    return response
+
+
+@router.post("/images", response_model=ImageSearchResponse, response_class=ORJSONResponse)
 async def search_images_by_text(
     body: ImageSearchRequest,
     current_user: UserResponse = Depends(require_search_rate_limit),
     db: AsyncSession = Depends(get_db),
 ):
-    """以文搜图：根据文本在知识库中检索匹配的图片。可选指定知识库。"""
+    """以文搜图：根据文本在知识库中检索匹配的图片。可选指定知识库（knowledge_base_id 或多选 knowledge_base_ids）。"""
     if not (body.query and body.query.strip()):
-        return ImageSearchResponse(files=[])
-    kb_service = KnowledgeBaseService(db)
-    if body.knowledge_base_id is not None:
-        kb = await kb_service.get_knowledge_base(body.knowledge_base_id, current_user.id)
-        if not kb:
-            raise HTTPException(status_code=404, detail="知识库不存在")
-    rows = await kb_service.search_images_by_text(
-        query=body.query.strip(),
-        user_id=current_user.id,
-        knowledge_base_id=body.knowledge_base_id,
-        top_k=min(body.top_k, 50),
-    )
-    return ImageSearchResponse(
-        files=[
-            ImageSearchItem(
-                file_id=r["file_id"],
-                original_filename=r["original_filename"],
-                file_type=r["file_type"],
-                snippet=r.get("snippet"),
-                score=r.get("score"),
-            )
-            for r in rows
-        ]
-    )
+        return ORJSONResponse({"files": []})
+    kb_ids = await _resolve_kb_ids(db, current_user.id, body.knowledge_base_id, body.knowledge_base_ids)
+    q = body.query.strip()
+    top_k = min(body.top_k, 50)
+    return _image_response(await _text_search_rows("images", db, current_user.id, q, kb_ids, top_k))
+
+
+@router.get("/unified", response_model=UnifiedSearchResponse, response_class=ORJSONResponse)
+async def search_unified_get(
+    request: Request,
+    query: str,
+    knowledge_base_id: Optional[int] = None,
+    knowledge_base_ids: Optional[List[int]] = Query(None),
+    top_k: int = 30,
+    current_user: UserResponse = Depends(require_search_rate_limit),
+    db: AsyncSession = Depends(get_db),
+):
+    """多模态统一检索的以文检索（GET，参数同 POST /unified 的 query 模式）：ETag / Cache-Control / 304 同 GET /images。"""
+    q = query.strip()
+    if not q:
+        return ORJSONResponse({"items": []})
+    top_k = min(top_k, 50)
+    etag = _search_etag("unified", current_user.id, q, knowledge_base_id, knowledge_base_ids, top_k)
+    if etag is not None and etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_cache_headers(etag))
+    kb_ids = await _resolve_kb_ids(db, current_user.id, knowledge_base_id, knowledge_base_ids)
+    response = _unified_response(await _text_search_rows("unified", db, current_user.id, q, kb_ids, top_k))
+    response.headers.update(_cache_headers(etag))
+    return response
 
 
-@router.post("/unified", response_model=UnifiedSearchResponse)
+@router.post("/unified", response_model=UnifiedSearchResponse, response_class=ORJSONResponse)
 async def search_unified(
     body: UnifiedSearchRequest,
     current_user: UserResponse = Depends(require_search_rate_limit),
     db: AsyncSession = Depends(get_db),
 ):
-    """多模态检索统一：以文搜图与文本 RAG 共用入口。传 query 或 image_base64 其一，同时返回文档与图片。"""
+    """多模态检索统一：以文搜图与文本 RAG 共用入口。传 query 或 image_base64 其一，同时返回文档与图片。
+    以图检索推荐用 /unified/upload 直接上传文件（免 base64 编解码）；image_base64 保留兼容。
+    """
     image_bytes = None
     if body.image_base64:
-        try:
-            raw = body.image_base64
-            if "," in raw:
-                raw = raw.split(",", 1)[1]
-            image_bytes = base64.b64decode(raw)
-        except Exception:
-            raise HTTPException(status_code=400, detail="image_base64 解析失败")
+        image_bytes = _decode_data_url(body.image_base64)
     if not body.query and not image_bytes:
-        return UnifiedSearchResponse(items=[])
-    kb_ids = body.knowledge_base_ids if body.knowledge_base_ids else ([body.knowledge_base_id] if body.knowledge_base_id is not None else None)
-    kb_service = KnowledgeBaseService(db)
-    if kb_ids:
-        for kid in kb_ids:
-            kb = await kb_service.get_knowledge_base(kid, current_user.id)
-            if not kb:
-                raise HTTPException(status_code=404, detail=f"知识库 {kid} 不存在")
-    rows = await kb_service.search_unified(
-        query=body.query.strip() if body.query else None,
+        return ORJSONResponse({"items": []})
+    kb_ids = await _resolve_kb_ids(db, current_user.id, body.knowledge_base_id, body.knowledge_base_ids)
+    top_k = min(body.top_k, 50)
+    # 语义缓存只用于以文检索；以图检索每次都向量化上传的图片
+    if not image_bytes:
+        return _unified_response(await _text_search_rows("unified", db, current_user.id, body.query.strip(), kb_ids, top_k))
+    rows = await KnowledgeBaseService(db).search_unified(
         image_bytes=image_bytes,
         user_id=current_user.id,
-        knowledge_base_id=body.knowledge_base_id if not kb_ids else None,
         knowledge_base_ids=kb_ids,
-        top_k=min(body.top_k, 50),
+        top_k=top_k,
     )
-    return UnifiedSearchResponse(
-        items=[
-            UnifiedSearchItem(
-                chunk_id=r["chunk_id"],
-                file_id=r["file_id"],
-                knowledge_base_id=r.get("knowledge_base_id"),
-                original_filename=r["original_filename"],
-                file_type=r["file_type"],
-                snippet=r["snippet"],
-                score=r["score"],
-                is_image=r["is_image"],
-            )
+    return _unified_response(rows)
+
+
+@router.post("/unified/upload", response_model=UnifiedSearchResponse, response_class=ORJSONResponse)
+async def search_unified_upload(
+    file: UploadFile = File(...),
+    knowledge_base_id: Optional[int] = None,
+    knowledge_base_ids: Optional[List[int]] = Query(None),
+    top_k: int = 30,
+    current_user: UserResponse = Depends(require_search_rate_limit),
+    db: AsyncSession = Depends(get_db),
+):
+    """多模态统一检索（以图）：multipart 直接上传图片文件，同时返回文档与图片。
+    与 /unified 传 image_base64 等价，但请求体小约 1/3，且服务端无需 base64 解码、少一份整图拷贝；前端以图检索优先走此接口。
+    """
+    image_bytes = await _read_upload(file)
+    kb_ids = await _resolve_kb_ids(db, current_user.id, knowledge_base_id, knowledge_base_ids)
+    rows = await KnowledgeBaseService(db).search_unified(
+        image_bytes=image_bytes,
+        user_id=current_user.id,
+        knowledge_base_ids=kb_ids,
+        top_k=min(top_k, 50),
+    )
+    return _unified_response(rows)
+
+
+def _unified_response(rows: List[dict]) -> ORJSONResponse:
+    """服务层已按 UnifiedSearchItem 字段组装好结果：只挑出响应字段直接 orjson 编码，跳过逐条 Pydantic 校验。"""
+    return ORJSONResponse({
+        "items": [
+            {
+                "chunk_id": r["chunk_id"],
+                "file_id": r["file_id"],
+                "knowledge_base_id": r.get("knowledge_base_id"),
+                "original_filename": r["original_filename"],
+                "file_type": r["file_type"],
+                "snippet": r["snippet"],
+                "score": r["score"],
+                "is_image": r["is_image"],
+            }
             for r in rows
         ]
-    )
+    })
+
+
+def _image_response(rows: List[dict]) -> ORJSONResponse:
+    """同 _unified_response，字段对应 ImageSearchItem。"""
+    return ORJSONResponse({
+        "files": [
+            {
+                "file_id": r["file_id"],
+                "original_filename": r["original_filename"],
+                "file_type": r["file_type"],
+                "snippet": r.get("snippet"),
+                "score": r.get("score"),
+            }
+            for r in rows
+        ]
+    })
 
 
-@router.post("/by-image", response_model=ImageSearchResponse)
+@router.post("/by-image", response_model=ImageSearchResponse, response_class=ORJSONResponse)
 async def search_by_image(
     body: ByImageSearchRequest,
     current_user: UserResponse = Depends(require_search_rate_limit),
     db: AsyncSession = Depends(get_db),
 ):
     """图搜图：上传图片的 base64，在知识库中检索相似图片。可多选知识库。"""
-    try:
-        raw = body.image_base64
-        if "," in raw:
-            raw = raw.split(",", 1)[1]
-        image_bytes = base64.b64decode(raw)
-    except Exception:
-        raise HTTPException(status_code=400, detail="image_base64 解析失败")
-    kb_ids = body.knowledge_base_ids if body.knowledge_base_ids else ([body.knowledge_base_id] if body.knowledge_base_id is not None else None)
-    kb_service = KnowledgeBaseService(db)
-    if kb_ids:
-        for kid in kb_ids:
-            kb = await kb_service.get_knowledge_base(kid, current_user.id)
-            if not kb:
-                raise HTTPException(status_code=404, detail=f"知识库 {kid} 不存在")
-    rows = await kb_service.search_images_by_image(
+    image_bytes = _decode_data_url(body.image_base64)
+    kb_ids = await _resolve_kb_ids(db, current_user.id, body.knowledge_base_id, body.knowledge_base_ids)
+    rows = await KnowledgeBaseService(db).search_images_by_image(
         image_bytes=image_bytes,
         user_id=current_user.id,
-        knowledge_base_id=body.knowledge_base_id if not kb_ids else None,
         knowledge_base_ids=kb_ids,
         top_k=min(body.top_k, 50),
     )
-    return ImageSearchResponse(
-        files=[
-            ImageSearchItem(
-                file_id=r["file_id"],
-                original_filename=r["original_filename"],
-                file_type=r["file_type"],
-                snippet=r.get("snippet"),
-                score=r.get("score"),
-            )
-            for r in rows
-        ]
-    )
+    return _image_response(rows)
 
 
-@router.post("/by-image/upload", response_model=ImageSearchResponse)
+@router.post("/by-image/upload", response_model=ImageSearchResponse, response_class=ORJSONResponse)
 async def search_by_image_upload(
     file: UploadFile = File(...),
     knowledge_base_id: Optional[int] = None,
@@ -184,32 +319,12 @@ async def search_by_image_upload(
     db: AsyncSession = Depends(get_db),
 ):
     """图搜图：上传图片文件，在知识库中检索相似图片。可多选知识库（传 knowledge_base_ids=1&knowledge_base_ids=2）。"""
-    content = await file.read()
-    if not content or len(content) == 0:
-        raise HTTPException(status_code=400, detail="请上传图片文件")
-    kb_ids = knowledge_base_ids if knowledge_base_ids else ([knowledge_base_id] if knowledge_base_id is not None else None)
-    kb_service = KnowledgeBaseService(db)
-    if kb_ids:
-        for kid in kb_ids:
-            kb = await kb_service.get_knowledge_base(kid, current_user.id)
-            if not kb:
-                raise HTTPException(status_code=404, detail=f"知识库 {kid} 不存在")
-    rows = await kb_service.search_images_by_image(
+    content = await _read_upload(file)
+    kb_ids = await _resolve_kb_ids(db, current_user.id, knowledge_base_id, knowledge_base_ids)
+    rows = await KnowledgeBaseService(db).search_images_by_image(
         image_bytes=content,
         user_id=current_user.id,
-        knowledge_base_id=knowledge_base_id if not kb_ids else None,
         knowledge_base_ids=kb_ids,
         top_k=min(top_k, 50),
     )
-    return ImageSearchResponse(
-        files=[
-            ImageSearchItem(
-                file_id=r["file_id"],
-                original_filename=r["original_filename"],
-                file_type=r["file_type"],
-                snippet=r.get("snippet"),
-                score=r.get("score"),
-            )
-            for r in rows
-        ]
-    )
+    return _image_response(rows)
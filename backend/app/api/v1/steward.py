@@ -21,8 +21,9 @@ async def steward_run(
     """执行浏览器助手指令：根据用户输入在浏览器中完成操作（如打开网页、登录、获取 cookie 等）。"""
     try:
         success, summary, steps, error = await run_steward(body.instruction)
-        step_items = [StewardStepItem(tool=s["tool"], args=s["args"], result=s["result"]) for s in steps]
-        return StewardRunResponse(
+        # steps 由 agent 按 StewardStepItem 结构产出，model_construct 跳过构造时校验（响应模型输出时仍会校验一次）
+        step_items = [StewardStepItem.model_construct(tool=s["tool"], args=s["args"], result=s["result"]) for s in steps]
+        return StewardRunResponse.model_construct(
             success=success,
             summary=summary,
             steps=step_items,
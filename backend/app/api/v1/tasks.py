@@ -1,33 +1,53 @@
 """
-异步任务状态 API：轮询 GET /tasks/{task_id} 获取任务结果
+异步任务状态 API：轮询 GET /tasks/{task_id} 获取任务结果，POST /tasks/batch 一次查询多个任务
+状态、结果与 traceback 都取自 result backend 中同一份元数据：单个任务一次 GET，批量一次 MGET
+（AsyncResult 的 state / successful() / result / traceback 各自读一次 backend）。
 """
-from fastapi import APIRouter, Depends, HTTPException
-from celery.result import AsyncResult
+import asyncio
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends
+from celery import states
 
 from app.celery_app import celery_app
-from app.schemas.tasks import TaskStatusResponse
+from app.schemas.tasks import TaskBatchRequest, TaskBatchResponse, TaskStatusResponse
 from app.schemas.auth import UserResponse
 from app.api.v1.auth import get_current_active_user
 
 router = APIRouter()
 
 
-@router.get("/{task_id}", response_model=TaskStatusResponse)
-async def get_task_status(
+def _fetch_task_metas(task_ids: List[str]) -> List[Dict[str, Any]]:
+    """读取任务元数据（阻塞调用，放线程池执行）。Redis backend 走一次 MGET，其他 backend 逐个 get_task_meta。"""
+    backend = celery_app.backend
+    client = getattr(backend, "client", None)
+    if len(task_ids) > 1 and hasattr(client, "mget") and hasattr(backend, "get_key_for_task"):
+        raws = client.mget([backend.get_key_for_task(tid) for tid in task_ids])
+        return [
+            backend.decode_result(raw) if raw else {"status": states.PENDING, "result": None}
+            for raw in raws
+        ]
+    return [backend.get_task_meta(tid) for tid in task_ids]
+
+
+def _to_status(
     task_id: str,
-    current_user: UserResponse = Depends(get_current_active_user),
-):
-    """查询异步任务状态与结果。status: PENDING/STARTED/SUCCESS/FAILURE；成功时 result 有值，失败时 error 有值。"""
-    result = AsyncResult(task_id, app=celery_app)
-    status = result.state
+    meta: Dict[str, Any],
+    include_traceback: bool = False,
+    status_only: bool = False,
+) -> TaskStatusResponse:
+    """status_only 时不返回成功结果；traceback 可能有数 KB，仅 include_traceback 时返回。失败时 error 始终返回。"""
+    status = meta.get("status") or states.PENDING
     res = None
     err = None
     tb = None
-    if result.successful():
-        res = result.result
-    elif result.failed():
-        err = str(result.result) if result.result else "Unknown error"
-        tb = result.traceback
+    if status == states.SUCCESS:
+        if not status_only:
+            res = meta.get("result")
+    elif status == states.FAILURE:
+        err = str(meta.get("result")) if meta.get("result") else "Unknown error"
+        if include_traceback and not status_only:
+            tb = meta.get("traceback")
     return TaskStatusResponse(
         task_id=task_id,
         status=status,
@@ -35,3 +55,31 @@ async def get_task_status(
         error=err,
         traceback=tb,
     )
+
+
+@router.post("/batch", response_model=TaskBatchResponse)
+async def get_task_status_batch(
+    body: TaskBatchRequest,
+    current_user: UserResponse = Depends(get_current_active_user),
+):
+    """批量查询异步任务状态（最多 100 个），字段与 include_traceback / status_only 含义同 GET /tasks/{task_id}。"""
+    metas = await asyncio.to_thread(_fetch_task_metas, body.task_ids)
+    return TaskBatchResponse(tasks=[
+        _to_status(tid, meta, body.include_traceback, body.status_only)
+        for tid, meta in zip(body.task_ids, metas)
+    ])
+
+
+@router.get("/{task_id}", response_model=TaskStatusResponse)
+async def get_task_status(
+    task_id: str,
+    include_traceback: bool = False,
+    status_only: bool = False,
+    current_user: UserResponse = Depends(get_current_active_user),
+):
+    """
+    查询异步任务状态与结果。status: PENDING/STARTED/SUCCESS/FAILURE；成功时 result 有值，失败时 error 有值。
+    轮询时可传 status_only=true 不返回成功结果；失败详情页传 include_traceback=true 才返回 traceback。
+    """
+    metas = await asyncio.to_thread(_fetch_task_metas, [task_id])
+    return _to_status(task_id, metas[0], include_traceback, status_only)
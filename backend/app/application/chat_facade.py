@@ -5,7 +5,7 @@ from __future__ import annotations
 
 import logging
 import time
-from typing import Any, AsyncGenerator, Dict, List, Optional
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -119,6 +119,12 @@ class ChatFacade:
         _log_trace(trace_id, "get_conversation")
         return await self._svc.get_conversation(conv_id, user_id)
 
+    async def get_conversation_with_messages(
+        self, conv_id: int, user_id: int, limit: int = 100, *, trace_id: Optional[str] = None
+    ) -> Tuple[Optional[Conversation], List[Message]]:
+        _log_trace(trace_id, "get_conversation_with_messages")
+        return await self._svc.get_conversation_with_messages(conv_id, user_id, limit=limit)
+
     async def get_conversation_messages(
         self, conv_id: int, user_id: int, limit: int = 100, *, trace_id: Optional[str] = None
     ) -> List[Message]:
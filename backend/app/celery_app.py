@@ -2,7 +2,9 @@
 Celery应用配置
 """
 from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
+import orjson
 from celery import Celery
+from kombu.serialization import register
 from app.core.config import settings
 
 
@@ -22,6 +24,26 @@ def _ensure_rediss_ssl_cert_reqs(url: str, default: str = "CERT_NONE") -> str:
 _broker_url = _ensure_rediss_ssl_cert_reqs(settings.CELERY_BROKER_URL or settings.REDIS_URL)
 _backend_url = _ensure_rediss_ssl_cert_reqs(settings.CELERY_RESULT_BACKEND or settings.REDIS_URL)
 
+def _orjson_default(obj):
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+def _orjson_dumps(obj) -> str:
+    return orjson.dumps(obj, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+
+# 任务参数与结果走 orjson：编解码比标准库 json 快数倍，线上格式仍是 JSON，
+# 旧的 json 结果同样能被 orjson 解析；accept_content 保留 json 以兼容切换前已入队的消息
+register(
+    "orjson",
+    _orjson_dumps,
+    orjson.loads,
+    content_type="application/x-orjson",
+    content_encoding="utf-8",
+)
+
 celery_app = Celery(
     "rag_app",
     broker=_broker_url,
@@ -30,9 +52,10 @@ celery_app = Celery(
 )
 
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer="orjson",
+    accept_content=["orjson", "json"],
+    result_accept_content=["orjson", "json"],
+    result_serializer="orjson",
     timezone="UTC",
     enable_utc=True,
     # 默认并发数：容器/小内存环境若用 CPU 数（如 128）会 OOM 被 Killed，改为 2
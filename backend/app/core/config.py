@@ -2,9 +2,10 @@
 应用配置：从环境变量读取配置
 """
 import os
+from functools import cached_property
 from pathlib import Path
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import FrozenSet, List
 
 
 class Settings(BaseSettings):
@@ -24,15 +25,34 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "AI多模态智能问答助手"
     CORS_ORIGINS: List[str] = ["*"]  # CORS允许的源
+    HEALTH_CACHE_TTL_SEC: float = 1.5  # /health 依赖探测结果进程内缓存秒数（短于 k8s 探测周期，状态变化下一次探测即可反映；0 每次都探测）
+    STARTUP_WARMUP_ENABLED: bool = True  # 启动后后台预热检索链路（查询向量 + 向量库连接与索引），避免首个检索请求冷启动
+    # 响应压缩：小于该字节数不压缩（健康检查、token、单条详情等小响应压缩省下的字节抵不上 CPU 开销）；压缩级别 1-9（默认 6，9 CPU 开销大而收益有限）
+    GZIP_MINIMUM_SIZE: int = 4096
+    GZIP_COMPRESS_LEVEL: int = 6
+    # 客户端支持 br 时的 Brotli 质量 0-11（4 编码速度约为 gzip-6 的两倍、压缩率相当；0 关闭 Brotli 只用 GZip）
+    BROTLI_QUALITY: int = 4
     
     # 数据库配置
     DATABASE_URL: str = ""
+    # 启动时同步表结构（create_all + 旧库补列/索引/列类型转换）；生产多副本建议 false，改为按 scripts/ 下 SQL 迁移
+    DB_SCHEMA_AUTO_SYNC: bool = True
+    # 只读副本（可选）：配置后只读查询接口走独立连接池；为空则复用主库
+    DATABASE_READ_URL: str = ""
+    # 连接池（每个引擎各自一份）：常驻连接数、溢出上限、取连接等待超时、连接回收周期
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SEC: float = 5.0
+    DB_POOL_RECYCLE_SEC: int = 1800
+    DB_POOL_MIN_SIZE: int = 5            # 启动时预建的连接数（不超过 DB_POOL_SIZE，0 不预建）
+    DB_QUERY_CACHE_SIZE: int = 1200      # SQLAlchemy 编译语句缓存条数（默认 500）
     
     # Redis配置
     REDIS_URL: str = "redis://localhost:6379/0"
     # Redis 客户端超时（秒）：避免不可达时阻塞事件循环过久（改造 D-1）
     REDIS_SOCKET_CONNECT_TIMEOUT_SEC: float = 2.5
     REDIS_SOCKET_TIMEOUT_SEC: float = 3.0
+    REDIS_MAX_CONNECTIONS: int = 50      # redis.asyncio 连接池上限（缓存、限流各一个池）
 
     # 外部 HTTP 依赖超时（秒）：LLM / Embedding / Rerank / 向量 SDK（改造 D-1）
     HTTP_CONNECT_TIMEOUT_SEC: float = 10.0
@@ -41,6 +61,8 @@ class Settings(BaseSettings):
     LLM_HTTP_MAX_RETRIES: int = 2  # OpenAI SDK 对可重试错误的重试次数
     EMBEDDING_HTTP_TIMEOUT_SEC: float = 90.0
     EMBEDDING_HTTP_RETRIES: int = 1  # 超时/连接错误时额外重试次数（幂等安全）
+    EMBEDDING_BATCH_CONCURRENCY: int = 4  # 单次批量向量化时同时在途的请求数（每批 20 条）
+    KB_REINDEX_CONCURRENCY: int = 4  # 同步降级全库重索引时同时处理的文件数（每个文件独立会话）
     RERANK_HTTP_TIMEOUT_SEC: float = 60.0
     VECTOR_DB_TIMEOUT_SEC: float = 30.0  # Zilliz / Qdrant 查询类调用
 
@@ -51,10 +73,27 @@ class Settings(BaseSettings):
     CACHE_TTL_LIST: int = 60           # 列表类（知识库/文件）60 秒
     CACHE_TTL_CONV: int = 30           # 会话列表、会话详情 30 秒
     CACHE_TTL_DETAIL: int = 60         # 单条详情（知识库详情等）60 秒
+    CACHE_TTL_AUDIT_COUNT: int = 30    # 审计日志列表 total（按筛选条件）30 秒
+    CACHE_TTL_MCP_TOOLS: int = 30      # MCP 服务工具列表（管理后台轮询）30 秒，按配置指纹区分
+    DASHBOARD_L1_TTL_SEC: int = 5      # 仪表盘统计进程内 L1 缓存 5 秒（0 关闭）
+    DASHBOARD_L1_MAXSIZE: int = 10000
+    MCP_SERVER_CACHE_TTL_SEC: int = 5  # MCP 单个服务配置进程内缓存秒数（更新/删除时本进程立即失效）
+    KB_ACCESS_CACHE_TTL_SEC: int = 30  # 检索接口知识库归属校验进程内缓存秒数（删除时本进程立即失效，0 关闭）
+    KB_ACCESS_CACHE_MAXSIZE: int = 4096
+    # 检索语义缓存（以文搜图/统一检索）：查询向量余弦相似度 >= 阈值即复用结果，结果 TTL 同 CACHE_TTL_DETAIL
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.97
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 32        # 每个 (用户, 知识库范围, top_k) 命名空间保留的查询数
+    SEMANTIC_CACHE_MAX_NAMESPACES: int = 2000   # 进程内命名空间数上限（LRU）
+    SEMANTIC_CACHE_EMBEDDING_TTL: int = 3600    # 查询文本向量 Redis 缓存秒数
+    # GET 以文检索（/search/images、/search/unified）的 HTTP 缓存秒数：Cache-Control: private, max-age 与按时间窗口生成的 ETag（If-None-Match 命中返回 304）；0 关闭
+    SEARCH_HTTP_CACHE_SEC: int = 30
     
     # Celery配置（不填则与 REDIS_URL 一致，只维护一份 Redis 地址即可）
     CELERY_BROKER_URL: str = ""
     CELERY_RESULT_BACKEND: str = ""
+    CELERY_SUBMIT_TIMEOUT_SEC: float = 10.0  # API 提交 Celery 任务（delay）超时
+    CELERY_SUBMIT_MAX_WORKERS: int = 4       # 提交任务的专用线程数
     
     # 向量数据库配置
     VECTOR_DB_TYPE: str = "zilliz"  # zilliz | qdrant
@@ -71,13 +110,23 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = "minioadmin"
     MINIO_SECURE: bool = False
     MINIO_BUCKET_NAME: str = "rag-files"
+    # 浏览器直传（预签名 POST 表单）：签名所用的对外地址（为空则用 MINIO_ENDPOINT）、区域、表单有效期秒数、未确认暂存对象的过期天数
+    MINIO_PUBLIC_ENDPOINT: str = ""
+    MINIO_PUBLIC_SECURE: bool = False
+    MINIO_REGION: str = "us-east-1"
+    UPLOAD_PRESIGN_EXPIRE_SEC: int = 900
+    UPLOAD_PENDING_EXPIRE_DAYS: int = 1
     
     # 安全配置
     SECRET_KEY: str = "your-secret-key-change-in-production"
     JWT_SECRET_KEY: str = "your-jwt-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 10080
-    
+    # 鉴权结果进程内缓存（按 token 哈希）：TTL 秒，0 表示关闭；条目数上限
+    AUTH_TOKEN_CACHE_TTL_SEC: int = 30
+    AUTH_TOKEN_CACHE_MAXSIZE: int = 10000
+    AUTH_USER_CACHE_TTL_SEC: int = 60  # 用户快照 Redis 缓存（按用户名，多实例共享）秒数
+
     # AI模型配置
     OPENAI_API_KEY: str = ""
     OPENAI_BASE_URL: str = "https://api.openai.com/v1"
@@ -99,6 +148,7 @@ class Settings(BaseSettings):
     
     # 文件上传配置
     MAX_FILE_SIZE: int = 104857600  # 100MB
+    UPLOAD_CONCURRENCY: int = 4  # 同时处理的上传文件数（按块读取 + 流式写 MinIO）
     ALLOWED_FILE_TYPES: str = "pdf,ppt,pptx,txt,xlsx,docx,jpeg,jpg,png,md,html,zip"
     # 扫描版 PDF：提取文本少于该字数时走 OCR（每页渲染为图再 OCR）
     PDF_OCR_MIN_CHARS: int = 80
@@ -117,16 +167,25 @@ class Settings(BaseSettings):
     # 是否记录「问答完成」类审计（默认关闭，量较大；开启后仅记脱敏 query_preview + 会话/知识库元数据）
     AUDIT_LOG_CHAT_COMPLETION: bool = False
     
-    @property
+    # 以下派生列表只在首次访问时解析一次（配置在进程内不变）；*_set 供成员判断 O(1) 查找，*_list 保留顺序用于提示文案与前端下发
+    @cached_property
     def allowed_file_types_list(self) -> List[str]:
         """获取允许的文件类型列表"""
         return [x.strip().lower() for x in self.ALLOWED_FILE_TYPES.split(",") if x.strip()]
 
-    @property
+    @cached_property
+    def allowed_file_types_set(self) -> FrozenSet[str]:
+        return frozenset(self.allowed_file_types_list)
+
+    @cached_property
     def forbidden_file_extensions_list(self) -> List[str]:
         """禁止上传的扩展名列表（可执行/脚本等）"""
         return [x.strip().lower() for x in self.FILE_FORBIDDEN_EXTENSIONS.split(",") if x.strip()]
 
+    @cached_property
+    def forbidden_file_extensions_set(self) -> FrozenSet[str]:
+        return frozenset(self.forbidden_file_extensions_list)
+
     # 智能问答多模态附件（图片/文件）限制，不展示在界面
     CHAT_ATTACHMENT_MAX_COUNT: int = 20  # 单条消息最多附件数量
     CHAT_ATTACHMENT_MAX_SIZE_BYTES: int = 20 * 1024 * 1024  # 单个附件最大体积（默认 20MB）
@@ -136,18 +195,22 @@ class Settings(BaseSettings):
     # 上传临时缓存 TTL（秒）。会话内「点开查看」的内容存于消息表，仅随会话删除而清理；本项只影响「上传后未发消息」的缓存，设长一些以便稍后发消息时仍能写入消息（豆包式长期保留）
     CHAT_ATTACHMENT_UPLOAD_TTL: int = 604800  # 7 天（0 表示不设过期，慎用）
 
-    @property
+    @cached_property
     def chat_attachment_image_types_list(self) -> List[str]:
         return [x.strip().lower() for x in self.CHAT_ATTACHMENT_IMAGE_TYPES.split(",") if x.strip()]
 
-    @property
+    @cached_property
     def chat_attachment_file_extensions_list(self) -> List[str]:
         return [x.strip().lower() for x in self.CHAT_ATTACHMENT_FILE_EXTENSIONS.split(",") if x.strip()]
 
-    @property
+    @cached_property
     def chat_attachment_video_extensions_list(self) -> List[str]:
         return [x.strip().lower() for x in self.CHAT_ATTACHMENT_VIDEO_EXTENSIONS.split(",") if x.strip()]
 
+    @cached_property
+    def chat_attachment_video_extensions_set(self) -> FrozenSet[str]:
+        return frozenset(self.chat_attachment_video_extensions_list)
+
     # 对话历史配置（均为会话级别：一个 conversation_id = 一次会话，其下多条消息为对话历史）
     CHAT_HISTORY_MAX_COUNT: int = 100   # 最多保留的会话数量，超出时删除最旧的会话
     CHAT_HISTORY_DEFAULT_COUNT: int = 50  # 列表默认每页展示的会话数
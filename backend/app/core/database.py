@@ -1,6 +1,7 @@
 """
 数据库配置和连接
 """
+import asyncio
 import logging
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
@@ -25,24 +26,31 @@ def _engine_connect_args() -> dict:
     return {}
 
 
-# 创建异步引擎（MySQL/PostgreSQL 用连接池，SQLite 用 NullPool）
-_use_null_pool = "sqlite" in settings.DATABASE_URL
-_engine_kwargs = dict(
-    echo=False,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=25,
-    pool_recycle=1800,
-    poolclass=NullPool if _use_null_pool else None,
-)
-_ca = _engine_connect_args()
-if _ca:
-    _engine_kwargs["connect_args"] = _ca
+def _engine_kwargs(url: str) -> dict:
+    """连接池参数（MySQL/PostgreSQL 用 QueuePool，SQLite 用 NullPool），大小与超时见 DB_POOL_* 配置。"""
+    if "sqlite" in url:
+        kwargs = dict(echo=False, poolclass=NullPool)
+    else:
+        kwargs = dict(
+            echo=False,
+            pool_pre_ping=True,
+            pool_size=int(getattr(settings, "DB_POOL_SIZE", 20)),
+            max_overflow=int(getattr(settings, "DB_MAX_OVERFLOW", 10)),
+            pool_timeout=float(getattr(settings, "DB_POOL_TIMEOUT_SEC", 5)),
+            pool_recycle=int(getattr(settings, "DB_POOL_RECYCLE_SEC", 1800)),
+        )
+    # 编译语句缓存（默认 500 条）：列表/分页等热点查询较多，放大以免被挤出后重复编译
+    kwargs["query_cache_size"] = int(getattr(settings, "DB_QUERY_CACHE_SIZE", 1200))
+    ca = _engine_connect_args()
+    if ca:
+        kwargs["connect_args"] = ca
+    return kwargs
+
 
+# 主库引擎（读写）
 engine = create_async_engine(
     settings.DATABASE_URL,
-    **_engine_kwargs,
+    **_engine_kwargs(settings.DATABASE_URL),
 )
 
 # 创建会话工厂
@@ -54,6 +62,19 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+# 只读引擎：配置 DATABASE_READ_URL（只读副本）时使用独立连接池，避免只读列表接口与问答写入争抢主库连接；
+# 未配置时直接复用主库引擎，不额外建池
+_read_url = (getattr(settings, "DATABASE_READ_URL", "") or "").strip()
+engine_ro = create_async_engine(_read_url, **_engine_kwargs(_read_url)) if _read_url else engine
+
+AsyncSessionLocalRO = async_sessionmaker(
+    engine_ro,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+) if engine_ro is not engine else AsyncSessionLocal
+
 # 声明基类
 Base = declarative_base()
 
@@ -69,6 +90,49 @@ async def get_db() -> AsyncSession:
             logger.debug("db session closed id=%s", id(session))
 
 
+async def get_db_ro() -> AsyncSession:
+    """获取只读会话（只读副本或主库），仅用于不写库的查询接口。"""
+    async with AsyncSessionLocalRO() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+async def _prime_pool(eng, count: int) -> None:
+    """并发占用 count 个连接（各执行一次 SELECT 1）后一起归还，使池内常驻这些已建好的连接。"""
+    from sqlalchemy import text
+
+    results = await asyncio.gather(*(eng.connect() for _ in range(count)), return_exceptions=True)
+    conns = [r for r in results if not isinstance(r, BaseException)]
+    try:
+        await asyncio.gather(*(c.execute(text("SELECT 1")) for c in conns))
+    finally:
+        await asyncio.gather(*(c.close() for c in conns), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        raise errors[0]
+
+
+async def warmup_pools() -> None:
+    """
+    启动时预建 DB_POOL_MIN_SIZE 个连接（主库；配置独立只读库时只读池同样预建），
+    首批并发请求直接从池中取连接，不再各自承担 TCP + 认证的建连耗时。SQLite（NullPool）跳过。
+    """
+    count = min(
+        int(getattr(settings, "DB_POOL_MIN_SIZE", 5)),
+        int(getattr(settings, "DB_POOL_SIZE", 20)),
+    )
+    if count <= 0:
+        return
+    engines = [engine] if engine_ro is engine else [engine, engine_ro]
+    for eng in engines:
+        if isinstance(eng.pool, NullPool):
+            continue
+        await _prime_pool(eng, count)
+        logger.debug("db pool primed url=%s connections=%s", eng.url.render_as_string(hide_password=True), count)
+
+
 def create_async_engine_and_session_for_celery():
     """
     在 Celery 任务内、当前 event loop 下创建新的 engine 和 session 工厂。
@@ -1,13 +1,21 @@
 """
 健康检查：数据库、Redis、向量库、MinIO 连通性
+health_all() 并发探测四项依赖（同步探测放线程池，各自限时），聚合结果进程内缓存 HEALTH_CACHE_TTL_SEC 秒，
+探针高频轮询时不会把每次请求都打到后端依赖上。
 """
+import asyncio
 import logging
-from typing import Tuple, Any
+import time
+from typing import Any, Dict, Optional, Tuple
 
 from app.core.config import settings
+from app.core.singleflight import single_flight
 
 logger = logging.getLogger(__name__)
 
+_minio_client = None
+_health_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
 
 async def check_db() -> Tuple[bool, str]:
     """检查数据库连通性"""
@@ -24,16 +32,16 @@ async def check_db() -> Tuple[bool, str]:
         return False, str(e)
 
 
-def check_redis() -> Tuple[bool, str]:
-    """检查 Redis 连通性"""
+async def check_redis() -> Tuple[bool, str]:
+    """检查 Redis 连通性（复用限流的 redis.asyncio 连接池，不占线程池、不新建连接）"""
     if not getattr(settings, "REDIS_URL", None) or not settings.REDIS_URL.strip():
         return False, "REDIS_URL 未配置"
     try:
-        from app.services.rate_limit_service import _get_redis
-        r = _get_redis()
+        from app.services.rate_limit_service import _get_async_redis
+        r = _get_async_redis()
         if not r:
             return False, "Redis 客户端未初始化"
-        r.ping()
+        await r.ping()
         return True, "ok"
     except Exception as e:
         logger.warning("健康检查 Redis 失败: %s", e)
@@ -59,16 +67,63 @@ def check_vector() -> Tuple[bool, str]:
 def check_minio() -> Tuple[bool, str]:
     """检查 MinIO 连通性"""
     try:
-        from minio import Minio
-        from minio.error import S3Error
-        client = Minio(
-            settings.MINIO_ENDPOINT,
-            access_key=settings.MINIO_ACCESS_KEY,
-            secret_key=settings.MINIO_SECRET_KEY,
-            secure=settings.MINIO_SECURE,
-        )
-        client.bucket_exists(settings.MINIO_BUCKET_NAME)
+        global _minio_client
+        if _minio_client is None:
+            from minio import Minio
+            _minio_client = Minio(
+                settings.MINIO_ENDPOINT,
+                access_key=settings.MINIO_ACCESS_KEY,
+                secret_key=settings.MINIO_SECRET_KEY,
+                secure=settings.MINIO_SECURE,
+            )
+        _minio_client.bucket_exists(settings.MINIO_BUCKET_NAME)
         return True, "ok"
     except Exception as e:
         logger.warning("健康检查 MinIO 失败: %s", e)
         return False, str(e)
+
+
+async def _probe(name: str, coro, timeout: float) -> Tuple[bool, str]:
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        return False, f"{name} 检查超时"
+    except Exception as e:
+        logger.warning("健康检查 %s 异常: %s", name, e)
+        return False, str(e)
+
+
+async def _probe_all() -> Dict[str, Any]:
+    (db_ok, db_msg), (redis_ok, redis_msg), (vector_ok, vector_msg), (minio_ok, minio_msg) = await asyncio.gather(
+        _probe("database", check_db(), 10.0),
+        _probe("Redis", check_redis(), 6.0),
+        _probe("vector", asyncio.to_thread(check_vector), 12.0),
+        _probe("MinIO", asyncio.to_thread(check_minio), 10.0),
+    )
+    all_ok = db_ok and redis_ok and vector_ok and minio_ok
+    return {
+        "status": "healthy" if all_ok else "degraded",
+        "service": "rag-api",
+        "dependencies": {
+            "database": {"ok": db_ok, "message": db_msg},
+            "redis": {"ok": redis_ok, "message": redis_msg},
+            "vector": {"ok": vector_ok, "message": vector_msg},
+            "minio": {"ok": minio_ok, "message": minio_msg},
+        },
+    }
+
+
+async def health_all() -> Dict[str, Any]:
+    """并发探测全部依赖，墙钟时间取最慢一项；TTL 内直接返回上次结果，过期瞬间的并发请求只探测一次。"""
+    ttl = float(getattr(settings, "HEALTH_CACHE_TTL_SEC", 1.5))
+    cached = _health_cache
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+
+    async def _fill() -> Dict[str, Any]:
+        global _health_cache
+        result = await _probe_all()
+        _health_cache = (time.monotonic(), result)
+        return result
+
+    return await single_flight("health:all", _fill)
@@ -0,0 +1,21 @@
+"""请求 ID 生成：一次 os.urandom 批量取 64 个 ID 的随机字节，逐个切出 32 位十六进制（bytes，可直接写入 ASGI 响应头）。"""
+import binascii
+import os
+import threading
+from typing import List
+
+_BATCH = 64
+_local = threading.local()
+
+
+def _refill() -> List[bytes]:
+    raw = binascii.hexlify(os.urandom(16 * _BATCH))
+    return [raw[i:i + 32] for i in range(0, len(raw), 32)]
+
+
+def new_request_id() -> bytes:
+    """128 位随机请求 ID（32 位小写十六进制，无连字符）；每线程各自一份缓冲，用完再取一批。"""
+    pool = getattr(_local, "pool", None)
+    if not pool:
+        pool = _local.pool = _refill()
+    return pool.pop()
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import contextvars
-from typing import Optional
+from typing import Optional, Tuple
 
 trace_id_ctx: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
 
@@ -17,3 +17,25 @@ def reset_trace_id(token: contextvars.Token) -> None:
 
 def get_trace_id() -> Optional[str]:
     return trace_id_ctx.get()
+
+
+# 审计所需的请求元信息（request_id、客户端 IP）：由 request_id 中间件写入，审计日志缺省时从这里取，路由无需注入 Request
+request_meta_ctx: contextvars.ContextVar[Optional[Tuple[str, str]]] = contextvars.ContextVar("request_meta", default=None)
+
+
+def set_request_meta(request_id: str, client_ip: str) -> contextvars.Token:
+    return request_meta_ctx.set((request_id, client_ip))
+
+
+def reset_request_meta(token: contextvars.Token) -> None:
+    request_meta_ctx.reset(token)
+
+
+def get_request_id() -> Optional[str]:
+    meta = request_meta_ctx.get()
+    return meta[0] if meta else None
+
+
+def get_client_ip() -> Optional[str]:
+    meta = request_meta_ctx.get()
+    return meta[1] if meta else None
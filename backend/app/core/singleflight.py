@@ -0,0 +1,42 @@
+"""进程内 single-flight：同一 key 的并发缓存回填只执行一次，其余协程等待同一结果（防缓存击穿）。"""
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+_inflight: Dict[str, "asyncio.Future"] = {}
+
+
+async def single_flight(key: str, factory: Callable[[], Awaitable[T]]) -> T:
+    """
+    key 相同的并发调用只有第一个执行 factory()，其余等待其结果；
+    执行方异常会原样抛给所有等待方，执行方被取消时等待方各自重新执行。
+    """
+    fut = _inflight.get(key)
+    if fut is not None:
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                return await factory()
+            raise
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        result = await factory()
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except BaseException as e:
+        fut.set_exception(e)
+        fut.exception()  # 标记已读取，避免无等待方时告警 "exception was never retrieved"
+        raise
+    else:
+        fut.set_result(result)
+        return result
+    finally:
+        if _inflight.get(key) is fut:
+            del _inflight[key]
@@ -2,6 +2,6 @@
 
 `HybridRetrievalPipeline` 请从 `app.infrastructure.rag.hybrid_retrieval_pipeline` 导入，避免包级导入拉起重依赖。
 """
-from app.infrastructure.rag.hybrid_ops import rrf_score
+from app.infrastructure.rag.hybrid_ops import rrf_fuse, rrf_score, top_n_by_score
 
-__all__ = ["rrf_score"]
+__all__ = ["rrf_fuse", "rrf_score", "top_n_by_score"]
@@ -1,6 +1,24 @@
-"""混合检索公共算子：RRF 贡献分等（无 I/O）。"""
+"""混合检索公共算子：RRF 贡献分、多路融合与部分排序取前 N（无 I/O）。"""
+import heapq
+from typing import Dict, Hashable, Iterable, List, Tuple
 
 
 def rrf_score(rank: int, k: int = 60) -> float:
     """RRF（Reciprocal Rank Fusion）单项贡献：rank 从 1 开始。"""
     return 1.0 / (k + rank)
+
+
+def rrf_fuse(ranked: Iterable[Tuple[Hashable, int]], k: int = 60) -> Dict[Hashable, float]:
+    """多路召回 (key, rank) 一次遍历累加为 RRF 总分；同一 key 在多路出现时分数相加，保留首次出现顺序。"""
+    scores: Dict[Hashable, float] = {}
+    get = scores.get
+    for key, rank in ranked:
+        scores[key] = get(key, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def top_n_by_score(scores: Dict[Hashable, float], n: int) -> List[Hashable]:
+    """按分数降序取前 n 个 key（堆上部分排序，不对全部候选排序）；同分保持 scores 中的先后顺序。"""
+    if n <= 0:
+        return []
+    return heapq.nlargest(n, scores, key=scores.__getitem__)
@@ -12,7 +12,7 @@ from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.infrastructure.rag.hybrid_ops import rrf_score
+from app.infrastructure.rag.hybrid_ops import rrf_score, top_n_by_score
 from app.infrastructure.rag.progress import RagProgressCb, rag_progress_call as _rag_progress_call
 from app.models.chunk import Chunk
 from app.services.bm25_service import bm25_score
@@ -140,11 +140,10 @@ class HybridRetrievalPipeline:
                 return (context, 0.5, max_conf_context, all_chunks, scored_llm)
             return ("", 0.0, None, [], [])
 
-        candidate_chunks = sorted(
-            [(vector_chunk_map[chunk_id], score) for chunk_id, score in chunk_rrf_scores.items()],
-            key=lambda x: x[1],
-            reverse=True,
-        )[: top_k * 2]
+        candidate_chunks = [
+            (vector_chunk_map[chunk_id], chunk_rrf_scores[chunk_id])
+            for chunk_id in top_n_by_score(chunk_rrf_scores, top_k * 2)
+        ]
 
         if not candidate_chunks:
             return ("", 0.0, None, [], [])
@@ -311,11 +310,10 @@ class HybridRetrievalPipeline:
                 logging.warning("全文匹配失败: %s", e)
         if not chunk_rrf_scores:
             return ("", 0.0, None, [], [])
-        candidate_chunks = sorted(
-            [(vector_chunk_map[chunk_id], score) for chunk_id, score in chunk_rrf_scores.items()],
-            key=lambda x: x[1],
-            reverse=True,
-        )[: top_k * 2]
+        candidate_chunks = [
+            (vector_chunk_map[chunk_id], chunk_rrf_scores[chunk_id])
+            for chunk_id in top_n_by_score(chunk_rrf_scores, top_k * 2)
+        ]
         if not candidate_chunks:
             return ("", 0.0, None, [], [])
         await _rag_progress_call(
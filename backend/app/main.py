@@ -29,25 +29,30 @@ try:
 except ImportError:
     pass
 
-import uuid
 import time
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.core.request_context import reset_trace_id, set_trace_id
-from app.core.database import engine, Base
-from sqlalchemy import text
+from app.core.database import engine, engine_ro, Base, warmup_pools
+from sqlalchemy import JSON, Float, inspect, text
 from app.api.v1 import api_router
 from app.core.logging import setup_logging
-from app.core.health import check_db, check_redis, check_vector, check_minio
+from app.core.health import health_all
+from app.middleware.auth import AuthMiddleware
+from app.middleware.compression import SelectiveGZipMiddleware
+from app.middleware.fast_path import FastPathMiddleware
+from app.middleware.request_id import RequestIDMiddleware
+from app.services.audit_service import start_audit_writer, stop_audit_writer
+from app.tasks.submit import shutdown_submit_executor
 from app.services.chat_service import warmup_mcp_tools_cache
 from app.services.rag_metrics_defaults import sync_default_benchmarks
+from app.services.semantic_cache_service import aget_query_embedding
+from app.services.vector_store import get_vector_client
 
 logger = logging.getLogger(__name__)
 
@@ -71,26 +76,25 @@ def _asyncio_exception_handler(loop: asyncio.AbstractEventLoop, context: dict) -
         logging.getLogger(__name__).error("%s", context.get("message", "Unknown async error"))
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """应用生命周期管理"""
-    # 启动时执行
-    setup_logging()
-    # 减少 Windows 下 Playwright 子进程导致的 "Task exception was never retrieved" 刷屏
-    try:
-        loop = asyncio.get_running_loop()
-        loop.set_exception_handler(_asyncio_exception_handler)
-    except RuntimeError:
-        pass
-    try:
-        await warmup_mcp_tools_cache()
-    except Exception as e:
-        logging.getLogger(__name__).warning("MCP 缓存预热异常: %s", e)
+async def _warmup_search_path() -> None:
+    """
+    后台预热检索链路：取一次查询向量（结果进 Redis，重启后通常命中不再调 Embedding），
+    再用它做一次 top_k=1 向量检索，让向量库客户端建好连接、服务端加载索引。失败只记日志，不影响启动。
+    """
+    t0 = time.perf_counter()
     try:
-        sync_default_benchmarks()
+        vec = await aget_query_embedding("warmup") or [1.0] * int(getattr(settings, "ZILLIZ_DIM", 1536))
+        await asyncio.to_thread(get_vector_client().search, vec, 1)
+        logger.info("检索链路预热完成 %.0fms", (time.perf_counter() - t0) * 1000)
     except Exception as e:
-        logging.getLogger(__name__).warning("默认评测集同步异常: %s", e)
-    # 创建数据库表
+        logger.warning("检索链路预热失败（首个检索请求会较慢）: %s", e)
+
+
+async def _sync_schema() -> None:
+    """
+    创建缺失的表，并为旧库补列、补索引、转换列类型（每步失败只记日志）。
+    每次启动会对全部表做一轮存在性探测与 DDL 尝试，多副本同时启动还会争用 DDL 锁，故可用 DB_SCHEMA_AUTO_SYNC 关闭。
+    """
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
         # 为已有数据库添加或扩列 messages.attachments_meta（豆包式会话附件展示，含 base64 图片需 LONGTEXT）
@@ -130,11 +134,161 @@ async def lifespan(app: FastAPI):
             await conn.run_sync(_ensure_agent_trace_columns)
         except Exception as e:
             logging.getLogger(__name__).debug("agent_trace/thinking_seconds 列已存在或无法添加: %s", e)
-    
+
+        # 已有库的 audit_logs 补游标分页复合索引（create_all 不会给旧表加索引）
+        def _ensure_audit_log_index(sync_conn):
+            # PostgreSQL 上 DDL 失败会中止整个事务、连带跳过后续各步，须带 IF NOT EXISTS（MySQL 不支持，靠异常判断）
+            if_not_exists = "" if sync_conn.dialect.name == "mysql" else "IF NOT EXISTS "
+            sync_conn.execute(text(
+                f"CREATE INDEX {if_not_exists}ix_audit_logs_user_created_id ON audit_logs (user_id, created_at, id)"
+            ))
+
+        try:
+            await conn.run_sync(_ensure_audit_log_index)
+        except Exception as e:
+            logging.getLogger(__name__).debug("audit_logs 复合索引已存在或无法添加: %s", e)
+
+        # 仪表盘按 user_id 计数：模型已声明 index=True，但早于该声明建的旧表不会被 create_all 补索引
+        def _ensure_user_id_indexes(sync_conn):
+            if_not_exists = "" if sync_conn.dialect.name == "mysql" else "IF NOT EXISTS "
+            for table in ("files", "knowledge_bases"):
+                try:
+                    sync_conn.execute(text(f"CREATE INDEX {if_not_exists}ix_{table}_user_id ON {table} (user_id)"))
+                except Exception as e:
+                    logging.getLogger(__name__).debug("%s.user_id 索引已存在或无法添加: %s", table, e)
+
+        try:
+            await conn.run_sync(_ensure_user_id_indexes)
+        except Exception as e:
+            logging.getLogger(__name__).debug("user_id 索引检查失败: %s", e)
+
+        # 分页/排序谓词对应的复合索引：同样只对新建表生效，旧库在此补建（单列索引保留，不影响正确性）
+        def _ensure_composite_indexes(sync_conn):
+            # MySQL 不支持 CREATE INDEX IF NOT EXISTS，靠异常判断；PostgreSQL 失败会中止事务，必须带 IF NOT EXISTS
+            if_not_exists = "" if sync_conn.dialect.name == "mysql" else "IF NOT EXISTS "
+            for name, table, cols in (
+                ("ix_conversations_user_updated", "conversations", "user_id, updated_at"),
+                ("ix_messages_conv_created_id", "messages", "conversation_id, created_at, id"),
+                ("ix_usage_records_user_created", "usage_records", "user_id, created_at"),
+                ("ix_chunks_file_chunk_index", "chunks", "file_id, chunk_index"),
+            ):
+                try:
+                    sync_conn.execute(text(f"CREATE INDEX {if_not_exists}{name} ON {table} ({cols})"))
+                except Exception as e:
+                    logging.getLogger(__name__).debug("%s 已存在或无法添加: %s", name, e)
+
+        try:
+            await conn.run_sync(_ensure_composite_indexes)
+        except Exception as e:
+            logging.getLogger(__name__).debug("复合索引检查失败: %s", e)
+
+        # files.md5_hash 由全局唯一改为 (user_id, md5_hash) 唯一：旧库补复合唯一索引并去掉旧的单列唯一约束
+        def _ensure_files_user_md5_unique(sync_conn):
+            if_not_exists = "" if sync_conn.dialect.name == "mysql" else "IF NOT EXISTS "
+            sync_conn.execute(text(f"CREATE UNIQUE INDEX {if_not_exists}uq_files_user_md5 ON files (user_id, md5_hash)"))
+
+        try:
+            await conn.run_sync(_ensure_files_user_md5_unique)
+        except Exception as e:
+            logging.getLogger(__name__).debug("files (user_id, md5_hash) 唯一索引已存在或无法添加: %s", e)
+
+        def _drop_files_md5_global_unique(sync_conn):
+            if sync_conn.dialect.name == "mysql":
+                sync_conn.execute(text("ALTER TABLE files DROP INDEX md5_hash"))
+            elif sync_conn.dialect.name == "postgresql":
+                sync_conn.execute(text("ALTER TABLE files DROP CONSTRAINT IF EXISTS files_md5_hash_key"))
+
+        try:
+            await conn.run_sync(_drop_files_md5_global_unique)
+        except Exception as e:
+            logging.getLogger(__name__).debug("files.md5_hash 旧唯一约束不存在或无法删除: %s", e)
+
+        # mcp_servers.config 由 TEXT 改为原生 JSON（PostgreSQL 为 JSONB）：旧库按列类型判断后转换一次
+        def _ensure_mcp_config_json(sync_conn):
+            cols = {c["name"]: c["type"] for c in inspect(sync_conn).get_columns("mcp_servers")}
+            if "config" not in cols or isinstance(cols["config"], JSON):
+                return
+            sync_conn.execute(text("UPDATE mcp_servers SET config = '{}' WHERE config IS NULL OR config = ''"))
+            if sync_conn.dialect.name == "postgresql":
+                sync_conn.execute(text("ALTER TABLE mcp_servers ALTER COLUMN config TYPE JSONB USING config::jsonb"))
+            elif sync_conn.dialect.name == "mysql":
+                sync_conn.execute(text("ALTER TABLE mcp_servers MODIFY COLUMN config JSON NOT NULL"))
+
+        try:
+            await conn.run_sync(_ensure_mcp_config_json)
+        except Exception as e:
+            logging.getLogger(__name__).warning("mcp_servers.config 转换为 JSON 列失败（可手动执行）: %s", e)
+
+        # messages.sources 由 TEXT(JSON 字符串) 改为原生 JSON、confidence 由 TEXT 改为浮点：旧库按列类型判断后转换一次
+        def _ensure_message_native_columns(sync_conn):
+            cols = {c["name"]: c["type"] for c in inspect(sync_conn).get_columns("messages")}
+            dialect = sync_conn.dialect.name
+            if "sources" in cols and not isinstance(cols["sources"], JSON):
+                sync_conn.execute(text("UPDATE messages SET sources = NULL WHERE sources = ''"))
+                if dialect == "postgresql":
+                    sync_conn.execute(text("ALTER TABLE messages ALTER COLUMN sources TYPE JSONB USING sources::jsonb"))
+                elif dialect == "mysql":
+                    sync_conn.execute(text("ALTER TABLE messages MODIFY COLUMN sources JSON NULL"))
+            if "confidence" in cols and not isinstance(cols["confidence"], Float):
+                if dialect == "postgresql":
+                    sync_conn.execute(text(
+                        "ALTER TABLE messages ALTER COLUMN confidence TYPE DOUBLE PRECISION "
+                        "USING NULLIF(confidence, '')::double precision"
+                    ))
+                elif dialect == "mysql":
+                    sync_conn.execute(text("UPDATE messages SET confidence = NULL WHERE confidence = ''"))
+                    sync_conn.execute(text("ALTER TABLE messages MODIFY COLUMN confidence DOUBLE NULL"))
+
+        try:
+            await conn.run_sync(_ensure_message_native_columns)
+        except Exception as e:
+            logging.getLogger(__name__).warning("messages.sources / confidence 列类型转换失败（可手动执行）: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期管理"""
+    # 启动时执行
+    setup_logging()
+    # 减少 Windows 下 Playwright 子进程导致的 "Task exception was never retrieved" 刷屏
+    try:
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(_asyncio_exception_handler)
+    except RuntimeError:
+        pass
+    try:
+        await warmup_mcp_tools_cache()
+    except Exception as e:
+        logging.getLogger(__name__).warning("MCP 缓存预热异常: %s", e)
+    try:
+        sync_default_benchmarks()
+    except Exception as e:
+        logging.getLogger(__name__).warning("默认评测集同步异常: %s", e)
+    # 表结构同步（create_all + 旧库补列/索引）：开发与单实例默认开启；生产多副本建议关闭（DB_SCHEMA_AUTO_SYNC=false），按 scripts/ 下 SQL 迁移
+    if getattr(settings, "DB_SCHEMA_AUTO_SYNC", True):
+        await _sync_schema()
+
+    try:
+        await warmup_pools()
+    except Exception as e:
+        logging.getLogger(__name__).warning("数据库连接池预热失败: %s", e)
+
+    # 审计日志后台批量写入（defer=True 的调用入队即返回）
+    start_audit_writer()
+
+    # 检索链路预热放后台，不拖慢启动（/health 可立即响应）
+    warmup_task = asyncio.create_task(_warmup_search_path()) if getattr(settings, "STARTUP_WARMUP_ENABLED", True) else None
+
     yield
-    
-    # 关闭时执行
+
+    # 关闭时执行：先写完排队中的审计日志，再释放连接池
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await stop_audit_writer()
+    shutdown_submit_executor()
     await engine.dispose()
+    if engine_ro is not engine:
+        await engine_ro.dispose()
 
 
 app = FastAPI(
@@ -143,9 +297,17 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    # 默认用 orjson 编码 JSON 响应（比标准库 json 快数倍，列表/分块等大响应收益明显）
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
+# 探针与根路径的轻量应用：由 FastPathMiddleware 在中间件栈外分流，k8s 高频探测不经 CORS / 压缩 / 鉴权 / 请求 ID
+probe_app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None, default_response_class=ORJSONResponse)
+
+# 鉴权：每个请求只解析一次 token，写入 request.state.user（最内层，预检请求不经过）
+app.add_middleware(AuthMiddleware, path_prefix=settings.API_V1_STR)
+
 # CORS配置
 app.add_middleware(
     CORSMiddleware,
@@ -155,41 +317,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# GZip压缩
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Brotli / GZip 压缩（文件下载等二进制流除外）
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    minimum_size=getattr(settings, "GZIP_MINIMUM_SIZE", 4096),
+    compresslevel=getattr(settings, "GZIP_COMPRESS_LEVEL", 6),
+    brotli_quality=min(11, max(0, getattr(settings, "BROTLI_QUALITY", 4))),
+)
 
 
-@app.middleware("http")
-async def request_id_middleware(request: Request, call_next):
-    """为每个请求生成或透传 X-Request-ID；同步 X-Trace-Id 与上下文变量（改造 D-2）。"""
-    rid = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-    request.state.request_id = rid
-    trace = (request.headers.get("X-Trace-Id") or rid).strip() or rid
-    tok = set_trace_id(trace)
-    t0 = time.perf_counter()
-    logger.debug(
-        "request start method=%s path=%s request_id=%s trace_id=%s",
-        request.method,
-        request.url.path,
-        rid,
-        trace,
-    )
-    try:
-        response = await call_next(request)
-        response.headers["X-Request-ID"] = rid
-        response.headers["X-Trace-Id"] = trace
-        ms = (time.perf_counter() - t0) * 1000.0
-        logger.debug(
-            "request end method=%s path=%s status=%s duration_ms=%.1f request_id=%s",
-            request.method,
-            request.url.path,
-            getattr(response, "status_code", "-"),
-            ms,
-            rid,
-        )
-        return response
-    finally:
-        reset_trace_id(tok)
+# 请求 ID / Trace ID（纯 ASGI）
+app.add_middleware(RequestIDMiddleware)
+
+# 探针快速通道（最外层）：以下路径直接交给 probe_app
+app.add_middleware(FastPathMiddleware, fast_app=probe_app, paths=("/live", "/health", "/"))
 
 
 def _error_response(detail: str, status_code: int, request_id: str | None = None) -> dict:
@@ -200,14 +341,16 @@ def _error_response(detail: str, status_code: int, request_id: str | None = None
 
 
 def _make_json_serializable(obj):
-    """递归将对象转为可 JSON 序列化形式，避免 bytes 等导致 TypeError。"""
+    """递归将对象转为可 JSON 序列化形式：bytes 记为 <binary>，其余非 JSON 基本类型（如校验错误 ctx 中的异常对象）转 str，避免 orjson 报 TypeError。"""
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
     if isinstance(obj, bytes):
         return "<binary>"
     if isinstance(obj, dict):
-        return {k: _make_json_serializable(v) for k, v in obj.items()}
+        return {str(k): _make_json_serializable(v) for k, v in obj.items()}
     if isinstance(obj, (list, tuple)):
         return [_make_json_serializable(v) for v in obj]
-    return obj
+    return str(obj)
 
 
 @app.exception_handler(StarletteHTTPException)
@@ -226,9 +369,10 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         detail[:200],
         rid,
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
-        content=_make_json_serializable(_error_response(detail=detail, status_code=exc.status_code, request_id=rid)),
+        content=_error_response(detail=detail, status_code=exc.status_code, request_id=rid),
+        headers=getattr(exc, "headers", None),
     )
 
 
@@ -250,7 +394,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
     body = _error_response(detail=detail, status_code=422, request_id=rid)
     body["errors"] = _make_json_serializable(errs)
-    return JSONResponse(status_code=422, content=_make_json_serializable(body))
+    return ORJSONResponse(status_code=422, content=body)
 
 
 @app.exception_handler(Exception)
@@ -258,7 +402,7 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
     """未捕获异常统一格式"""
     rid = getattr(request.state, "request_id", None)
     logger.exception("unhandled exception path=%s request_id=%s", request.url.path, rid)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content=_error_response(
             detail="服务器内部错误",
@@ -272,13 +416,13 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
 app.include_router(api_router, prefix="/api/v1")
 
 
-@app.get("/live")
+@probe_app.get("/live")
 async def live():
     """存活探针：不访问 DB/Redis/向量/MinIO。排查「网络异常」时请优先 curl 本路径确认进程与端口可达。"""
     return {"status": "ok", "service": "rag-api"}
 
 
-@app.get("/")
+@probe_app.get("/")
 async def root():
     """根路径"""
     return {
@@ -288,21 +432,6 @@ async def root():
     }
 
 
-async def _health_check_db() -> tuple[bool, str]:
-    try:
-        return await asyncio.wait_for(check_db(), timeout=10.0)
-    except asyncio.TimeoutError:
-        return False, "database 检查超时（MySQL 不可达或连接过慢）"
-
-
-async def _health_sync(name: str, fn, timeout: float = 8.0) -> tuple[bool, str]:
-    """同步依赖检测放到线程池并限时，避免阻塞事件循环或长时间挂起。"""
-    try:
-        return await asyncio.wait_for(asyncio.to_thread(fn), timeout=timeout)
-    except asyncio.TimeoutError:
-        return False, f"{name} 检查超时"
-
-
 @app.get("/api/v1/ops/snapshot")
 async def ops_snapshot():
     """进程内轻量指标快照（改造 D-4），便于对接外部监控系统前自查。"""
@@ -311,32 +440,10 @@ async def ops_snapshot():
     return snapshot()
 
 
-@app.get("/live")
-async def live_probe():
-    """Kubernetes liveness：仅表示进程存活，不探测外部依赖。"""
-    return JSONResponse(content={"status": "ok"})
-
-
-@app.get("/health")
+@probe_app.get("/health")
 async def health_check():
-    """健康检查：返回各依赖连通状态"""
-    db_ok, db_msg = await _health_check_db()
-    redis_ok, redis_msg = await _health_sync("Redis", check_redis, 6.0)
-    vector_ok, vector_msg = await _health_sync("vector", check_vector, 12.0)
-    minio_ok, minio_msg = await _health_sync("MinIO", check_minio, 10.0)
-    all_ok = db_ok and redis_ok and vector_ok and minio_ok
-    return JSONResponse(
-        content={
-            "status": "healthy" if all_ok else "degraded",
-            "service": "rag-api",
-            "dependencies": {
-                "database": {"ok": db_ok, "message": db_msg},
-                "redis": {"ok": redis_ok, "message": redis_msg},
-                "vector": {"ok": vector_ok, "message": vector_msg},
-                "minio": {"ok": minio_ok, "message": minio_msg},
-            },
-        }
-    )
+    """健康检查：返回各依赖连通状态（并发探测，结果短时缓存，见 app.core.health.health_all）"""
+    return await health_all()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+"""
+鉴权中间件（纯 ASGI）：每个请求只解析一次 Bearer token，结果写入 request.state.user。
+路由侧 get_current_active_user 直接读取，不再逐个依赖链里验签、开会话查用户。
+token 缺失或无效时不拦截，交由依赖返回 401，公开接口（套餐列表等）不受影响；
+查库异常同样不在此处中断请求，由依赖就地重试解析并返回 503。
+"""
+import logging
+from typing import Iterable, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.services.auth_service import resolve_user_from_token
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_EXCLUDE_PATHS = ("/api/v1/auth/login", "/api/v1/auth/register")
+
+
+def _bearer_token(scope: Scope) -> Optional[str]:
+    for name, value in scope.get("headers") or ():
+        if name == b"authorization":
+            scheme, _, param = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and param.strip():
+                return param.strip()
+            return None
+    return None
+
+
+class AuthMiddleware:
+    """对 path_prefix 下的 HTTP 请求预解析当前用户（exclude_paths 除外）。"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        path_prefix: str = "/api/v1",
+        exclude_paths: Iterable[str] = _DEFAULT_EXCLUDE_PATHS,
+    ) -> None:
+        self.app = app
+        self.path_prefix = path_prefix
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            path = scope.get("path") or ""
+            if path.startswith(self.path_prefix) and path not in self.exclude_paths:
+                token = _bearer_token(scope)
+                if token:
+                    try:
+                        user = await resolve_user_from_token(token)
+                    except Exception as e:
+                        logger.warning("鉴权中间件解析用户失败（交由依赖处理）: %s", e)
+                        user = None
+                    if user is not None:
+                        scope.setdefault("state", {})["user"] = user
+        await self.app(scope, receive, send)
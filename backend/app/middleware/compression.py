@@ -0,0 +1,64 @@
+"""
+响应压缩中间件（纯 ASGI）：JSON 列表/分块文本等可压缩响应优先走 Brotli（客户端声明 br 且已安装 brotli），否则 GZip；
+文件下载等二进制流（图片、PDF、Office 本身已压缩）直接透传，不做无效压缩，也保留 Content-Length 便于断点与进度显示。
+"""
+from typing import Iterable
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_DEFAULT_EXCLUDE_SUFFIXES = ("/download",)
+
+
+class BrotliResponder(IdentityResponder):
+    """复用 Starlette 的 Responder 流程（小响应不压缩、跳过 text/event-stream 与已编码响应），仅替换压缩算法。"""
+
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = 4) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        out = self.compressor.process(body)
+        return out + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+class SelectiveGZipMiddleware:
+    """
+    path 以 exclude_suffixes 结尾的请求跳过压缩；Accept-Encoding 含 br 时用 Brotli（同等 CPU 下压缩率优于 GZip），
+    其余交给 Starlette 的 GZipMiddleware（已自动跳过 text/event-stream）。brotli_quality<=0 或未安装 brotli 时只用 GZip。
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        compresslevel: int = 6,
+        exclude_suffixes: Iterable[str] = _DEFAULT_EXCLUDE_SUFFIXES,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.exclude_suffixes = tuple(exclude_suffixes)
+        self.brotli_quality = brotli_quality if brotli is not None else 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope.get("path", "").endswith(self.exclude_suffixes):
+            await self.app(scope, receive, send)
+            return
+        if self.brotli_quality > 0 and "br" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = BrotliResponder(self.app, self.minimum_size, quality=self.brotli_quality)
+            await responder(scope, receive, send)
+            return
+        await self.gzip(scope, receive, send)
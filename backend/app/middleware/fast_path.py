@@ -0,0 +1,22 @@
+"""
+探针快速通道（纯 ASGI，挂在最外层）：/live、/health 等路径直接交给独立的轻量 app 处理，
+不经过 CORS、压缩、鉴权、请求 ID 等中间件。子应用 mount 仍会走父应用的整条中间件栈，故在栈外分流。
+"""
+from typing import Iterable
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class FastPathMiddleware:
+    """path 精确命中 paths 的 HTTP 请求转给 fast_app，其余照常进入 app。"""
+
+    def __init__(self, app: ASGIApp, fast_app: ASGIApp, paths: Iterable[str]) -> None:
+        self.app = app
+        self.fast_app = fast_app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope.get("path") in self.paths:
+            await self.fast_app(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
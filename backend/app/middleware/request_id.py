@@ -0,0 +1,72 @@
+"""
+请求 ID 中间件（纯 ASGI）：为每个请求生成或透传 X-Request-ID，同步 X-Trace-Id、客户端 IP 到上下文变量（改造 D-2），审计日志从中读取。
+不经 BaseHTTPMiddleware：不额外起任务、不构造 Request/Response，只读 scope 中的原始头、在 http.response.start 上追加响应头。
+"""
+import logging
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.reqid import new_request_id
+from app.core.request_context import reset_request_meta, reset_trace_id, set_request_meta, set_trace_id
+
+logger = logging.getLogger(__name__)
+
+
+def _client_ip(scope: Scope, forwarded: bytes) -> str:
+    """与 deps.get_client_ip 一致：优先 X-Forwarded-For 第一跳，其次连接对端地址。"""
+    if forwarded:
+        return forwarded.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return (client[0] or "") if client else ""
+
+
+class RequestIDMiddleware:
+    """request.state.request_id 供异常处理等读取；响应头回写 X-Request-ID / X-Trace-Id。"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid_raw = trace_raw = forwarded = b""
+        for name, value in scope.get("headers") or ():
+            if name == b"x-request-id":
+                rid_raw = value
+            elif name == b"x-trace-id":
+                trace_raw = value
+            elif name == b"x-forwarded-for":
+                forwarded = value
+        if not rid_raw:
+            rid_raw = new_request_id()
+        rid = rid_raw.decode("latin-1")
+        trace_raw = trace_raw.strip() or rid_raw
+        trace = trace_raw.decode("latin-1")
+        scope.setdefault("state", {})["request_id"] = rid
+        extra_headers = [(b"x-request-id", rid_raw), (b"x-trace-id", trace_raw)]
+        tok = set_trace_id(trace)
+        meta_tok = set_request_meta(rid, _client_ip(scope, forwarded))
+        method, path = scope.get("method", ""), scope.get("path", "")
+        t0 = time.perf_counter()
+        logger.debug("request start method=%s path=%s request_id=%s trace_id=%s", method, path, rid, trace)
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *extra_headers]
+                logger.debug(
+                    "request end method=%s path=%s status=%s duration_ms=%.1f request_id=%s",
+                    method,
+                    path,
+                    message.get("status", "-"),
+                    (time.perf_counter() - t0) * 1000.0,
+                    rid,
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            reset_request_meta(meta_tok)
+            reset_trace_id(tok)
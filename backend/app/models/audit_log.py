@@ -1,7 +1,7 @@
 """
 操作审计日志：上传、删除知识库、删除文件、修改配置等关键操作
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -9,9 +9,13 @@ from app.core.database import Base
 class AuditLog(Base):
     """审计日志表"""
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        # 列表按 user_id 过滤、(created_at, id) 倒序做游标分页
+        Index("ix_audit_logs_user_created_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # 由 ix_audit_logs_user_created_id 前缀覆盖
     action = Column(String(64), nullable=False, index=True)  # upload_file, delete_kb, delete_file, update_kb_config 等
     resource_type = Column(String(32), nullable=True, index=True)  # knowledge_base, file, config
     resource_id = Column(String(64), nullable=True)  # 可选，如 kb_id、file_id
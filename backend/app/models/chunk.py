@@ -1,7 +1,7 @@
 """
 文档块模型
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -10,9 +10,13 @@ from app.core.database import Base
 class Chunk(Base):
     """文档块表"""
     __tablename__ = "chunks"
+    __table_args__ = (
+        # 按文件取分块、按 chunk_index 排序 / 取相邻窗口
+        Index("ix_chunks_file_chunk_index", "file_id", "chunk_index"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    file_id = Column(Integer, ForeignKey("files.id"), nullable=False, index=True)
+    file_id = Column(Integer, ForeignKey("files.id"), nullable=False)
     knowledge_base_id = Column(Integer, ForeignKey("knowledge_bases.id"), nullable=True, index=True)
     content = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
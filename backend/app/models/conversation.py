@@ -1,7 +1,8 @@
 """
 对话模型
 """
-from sqlalchemy import Column, Integer, String, Text, Integer as IntCol, DateTime, ForeignKey, Float
+from sqlalchemy import JSON, Column, Integer, String, Text, Integer as IntCol, DateTime, ForeignKey, Float, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -16,9 +17,13 @@ except ImportError:
 class Conversation(Base):
     """对话表"""
     __tablename__ = "conversations"
+    __table_args__ = (
+        # 会话列表按 user_id 过滤、updated_at 倒序分页；前缀 user_id 同时覆盖按用户计数
+        Index("ix_conversations_user_updated", "user_id", "updated_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     knowledge_base_id = Column(Integer, ForeignKey("knowledge_bases.id"), nullable=True)
     title = Column(String(200), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -27,15 +32,26 @@ class Conversation(Base):
     # 关系
     user = relationship("User", back_populates="conversations")
     knowledge_base = relationship("KnowledgeBase", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    # 消息按时间正序；不允许隐式懒加载（异步会话下懒加载本就不可用，且列表逐条加载即 N+1），需要时查询处显式 selectinload
+    messages = relationship(
+        "Message",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        order_by="[Message.created_at, Message.id]",
+        lazy="raise_on_sql",
+    )
 
 
 class Message(Base):
     """消息表"""
     __tablename__ = "messages"
+    __table_args__ = (
+        # 会话内消息按 (created_at, id) 正序读取（见 Conversation.messages）
+        Index("ix_messages_conv_created_id", "conversation_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
     role = Column(String(20), nullable=False)  # user, assistant, system
     content = Column(Text, nullable=False)
     tokens = Column(IntCol, default=0)
@@ -43,10 +59,11 @@ class Message(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # RAG 相关字段（可选）
-    confidence = Column(Text, nullable=True)  # 检索置信度（JSON 字符串，存储 float）
+    confidence = Column(Float, nullable=True)  # 检索置信度（0-1）
     retrieved_context = Column(Text, nullable=True)  # 检索到的上下文内容
     max_confidence_context = Column(Text, nullable=True)  # 最高置信度对应的单个上下文
-    sources = Column(Text, nullable=True)  # 引用来源 JSON：[{"file_id", "original_filename", "chunk_index", "snippet"}]
+    # 引用来源：[{"file_id", "original_filename", "chunk_index", "snippet", ...}]；原生 JSON 列（PostgreSQL 为 JSONB），读出即为 list
+    sources = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
     tools_used = Column(Text, nullable=True)  # 本条回复调用的 MCP 工具名列表 JSON：["tool_a", "tool_b"]
     # 实时联网检索（豆包式）
     web_retrieved_context = Column(Text, nullable=True)  # 联网检索得到的文本摘要
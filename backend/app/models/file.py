@@ -1,7 +1,7 @@
 """
 文件模型
 """
-from sqlalchemy import Column, Integer, String, BigInteger, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, BigInteger, DateTime, ForeignKey, UniqueConstraint, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -19,6 +19,10 @@ class FileStatus(str, enum.Enum):
 class File(Base):
     """文件表"""
     __tablename__ = "files"
+    __table_args__ = (
+        # 去重按用户：同一用户同 MD5 只存一份，不同用户可上传相同内容
+        UniqueConstraint("user_id", "md5_hash", name="uq_files_user_md5"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -27,7 +31,7 @@ class File(Base):
     file_type = Column(String(50), nullable=False)
     file_size = Column(BigInteger, nullable=False)
     storage_path = Column(String(500), nullable=False)
-    md5_hash = Column(String(32), unique=True, nullable=True)
+    md5_hash = Column(String(32), nullable=True)
     status = Column(SQLEnum(FileStatus), default=FileStatus.UPLOADING)
     chunk_count = Column(Integer, default=0)
     processed_at = Column(DateTime(timezone=True), nullable=True)
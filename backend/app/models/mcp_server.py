@@ -1,7 +1,8 @@
 """
 MCP 服务配置：用于接入外部 MCP 服务并在智能问答中按需调用工具
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime
+from sqlalchemy import JSON, Column, Integer, String, Boolean, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -15,7 +16,8 @@ class McpServer(Base):
     transport_type = Column(String(32), nullable=False, default="streamable_http", comment="stdio | streamable_http | sse")
     # config JSON: stdio -> { "command": "npx", "args": ["-y", "xxx"], "env": {} }
     # streamable_http/sse -> { "url": "http://...", "headers": {} }
-    config = Column(Text, nullable=False, comment="JSON 配置")
+    # 原生 JSON 列（PostgreSQL 为 JSONB），读出即为 dict，无需每次 json.loads
+    config = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False, comment="JSON 配置")
     enabled = Column(Boolean, nullable=False, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,7 +1,7 @@
 """
 使用记录模型
 """
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -10,9 +10,13 @@ from app.core.database import Base
 class UsageRecord(Base):
     """使用记录表"""
     __tablename__ = "usage_records"
+    __table_args__ = (
+        # 用量统计按 user_id 过滤 + created_at 时间范围
+        Index("ix_usage_records_user_created", "user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     record_type = Column(String(50), nullable=False)  # upload, query, storage, token
     resource_type = Column(String(50), nullable=True)  # file, conversation
     resource_id = Column(Integer, nullable=True)
@@ -1,7 +1,7 @@
 """审计日志 Schema"""
 from datetime import datetime
 from typing import Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class AuditLogItem(BaseModel):
@@ -16,8 +16,13 @@ class AuditLogItem(BaseModel):
     trace_id: Optional[str] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AuditLogCursor(BaseModel):
+    """游标分页位置：下一页传 before_id / before_created_at"""
+    id: int
+    created_at: datetime
 
 
 class AuditLogListResponse(BaseModel):
@@ -25,3 +30,4 @@ class AuditLogListResponse(BaseModel):
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[AuditLogCursor] = None  # 本页不满 page_size 时为空（已到末页）
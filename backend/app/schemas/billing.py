@@ -1,7 +1,7 @@
 """
 计费相关Schema
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
 from typing import Optional, List, Dict
 
@@ -36,8 +36,7 @@ class PlanResponse(BaseModel):
     monthly_credits: Optional[float] = None
     features: Dict = {}
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class PlanListResponse(BaseModel):
@@ -61,5 +60,4 @@ class OrderResponse(BaseModel):
     payment_method: Optional[str] = None
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
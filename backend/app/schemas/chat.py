@@ -2,7 +2,7 @@
 问答相关Schema
 """
 import json as _json
-from pydantic import BaseModel, field_validator, model_validator, Field
+from pydantic import BaseModel, ConfigDict, field_validator, model_validator, Field
 from datetime import datetime
 from typing import Optional, List, Any, Dict
 
@@ -108,17 +108,13 @@ class MessageResponse(BaseModel):
     @field_validator("sources", mode="before")
     @classmethod
     def parse_sources(cls, v):
-        if v is None:
-            return None
-        if isinstance(v, list):
-            return v
+        # 列为原生 JSON，读出即 list 直接交给 Pydantic；仅未完成列类型转换的旧库仍是 JSON 字符串
         if isinstance(v, str):
             try:
-                data = _json.loads(v)
-                return [SourceItem(**x) for x in data] if data else []
+                return _json.loads(v) or []
             except Exception:
                 return []
-        return None
+        return v
 
     @field_validator("web_sources", mode="before")
     @classmethod
@@ -135,20 +131,6 @@ class MessageResponse(BaseModel):
                 return []
         return None
 
-    @field_validator("confidence", mode="before")
-    @classmethod
-    def parse_confidence(cls, v):
-        if v is None:
-            return None
-        if isinstance(v, (int, float)):
-            return float(v)
-        if isinstance(v, str):
-            try:
-                return float(v)
-            except (ValueError, TypeError):
-                return None
-        return None
-
     @field_validator("agent_trace", mode="before")
     @classmethod
     def parse_agent_trace(cls, v):
@@ -178,8 +160,7 @@ class MessageResponse(BaseModel):
                 return None
         return None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ConversationResponse(BaseModel):
@@ -191,8 +172,7 @@ class ConversationResponse(BaseModel):
     updated_at: datetime
     messages: List[MessageResponse] = []
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ConversationListResponse(BaseModel):
@@ -2,7 +2,7 @@
 召回率评测与 Benchmark 数据集相关 Schema
 """
 from typing import List, Optional, Any, Dict
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 
 
@@ -72,8 +72,7 @@ class BenchmarkDatasetResponse(BaseModel):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class BenchmarkDatasetListResponse(BaseModel):
@@ -3,7 +3,7 @@
 """
 
 from typing import Any, Dict, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ExternalConnectionCreate(BaseModel):
@@ -30,6 +30,5 @@ class ExternalConnectionResponse(BaseModel):
     cookies_present: bool = False
     enabled: bool = True
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
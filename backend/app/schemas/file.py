@@ -1,9 +1,9 @@
 """
 文件相关Schema
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, List
 
 
 class FileResponse(BaseModel):
@@ -17,11 +17,10 @@ class FileResponse(BaseModel):
     chunk_count: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_encoders={datetime: lambda v: v.isoformat()},
+    )
 
 
 class FileListResponse(BaseModel):
@@ -30,3 +29,23 @@ class FileListResponse(BaseModel):
     total: int
     page: int
     page_size: int
+
+
+class FilePresignRequest(BaseModel):
+    """申请预签名直传"""
+    filename: str
+    size: int
+
+
+class FilePresignResponse(BaseModel):
+    """预签名直传表单：客户端以 multipart/form-data POST 到 url（先放 fields 全部字段，最后放 file），完成后调用 finalize"""
+    upload_id: str
+    url: str
+    method: str = "POST"
+    fields: Dict[str, str]
+    expires_in: int
+
+
+class FileFinalizeRequest(BaseModel):
+    """确认直传完成"""
+    upload_id: str
@@ -1,7 +1,7 @@
 """
 知识库相关Schema
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
 from typing import Optional, List
 
@@ -42,8 +42,7 @@ class AddFilesToKnowledgeBaseResponse(BaseModel):
     created_at: datetime
     skipped: List[SkippedFileItem] = []
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class KnowledgeBaseFileItem(BaseModel):
@@ -55,8 +54,7 @@ class KnowledgeBaseFileItem(BaseModel):
     chunk_count_in_kb: int  # 该文件在本知识库中的分块数
     added_at: Optional[datetime] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class KnowledgeBaseFileListResponse(BaseModel):
@@ -73,8 +71,7 @@ class ChunkItem(BaseModel):
     chunk_index: int
     content: str
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ChunkListResponse(BaseModel):
@@ -99,8 +96,7 @@ class KnowledgeBaseResponse(BaseModel):
     enable_rerank: Optional[bool] = True
     enable_hybrid: Optional[bool] = True
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class KnowledgeBaseListResponse(BaseModel):
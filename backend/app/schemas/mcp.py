@@ -1,6 +1,6 @@
 """MCP 服务与工具相关 Schema"""
 from typing import Any, Dict, List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class McpServerCreate(BaseModel):
@@ -24,8 +24,7 @@ class McpServerResponse(BaseModel):
     config: Dict[str, Any]
     enabled: bool
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class McpToolItem(BaseModel):
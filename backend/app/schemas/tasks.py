@@ -1,7 +1,7 @@
 """
 异步任务相关 Schema
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Any, List
 
 
@@ -19,4 +19,16 @@ class TaskStatusResponse(BaseModel):
     status: str  # PENDING, STARTED, SUCCESS, FAILURE, RETRY
     result: Optional[Any] = None
     error: Optional[str] = None
-    traceback: Optional[str] = None
+    traceback: Optional[str] = None  # 仅 include_traceback=true 时返回
+
+
+class TaskBatchRequest(BaseModel):
+    """批量查询任务状态（仪表盘同时轮询多个任务）"""
+    task_ids: List[str] = Field(..., min_length=1, max_length=100)
+    include_traceback: bool = False
+    status_only: bool = False
+
+
+class TaskBatchResponse(BaseModel):
+    """批量任务状态，顺序与请求中的 task_ids 一致"""
+    tasks: List[TaskStatusResponse]
@@ -1,14 +1,65 @@
 """
 操作审计服务：记录关键操作到 audit_logs 表
+defer=True 时写入进程内队列即返回，由后台写入器按批（最多 500 条 / 0.5 秒）INSERT；写入器未启动（Celery、脚本）时退回同步写入
 """
+import asyncio
 import json
 import logging
-from typing import Any, Optional
+from typing import Any, Iterable, List, Optional
 
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.request_context import get_client_ip, get_request_id, get_trace_id
 from app.models.audit_log import AuditLog
 
+_AUDIT_QUEUE_MAXSIZE = 10000
+_AUDIT_FLUSH_MAX = 500
+_AUDIT_FLUSH_INTERVAL_SEC = 0.5
+
+_queue: Optional[asyncio.Queue] = None
+_writer_task: Optional[asyncio.Task] = None
+
+
+def _detail_str(detail: Any) -> Optional[str]:
+    return json.dumps(detail, ensure_ascii=False) if isinstance(detail, dict) else (str(detail) if detail else None)
+
+
+def _row(
+    user_id: int,
+    action: str,
+    resource_type: Optional[str],
+    resource_id: Optional[str],
+    detail: Any,
+    ip: Optional[str],
+    request_id: Optional[str],
+    trace_id: Optional[str],
+) -> dict[str, Any]:
+    """未显式传入的 ip / request_id / trace_id 取自当前请求上下文（request_id 中间件写入）。"""
+    return {
+        "user_id": user_id,
+        "action": action,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "detail": _detail_str(detail),
+        "ip": ip if ip is not None else get_client_ip(),
+        "request_id": request_id if request_id is not None else get_request_id(),
+        "trace_id": trace_id if trace_id is not None else get_trace_id(),
+    }
+
+
+def _enqueue(rows: List[dict[str, Any]]) -> bool:
+    """放入后台写入队列；写入器未运行或剩余容量不足时返回 False，由调用方同步写入。"""
+    if _queue is None or _writer_task is None or _writer_task.done():
+        return False
+    if _queue.maxsize - _queue.qsize() < len(rows):
+        logging.warning("审计日志队列已满，改为同步写入")
+        return False
+    for row in rows:
+        _queue.put_nowait(row)
+    return True
+
 
 async def log_audit(
     db: AsyncSession,
@@ -20,23 +71,16 @@ async def log_audit(
     ip: Optional[str] = None,
     request_id: Optional[str] = None,
     trace_id: Optional[str] = None,
+    defer: bool = False,
 ) -> None:
-    """写入一条审计日志。若未启用 AUDIT_LOG_ENABLED 则跳过。"""
+    """写入一条审计日志。若未启用 AUDIT_LOG_ENABLED 则跳过；defer=True 时交给后台写入器。"""
     if not getattr(settings, "AUDIT_LOG_ENABLED", True):
         return
+    row = _row(user_id, action, resource_type, resource_id, detail, ip, request_id, trace_id)
+    if defer and _enqueue([row]):
+        return
     try:
-        detail_str = json.dumps(detail, ensure_ascii=False) if isinstance(detail, dict) else (str(detail) if detail else None)
-        entry = AuditLog(
-            user_id=user_id,
-            action=action,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            detail=detail_str,
-            ip=ip,
-            request_id=request_id,
-            trace_id=trace_id,
-        )
-        db.add(entry)
+        db.add(AuditLog(**row))
         await db.commit()
     except Exception as e:
         logging.warning("审计日志写入失败: %s", e)
@@ -44,3 +88,89 @@ async def log_audit(
             await db.rollback()
         except Exception:
             pass
+
+
+async def log_audit_bulk(db: AsyncSession, entries: Iterable[dict[str, Any]], defer: bool = False) -> None:
+    """
+    批量写入审计日志（一条 executemany INSERT + 一次提交），用于批量上传等一次产生多条记录的操作。
+    entries 每项字段同 log_audit 参数（user_id、action 必填，其余可选）；defer 同 log_audit。
+    """
+    if not getattr(settings, "AUDIT_LOG_ENABLED", True):
+        return
+    rows = [
+        _row(
+            e["user_id"], e["action"], e.get("resource_type"), e.get("resource_id"),
+            e.get("detail"), e.get("ip"), e.get("request_id"), e.get("trace_id"),
+        )
+        for e in entries
+    ]
+    if not rows:
+        return
+    if defer and _enqueue(rows):
+        return
+    try:
+        await db.execute(insert(AuditLog), rows)
+        await db.commit()
+    except Exception as e:
+        logging.warning("审计日志批量写入失败: %s", e)
+        try:
+            await db.rollback()
+        except Exception:
+            pass
+
+
+async def _write_rows(rows: List[dict[str, Any]]) -> None:
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(AuditLog), rows)
+            await db.commit()
+    except Exception as e:
+        logging.warning("审计日志后台写入失败（%s 条）: %s", len(rows), e)
+
+
+async def _audit_writer(queue: asyncio.Queue) -> None:
+    """后台写入器：攒够 _AUDIT_FLUSH_MAX 条或等待 _AUDIT_FLUSH_INTERVAL_SEC 后批量落库；收到 None 时写完剩余后退出。"""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        first = await queue.get()
+        if first is None:
+            break
+        batch = [first]
+        deadline = loop.time() + _AUDIT_FLUSH_INTERVAL_SEC
+        while len(batch) < _AUDIT_FLUSH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+        await _write_rows(batch)
+
+
+def start_audit_writer() -> None:
+    """应用启动时调用：创建队列并启动后台写入器。"""
+    global _queue, _writer_task
+    if _writer_task is not None and not _writer_task.done():
+        return
+    _queue = asyncio.Queue(maxsize=_AUDIT_QUEUE_MAXSIZE)
+    _writer_task = asyncio.create_task(_audit_writer(_queue))
+
+
+async def stop_audit_writer(timeout: float = 10.0) -> None:
+    """应用关闭时调用：停止接收新条目，写完队列中剩余的审计日志。"""
+    global _queue, _writer_task
+    queue, task = _queue, _writer_task
+    _queue, _writer_task = None, None
+    if queue is None or task is None or task.done():
+        return
+    await queue.put(None)
+    try:
+        await asyncio.wait_for(task, timeout)
+    except asyncio.TimeoutError:
+        logging.warning("审计日志写入器关闭超时，剩余 %s 条未写入", queue.qsize())
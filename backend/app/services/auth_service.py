@@ -1,7 +1,9 @@
 """
 认证服务（直接使用 bcrypt，避免 passlib 与 bcrypt 版本不兼容）
 """
+import logging
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Optional
 import bcrypt
 from jose import jwt, JWTError
@@ -11,10 +13,18 @@ from sqlalchemy import select
 from app.core.config import settings
 from app.models.user import User
 from app.schemas.auth import UserCreate, UserResponse
+from app.services import cache_service
+from app.services.token_cache import cache_user, get_cached_user
+
+logger = logging.getLogger(__name__)
 
 # bcrypt 最多 72 字节，超长密码需截断（与注册/登录一致）
 BCRYPT_MAX_BYTES = 72
 
+# JWT 验签参数只构造一次，避免每个请求重建 algorithms 列表
+_JWT_KEY = settings.JWT_SECRET_KEY
+_JWT_ALGORITHMS = [settings.JWT_ALGORITHM]
+
 
 def _truncate_password_72(password: str) -> bytes:
     """将密码截断为 72 字节（UTF-8），返回 bytes 供 bcrypt 使用"""
@@ -25,10 +35,7 @@ def _truncate_password_72(password: str) -> bytes:
 
 
 class AuthService:
-    """认证服务类"""
-    
-    def __init__(self, db: AsyncSession):
-        self.db = db
+    """认证服务类（无状态，进程内单例见 get_auth_service；会话由调用方按方法传入）"""
     
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """验证密码"""
@@ -55,12 +62,12 @@ class AuthService:
         else:
             expire = datetime.now(timezone.utc) + timedelta(minutes=15)
         to_encode.update({"exp": expire})
-        encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+        encoded_jwt = jwt.encode(to_encode, _JWT_KEY, algorithm=settings.JWT_ALGORITHM)
         return encoded_jwt
     
-    async def authenticate_user(self, username: str, password: str) -> Optional[User]:
+    async def authenticate_user(self, db: AsyncSession, username: str, password: str) -> Optional[User]:
         """验证用户"""
-        user = await self.get_user_by_username(username)
+        user = await self.get_user_by_username(db, username)
         if not user:
             return None
         # 迁移补列导致 password_hash 为空时，直接视为密码错误
@@ -70,25 +77,25 @@ class AuthService:
             return None
         return user
     
-    async def get_user_by_username(self, username: str) -> Optional[User]:
+    async def get_user_by_username(self, db: AsyncSession, username: str) -> Optional[User]:
         """根据用户名获取用户"""
-        result = await self.db.execute(select(User).where(User.username == username))
+        result = await db.execute(select(User).where(User.username == username))
         return result.scalar_one_or_none()
     
-    async def get_user_by_email(self, email: str) -> Optional[User]:
+    async def get_user_by_email(self, db: AsyncSession, email: str) -> Optional[User]:
         """根据邮箱获取用户"""
-        result = await self.db.execute(select(User).where(User.email == email))
+        result = await db.execute(select(User).where(User.email == email))
         return result.scalar_one_or_none()
     
-    async def register_user(self, user_data: UserCreate) -> User:
+    async def register_user(self, db: AsyncSession, user_data: UserCreate) -> User:
         """注册用户"""
         # 检查用户名是否已存在
-        existing_user = await self.get_user_by_username(user_data.username)
+        existing_user = await self.get_user_by_username(db, user_data.username)
         if existing_user:
             raise ValueError("用户名已存在")
         
         # 检查邮箱是否已存在
-        existing_email = await self.get_user_by_email(user_data.email)
+        existing_email = await self.get_user_by_email(db, user_data.email)
         if existing_email:
             raise ValueError("邮箱已存在")
         
@@ -99,31 +106,26 @@ class AuthService:
             password_hash=self.get_password_hash(user_data.password),
             phone=user_data.phone
         )
-        self.db.add(user)
-        await self.db.commit()
-        await self.db.refresh(user)
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
         return user
     
-    async def get_current_user(self, token: str) -> User:
+    async def get_current_user(self, db: AsyncSession, token: str) -> User:
         """获取当前用户"""
         credentials_exception = ValueError("无效的认证凭据")
-        try:
-            payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-            username: str = payload.get("sub")
-            if username is None:
-                raise credentials_exception
-        except JWTError:
+        username = username_from_token(token)
+        if username is None:
             raise credentials_exception
         
-        user = await self.get_user_by_username(username)
+        user = await self.get_user_by_username(db, username)
         if user is None:
             raise credentials_exception
         return user
 
-    async def update_password(self, user_id: int, old_password: str, new_password: str) -> None:
+    async def update_password(self, db: AsyncSession, user_id: int, old_password: str, new_password: str) -> None:
         """修改密码：校验旧密码后更新为新密码"""
-        from sqlalchemy import select
-        result = await self.db.execute(select(User).where(User.id == user_id))
+        result = await db.execute(select(User).where(User.id == user_id))
         user = result.scalar_one_or_none()
         if not user:
             raise ValueError("用户不存在")
@@ -132,4 +134,81 @@ class AuthService:
         if not self.verify_password(old_password, user.password_hash):
             raise ValueError("原密码错误")
         user.password_hash = self.get_password_hash(new_password)
-        await self.db.commit()
+        await db.commit()
+
+
+def username_from_token(token: str) -> Optional[str]:
+    """验签并取 sub（用户名）；无效或缺失返回 None。"""
+    try:
+        payload = jwt.decode(token, _JWT_KEY, algorithms=_JWT_ALGORITHMS)
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
+def user_response_from_orm(user: User) -> UserResponse:
+    """由可信 ORM 行直接构造 UserResponse（model_construct 跳过校验）；credits 为 Numeric，需显式转 float。"""
+    return UserResponse.model_construct(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        phone=user.phone,
+        avatar_url=user.avatar_url,
+        role=user.role,
+        plan_id=user.plan_id,
+        credits=float(user.credits or 0),
+        is_active=bool(user.is_active),
+        created_at=user.created_at,
+        last_login_at=user.last_login_at,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_auth_service() -> AuthService:
+    """AuthService 进程内单例，可直接用作 FastAPI 依赖。"""
+    return AuthService()
+
+
+async def resolve_user_from_token(token: str) -> Optional[UserResponse]:
+    """
+    token -> UserResponse：先查进程内缓存，未命中再验签，按用户名查 Redis（多实例共享），仍未命中才查库（独立短会话，不占用请求的 get_db）。
+    供鉴权中间件与 get_current_user 共用；token 无效或用户不存在返回 None（由调用方返回 401），
+    数据库等基础设施异常照常抛出，避免故障被当成凭据失效、前端收到 401 后登出全部用户。
+    """
+    if not token:
+        return None
+    cached = get_cached_user(token)
+    if cached is not None:
+        return cached
+    username = username_from_token(token)
+    if username is None:
+        return None
+    cache_key = cache_service.key_auth_user(username)
+    data = await cache_service.aget(cache_key)
+    if data is not None:
+        try:
+            user_response = UserResponse.model_validate(data)
+        except Exception as e:
+            logger.debug("用户缓存反序列化失败 %s: %s", cache_key, e)
+        else:
+            cache_user(token, user_response)
+            return user_response
+    from app.core.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        user = await get_auth_service().get_user_by_username(db, username)
+        if user is None:
+            return None
+        user_response = user_response_from_orm(user)
+    await cache_service.aset(
+        cache_key,
+        user_response.model_dump(mode="json"),
+        getattr(settings, "AUTH_USER_CACHE_TTL_SEC", 60),
+    )
+    cache_user(token, user_response)
+    return user_response
+
+
+async def invalidate_user_cache(username: str) -> None:
+    """用户资料变更（登录时间、密码等）后删除 Redis 中的用户快照。"""
+    await cache_service.adelete(cache_service.key_auth_user(username))
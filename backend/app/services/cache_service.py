@@ -1,16 +1,31 @@
 """
 Redis 缓存服务：通用 get/set/delete，用于仪表盘、列表、详情等加速
 与限流共用同一 Redis 实例，使用 key 前缀 cache: 区分
+同步接口供 Celery 任务与线程内调用；路由等协程内用 aget/aset/ahget/ahset/adelete/adelete_by_prefix/apipeline_delete（redis.asyncio，不占线程池）
 """
 import json
 import logging
-from typing import Any, Optional
+import time
+from typing import Any, Iterable, List, Optional, Tuple
+
+import orjson
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
 _redis_client = None
+_async_redis_client = None
+_hset_expire_script = None
+
+# HSET 字段 + 整个 hash 尚无过期时才设置 EXPIRE（不因后续写入其他字段而续期，保证最长陈旧时间不超过 ttl）
+_HSET_EXPIRE_LUA = """
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return 1
+"""
 
 
 def _get_redis():
@@ -94,6 +109,25 @@ def delete(key: str) -> bool:
         return False
 
 
+def delete_many(keys: Iterable[str]) -> int:
+    """一次 UNLINK 删除多个 key（Celery 等同步场景用）。返回删除的 key 数量。"""
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return 0
+    r = _get_redis()
+    if not r:
+        return 0
+    targets = [_key(k) for k in keys]
+    if not targets:
+        return 0
+    try:
+        count = int(r.unlink(*targets) or 0)
+        logger.debug("缓存 delete_many keys=%s deleted=%s", len(targets), count)
+        return count
+    except Exception as e:
+        logger.debug("缓存 delete_many 失败: %s", e)
+        return 0
+
+
 def delete_by_prefix(prefix: str) -> int:
     """按前缀删除（如 stats:user:1 删除该用户所有 stats 缓存）。返回删除的 key 数量。"""
     if not getattr(settings, "CACHE_ENABLED", True):
@@ -114,33 +148,366 @@ def delete_by_prefix(prefix: str) -> int:
         return 0
 
 
+def _dumps(value: Any) -> bytes:
+    """bytes 视为已序列化的 JSON 原样返回，其余 orjson 序列化。"""
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return orjson.dumps(value, default=str)
+
+
+# ---------- 异步接口（redis.asyncio），与同步接口共用 key 与 JSON 格式 ---------- #
+def _get_async_redis():
+    """获取 redis.asyncio 客户端（懒加载）；返回 bytes，直接交给 orjson 解析。"""
+    global _async_redis_client
+    if _async_redis_client is None:
+        try:
+            import redis.asyncio as aioredis
+            # 阻塞式连接池：连接数到上限时短暂等待空闲连接，而不是直接报 Too many connections
+            pool = aioredis.BlockingConnectionPool.from_url(
+                settings.REDIS_URL,
+                decode_responses=False,
+                max_connections=int(getattr(settings, "REDIS_MAX_CONNECTIONS", 50)),
+                timeout=float(getattr(settings, "REDIS_SOCKET_TIMEOUT_SEC", 3.0)),
+                socket_connect_timeout=float(getattr(settings, "REDIS_SOCKET_CONNECT_TIMEOUT_SEC", 2.5)),
+                socket_timeout=float(getattr(settings, "REDIS_SOCKET_TIMEOUT_SEC", 3.0)),
+            )
+            _async_redis_client = aioredis.Redis(connection_pool=pool)
+        except Exception as e:
+            logger.warning("异步缓存 Redis 连接失败，缓存将不生效: %s", e)
+    return _async_redis_client
+
+
+async def aget(key: str, raw: bool = False) -> Optional[Any]:
+    """异步读取缓存，orjson 反序列化；raw=True 时直接返回 JSON bytes（可原样作为响应体）。不存在或异常返回 None。"""
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return None
+    r = _get_async_redis()
+    if not r:
+        return None
+    try:
+        data = await r.get(_key(key))
+        if data is None:
+            logger.debug("缓存 miss key=%s", key)
+            return None
+        logger.debug("缓存 hit key=%s", key)
+        return data if raw else orjson.loads(data)
+    except Exception as e:
+        logger.debug("缓存 aget 失败 %s: %s", key, e)
+        return None
+
+
+async def amget(keys: Iterable[str], raw: bool = False) -> List[Optional[Any]]:
+    """
+    一次 MGET 批量读取多个字符串 key，结果与 keys 一一对应（不存在为 None）；raw 语义同 aget。
+    同一请求需要读多个独立 key 时优先用它，而不是逐个 aget 或 gather 多次往返。
+    """
+    keys = list(keys)
+    if not keys or not getattr(settings, "CACHE_ENABLED", True):
+        return [None] * len(keys)
+    r = _get_async_redis()
+    if not r:
+        return [None] * len(keys)
+    try:
+        values = await r.mget([_key(k) for k in keys])
+        logger.debug("缓存 amget keys=%s hit=%s", len(keys), sum(v is not None for v in values))
+        if raw:
+            return list(values)
+        return [None if v is None else orjson.loads(v) for v in values]
+    except Exception as e:
+        logger.debug("缓存 amget 失败 keys=%s: %s", len(keys), e)
+        return [None] * len(keys)
+
+
+async def aset(key: str, value: Any, ttl: Optional[int] = None) -> bool:
+    """异步写入缓存，orjson 序列化（无法序列化的类型按 str 处理；bytes 视为已序列化的 JSON 原样写入）。ttl 语义同 set。"""
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return False
+    r = _get_async_redis()
+    if not r:
+        return False
+    if ttl is None:
+        ttl = getattr(settings, "CACHE_TTL_LIST", 60)
+    try:
+        payload = _dumps(value)
+        k = _key(key)
+        if ttl is not None and ttl <= 0:
+            await r.set(k, payload)  # 不设过期（慎用）
+        else:
+            await r.setex(k, ttl, payload)
+        logger.debug("缓存 aset key=%s ttl=%s", key, ttl)
+        return True
+    except Exception as e:
+        logger.debug("缓存 aset 失败 %s: %s", key, e)
+        return False
+
+
+async def adelete(key: str) -> bool:
+    """异步删除单个 key。"""
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return False
+    r = _get_async_redis()
+    if not r:
+        return False
+    try:
+        await r.delete(_key(key))
+        logger.debug("缓存 adelete key=%s", key)
+        return True
+    except Exception as e:
+        logger.debug("缓存 adelete 失败 %s: %s", key, e)
+        return False
+
+
+async def adelete_by_prefix(prefix: str) -> int:
+    """异步按前缀删除（SCAN 游标遍历，按批删除）。返回删除的 key 数量。"""
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return 0
+    r = _get_async_redis()
+    if not r:
+        return 0
+    full_prefix = _key(prefix)
+    try:
+        count = 0
+        batch: list = []
+        async for k in r.scan_iter(match=f"{full_prefix}*", count=500):
+            batch.append(k)
+            if len(batch) >= 500:
+                count += await r.delete(*batch)
+                batch = []
+        if batch:
+            count += await r.delete(*batch)
+        logger.debug("缓存 adelete_by_prefix prefix=%s deleted=%s", prefix, count)
+        return count
+    except Exception as e:
+        logger.debug("缓存 adelete_by_prefix 失败 %s: %s", prefix, e)
+        return 0
+
+
+async def ahget(key: str, field: str, raw: bool = False) -> Optional[Any]:
+    """异步读取 hash 缓存中的单个字段；raw 同 aget。不存在或异常返回 None。"""
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return None
+    r = _get_async_redis()
+    if not r:
+        return None
+    try:
+        data = await r.hget(_key(key), field)
+        if data is None:
+            logger.debug("缓存 miss key=%s field=%s", key, field)
+            return None
+        logger.debug("缓存 hit key=%s field=%s", key, field)
+        return data if raw else orjson.loads(data)
+    except Exception as e:
+        logger.debug("缓存 ahget 失败 %s %s: %s", key, field, e)
+        return None
+
+
+async def ahset(key: str, field: str, value: Any, ttl: Optional[int] = None) -> bool:
+    """异步写入 hash 缓存字段（value 规则同 aset）；过期时间作用于整个 hash，首次写入时设置。失效时 adelete(key) 整体删除。"""
+    global _hset_expire_script
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return False
+    r = _get_async_redis()
+    if not r:
+        return False
+    if ttl is None or ttl <= 0:
+        ttl = getattr(settings, "CACHE_TTL_LIST", 60)
+    try:
+        if _hset_expire_script is None:
+            _hset_expire_script = r.register_script(_HSET_EXPIRE_LUA)
+        payload = _dumps(value)
+        await _hset_expire_script(keys=[_key(key)], args=[field, payload, int(ttl)])
+        logger.debug("缓存 ahset key=%s field=%s ttl=%s", key, field, ttl)
+        return True
+    except Exception as e:
+        logger.debug("缓存 ahset 失败 %s %s: %s", key, field, e)
+        return False
+
+
+async def aset_with_soft_ttl(key: str, value: Any, ttl: int, soft_ratio: float = 0.8) -> bool:
+    """写入带软过期的缓存：硬过期 ttl 秒，超过 ttl*soft_ratio 后读取方会得到 stale=True，提前刷新。"""
+    entry = {"v": value, "soft_exp": time.time() + ttl * soft_ratio}
+    return await aset(key, entry, ttl)
+
+
+async def aget_with_soft_ttl(key: str) -> Tuple[Optional[Any], bool]:
+    """读取 aset_with_soft_ttl 写入的缓存，返回 (value, stale)；不存在返回 (None, False)。"""
+    entry = await aget(key)
+    if not isinstance(entry, dict) or "v" not in entry:
+        return None, False
+    return entry["v"], time.time() >= float(entry.get("soft_exp") or 0)
+
+
+async def aacquire_lock(key: str, ttl: int = 5) -> bool:
+    """SET NX EX 抢占短锁（用于缓存刷新互斥）；Redis 不可用时返回 True，由调用方自行刷新。"""
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return True
+    r = _get_async_redis()
+    if not r:
+        return True
+    try:
+        return bool(await r.set(_key(key), b"1", nx=True, ex=ttl))
+    except Exception as e:
+        logger.debug("缓存 aacquire_lock 失败 %s: %s", key, e)
+        return True
+
+
+async def aget_list_version(key: str, ttl: Optional[int] = None) -> Optional[str]:
+    """
+    列表版本号（用于 ETag）：与列表缓存一同失效（见 kb_list_keys / file_list_keys），下次读取生成新版本。
+    带与列表缓存相同的 TTL，最长陈旧时间与列表缓存一致。Redis 不可用返回 None。
+    """
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return None
+    r = _get_async_redis()
+    if not r:
+        return None
+    if ttl is None:
+        ttl = getattr(settings, "CACHE_TTL_LIST", 60)
+    k = _key(key)
+    try:
+        v = await r.get(k)
+        if v is None:
+            fresh = format(time.time_ns(), "x").encode()
+            if await r.set(k, fresh, nx=True, ex=max(1, int(ttl))):
+                v = fresh
+            else:
+                v = await r.get(k) or fresh
+        return v.decode() if isinstance(v, bytes) else str(v)
+    except Exception as e:
+        logger.debug("缓存 aget_list_version 失败 %s: %s", key, e)
+        return None
+
+
+async def aget_list_version_and_page(
+    version_key: str, key: str, field: str, ttl: Optional[int] = None
+) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    在单个 MULTI/EXEC 中读取列表版本号与分页缓存（raw bytes）：一次往返且两者取自同一时刻，
+    避免失效恰好落在两次读取之间、旧分页内容挂上新版本 ETag 后被客户端长期 304。
+    版本号不存在时按 aget_list_version 生成（失效会同时删除分页缓存）。Redis 不可用返回 (None, None)。
+    """
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return None, None
+    r = _get_async_redis()
+    if not r:
+        return None, None
+    try:
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.get(_key(version_key))
+            pipe.hget(_key(key), field)
+            v, data = await pipe.execute()
+    except Exception as e:
+        logger.debug("缓存 aget_list_version_and_page 失败 %s %s: %s", key, field, e)
+        return None, None
+    logger.debug("缓存 %s key=%s field=%s", "hit" if data is not None else "miss", key, field)
+    if v is None:
+        return await aget_list_version(version_key, ttl), data
+    return (v.decode() if isinstance(v, bytes) else str(v)), data
+
+
+async def apipeline_delete(keys: Iterable[str], prefixes: Iterable[str] = ()) -> int:
+    """
+    批量失效：先 SCAN 收集各前缀下的 key，再与 keys 一起在单个 MULTI/EXEC 中 UNLINK（一次往返，内存由 Redis 后台线程回收）。
+    返回删除的 key 数量。
+    """
+    if not getattr(settings, "CACHE_ENABLED", True):
+        return 0
+    r = _get_async_redis()
+    if not r:
+        return 0
+    targets = [_key(k) for k in keys]
+    prefixes = list(prefixes)
+    try:
+        for prefix in prefixes:
+            async for k in r.scan_iter(match=f"{_key(prefix)}*", count=500):
+                targets.append(k)
+        if not targets:
+            return 0
+        async with r.pipeline(transaction=True) as pipe:
+            for i in range(0, len(targets), 500):
+                pipe.unlink(*targets[i:i + 500])
+            results = await pipe.execute()
+        count = sum(int(n or 0) for n in results)
+        logger.debug("缓存 apipeline_delete keys=%s prefixes=%s deleted=%s", len(targets), prefixes, count)
+        return count
+    except Exception as e:
+        logger.debug("缓存 apipeline_delete 失败: %s", e)
+        return 0
+
+
 # ---------- 业务 key 约定，便于统一失效 ---------- #
 def key_dashboard_stats(user_id: int) -> str:
     return f"stats:user:{user_id}"
 
 
+def key_dashboard_stats_lock(user_id: int) -> str:
+    return f"stats:lock:{user_id}"
+
+
+def key_auth_user(username: str) -> str:
+    return f"auth:user:{username}"
+
+
 def key_usage_limits(user_id: int) -> str:
     return f"usage_limits:user:{user_id}"
 
 
-def key_kb_list(user_id: int, page: int, page_size: int) -> str:
-    return f"kb:list:user:{user_id}:p:{page}:ps:{page_size}"
+def key_kb_list(user_id: int) -> str:
+    """知识库列表缓存为每用户一个 hash，各分页为字段（field_page），失效时删 kb_list_keys，无需 SCAN。"""
+    return f"kb:list:user:{user_id}"
+
+
+def key_kb_list_version(user_id: int) -> str:
+    return f"kb:list:ver:user:{user_id}"
+
+
+def kb_list_keys(user_id: int) -> List[str]:
+    """失效知识库列表时需删除的 key：分页 hash + ETag 版本号。"""
+    return [key_kb_list(user_id), key_kb_list_version(user_id)]
 
 
 def key_kb_detail(kb_id: int) -> str:
     return f"kb:detail:{kb_id}"
 
 
-def key_conv_list(user_id: int, page: int, page_size: int) -> str:
-    return f"conv:list:user:{user_id}:p:{page}:ps:{page_size}"
+def key_conv_list(user_id: int) -> str:
+    """会话列表缓存为每用户一个 hash，各分页为字段（field_page），失效时整体 DEL，无需 SCAN。"""
+    return f"conv:list:user:{user_id}"
+
+
+def field_page(page: int, page_size: int) -> str:
+    """分页列表 hash 的字段名。"""
+    return f"p:{page}:ps:{page_size}"
 
 
 def key_conv_detail(conv_id: int) -> str:
     return f"conv:detail:{conv_id}"
 
 
-def key_file_list(user_id: int, page: int, page_size: int) -> str:
-    return f"file:list:user:{user_id}:p:{page}:ps:{page_size}"
+def key_file_list(user_id: int) -> str:
+    """文件列表缓存：同 key_kb_list，每用户一个 hash。"""
+    return f"file:list:user:{user_id}"
+
+
+def key_file_list_version(user_id: int) -> str:
+    return f"file:list:ver:user:{user_id}"
+
+
+def file_list_keys(user_id: int) -> List[str]:
+    return [key_file_list(user_id), key_file_list_version(user_id)]
+
+
+def key_mcp_tools(server_id: int, config_fp: str) -> str:
+    """MCP 服务工具列表；配置变更后指纹不同自然不命中，更新/删除时按 prefix_mcp_tools 整体失效。"""
+    return f"mcp:tools:{server_id}:{config_fp}"
+
+
+def prefix_mcp_tools(server_id: int) -> str:
+    return f"mcp:tools:{server_id}:"
+
+
+def key_audit_count(user_id: int, action: Optional[str], resource_type: Optional[str]) -> str:
+    return f"audit_count:{user_id}:{action or ''}:{resource_type or ''}"
 
 
 # 智能问答「先上传、再发消息」：临时存上传文件的提取结果，key_chat_upload(upload_id)。TTL 从配置读取，默认 7 天；会话内点开查看的内容在发消息时写入消息表，仅随会话删除而清理
@@ -158,21 +525,21 @@ def key_chat_upload(upload_id: str) -> str:
     return f"chat_upload:{upload_id}"
 
 
-def prefix_user_kb_list(user_id: int) -> str:
-    return f"kb:list:user:{user_id}:"
-
-
-def prefix_user_conv_list(user_id: int) -> str:
-    return f"conv:list:user:{user_id}:"
-
-
-def prefix_user_file_list(user_id: int) -> str:
-    return f"file:list:user:{user_id}:"
+# 预签名直传的待确认上传：finalize 时取出对象路径与申请时的大小，key_presigned_upload(upload_id)
+def key_presigned_upload(upload_id: str) -> str:
+    return f"presigned_upload:{upload_id}"
 
 
 def invalidate_conversation_cache(user_id: int, conv_id: int) -> None:
     """会话或消息变更后调用：使该会话详情、该用户会话列表、仪表盘统计、用量快照缓存失效。"""
     delete(key_conv_detail(conv_id))
-    delete_by_prefix(prefix_user_conv_list(user_id))
+    delete(key_conv_list(user_id))
     delete(key_dashboard_stats(user_id))
     delete(key_usage_limits(user_id))
+
+
+async def ainvalidate_conversation_cache(user_id: int, conv_id: int) -> None:
+    """invalidate_conversation_cache 的异步版本，所有删除合并为一次管道提交。"""
+    await apipeline_delete(
+        [key_conv_detail(conv_id), key_conv_list(user_id), key_dashboard_stats(user_id), key_usage_limits(user_id)]
+    )
@@ -2,7 +2,7 @@
 问答服务：支持基于知识库的 RAG（向量检索 + LLM）
 """
 import asyncio
-import base64
+import pybase64
 import json as _json
 import logging
 import re
@@ -406,8 +406,8 @@ class ChatService:
             rows: List[Dict[str, Any]] = []
             for _sid, sname, transport_type, config in servers:
                 try:
-                    cfg_str = config if isinstance(config, str) else _json.dumps(config or {}, ensure_ascii=False)
-                    tools = await list_tools_from_server(transport_type, cfg_str)
+                    cfg = config or {}
+                    tools = await list_tools_from_server(transport_type, cfg)
                     logger.debug("mcp tools listed server=%s count=%s", sname, len(tools or []))
                 except Exception:
                     logger.warning("mcp tools list failed server=%s", sname, exc_info=True)
@@ -420,7 +420,7 @@ class ChatService:
                         {
                             "server_name": str(sname or ""),
                             "transport_type": transport_type,
-                            "config_json": cfg_str,
+                            "config_json": cfg,
                             "tool_name": tname,
                             "description": str(t.get("description") or ""),
                             "input_schema": t.get("inputSchema") or {"type": "object", "properties": {}},
@@ -1401,7 +1401,7 @@ class ChatService:
                 file_content_parts.append(f"## {file_name}\n（未提供文件内容，仅知文件名）")
                 continue
             try:
-                raw = base64.b64decode(content_b64, validate=True)
+                raw = pybase64.b64decode(content_b64, validate=True)
             except Exception as e:
                 logging.warning("智能问答附件 base64 解码失败 %s: %s", file_name, e)
                 file_content_parts.append(f"## {file_name}\n（文件内容解码失败）")
@@ -3484,8 +3484,7 @@ class ChatService:
         lines: List[str] = []
         for sname, transport_type, config in servers:
             try:
-                cfg_str = config if isinstance(config, str) else _json.dumps(config or {})
-                tools = await list_tools_from_server(transport_type, cfg_str)
+                tools = await list_tools_from_server(transport_type, config or {})
             except Exception:
                 lines.append(f"- **{sname}**: (获取工具列表失败)")
                 continue
@@ -3607,7 +3606,7 @@ class ChatService:
             if rag_scored_chunks
             else await self._build_sources_from_chunks(selected_chunks)
         )
-        sources_json = _json.dumps([s.model_dump() for s in sources], ensure_ascii=False) if sources else None
+        sources_rows = [s.model_dump() for s in sources] if sources else None
         tools_used_json = _json.dumps(tools_used, ensure_ascii=False) if tools_used else None
         web_sources_json = _json.dumps(web_sources_list, ensure_ascii=False) if web_sources_list else None
 
@@ -3617,10 +3616,10 @@ class ChatService:
             content=assistant_content,
             tokens=len(assistant_content) // 2,
             model=settings.LLM_MODEL,
-            confidence=str(rag_confidence) if has_real_retrieval else None,  # 存储为字符串
+            confidence=float(rag_confidence) if has_real_retrieval else None,
             retrieved_context=retrieved_context_original if (has_real_retrieval and rag_confidence < settings.RAG_CONFIDENCE_THRESHOLD) else None,
             max_confidence_context=max_confidence_context if max_confidence_context else None,
-            sources=sources_json,
+            sources=sources_rows,
             tools_used=tools_used_json,
             web_retrieved_context=web_retrieved_context or None,
             web_sources=web_sources_json,
@@ -3639,7 +3638,7 @@ class ChatService:
             assistant_message=assistant_content,
         )
         try:
-            await asyncio.to_thread(cache_service.invalidate_conversation_cache, conv.user_id, conv.id)
+            await cache_service.ainvalidate_conversation_cache(conv.user_id, conv.id)
         except Exception as e:
             logging.warning("会话缓存失效失败（不影响回复）: %s", e)
 
@@ -3739,7 +3738,7 @@ class ChatService:
             if rag_scored_chunks
             else await self._build_sources_from_chunks(selected_chunks or [])
         )
-        sources_json = _json.dumps([s.model_dump() for s in sources], ensure_ascii=False) if sources else None
+        sources_rows = [s.model_dump() for s in sources] if sources else None
         tools_used_json = _json.dumps(tools_used, ensure_ascii=False) if tools_used else None
         web_sources_json = _json.dumps(web_sources_list, ensure_ascii=False) if web_sources_list else None
 
@@ -3766,10 +3765,10 @@ class ChatService:
             content=assistant_content,
             tokens=len(assistant_content) // 2,
             model=settings.LLM_MODEL,
-            confidence=str(rag_confidence) if has_real_retrieval else None,
+            confidence=float(rag_confidence) if has_real_retrieval else None,
             retrieved_context=retrieved_context_original if has_real_retrieval and rag_confidence < settings.RAG_CONFIDENCE_THRESHOLD else None,
             max_confidence_context=max_confidence_context if max_confidence_context else None,
-            sources=sources_json,
+            sources=sources_rows,
             tools_used=tools_used_json,
             web_retrieved_context=web_retrieved_context or None,
             web_sources=web_sources_json,
@@ -3783,7 +3782,7 @@ class ChatService:
         await self.db.commit()
         await self.db.refresh(conv)
         try:
-            await asyncio.to_thread(cache_service.invalidate_conversation_cache, conv.user_id, conv.id)
+            await cache_service.ainvalidate_conversation_cache(conv.user_id, conv.id)
         except Exception as e:
             logging.warning("会话缓存失效失败（不影响回复）: %s", e)
 
@@ -3953,7 +3952,7 @@ class ChatService:
                 if rag_scored_chunks
                 else await self._build_sources_from_chunks(selected_chunks or [])
             )
-            sources_json = _json.dumps([s.model_dump() for s in sources], ensure_ascii=False) if sources else None
+            sources_rows = [s.model_dump() for s in sources] if sources else None
             tools_used_json = _json.dumps(tools_used, ensure_ascii=False) if tools_used else None
             web_sources_json = _json.dumps(web_sources_list, ensure_ascii=False) if web_sources_list else None
             agent_trace_json = (
@@ -3966,10 +3965,10 @@ class ChatService:
                 content=assistant_content,
                 tokens=len(assistant_content) // 2,
                 model=settings.LLM_MODEL,
-                confidence=str(rag_confidence) if (selected_chunks and rag_confidence is not None) else None,
+                confidence=float(rag_confidence) if (selected_chunks and rag_confidence is not None) else None,
                 retrieved_context=None,
                 max_confidence_context=max_confidence_context if max_confidence_context else None,
-                sources=sources_json,
+                sources=sources_rows,
                 tools_used=tools_used_json,
                 web_retrieved_context=web_retrieved_context or None,
                 web_sources=web_sources_json,
@@ -3990,7 +3989,7 @@ class ChatService:
                 assistant_message=assistant_content,
             )
             try:
-                await asyncio.to_thread(cache_service.invalidate_conversation_cache, conv.user_id, conv.id)
+                await cache_service.ainvalidate_conversation_cache(conv.user_id, conv.id)
             except Exception as e:
                 logging.warning("会话缓存失效失败（不影响回复）: %s", e)
 
@@ -4082,7 +4081,7 @@ class ChatService:
             if rag_scored_chunks
             else await self._build_sources_from_chunks(selected_chunks)
         )
-        sources_json = _json.dumps([s.model_dump() for s in sources], ensure_ascii=False) if sources else None
+        sources_rows = [s.model_dump() for s in sources] if sources else None
         tools_used_json = _json.dumps(tools_used, ensure_ascii=False) if tools_used else None
         web_sources_json = _json.dumps(web_sources_list, ensure_ascii=False) if web_sources_list else None
         assistant_msg = Message(
@@ -4091,10 +4090,10 @@ class ChatService:
             content=assistant_content,
             tokens=len(assistant_content) // 2,
             model=settings.LLM_MODEL,
-            confidence=str(rag_confidence) if rag_context and rag_context.strip() and not rag_context.startswith("[系统提示：") else None,
+            confidence=float(rag_confidence) if rag_context and rag_context.strip() and not rag_context.startswith("[系统提示：") else None,
             retrieved_context=None,
             max_confidence_context=max_confidence_context,
-            sources=sources_json,
+            sources=sources_rows,
             tools_used=tools_used_json,
             web_retrieved_context=web_retrieved_context or None,
             web_sources=web_sources_json,
@@ -4112,7 +4111,7 @@ class ChatService:
             assistant_message=assistant_content,
         )
         try:
-            await asyncio.to_thread(cache_service.invalidate_conversation_cache, conv.user_id, conv.id)
+            await cache_service.ainvalidate_conversation_cache(conv.user_id, conv.id)
         except Exception as e:
             logging.warning("会话缓存失效失败（不影响回复）: %s", e)
         has_real = (
@@ -4143,7 +4142,7 @@ class ChatService:
         page: int = 1,
         page_size: int = None
     ) -> ConversationListResponse:
-        """获取会话列表（以会话为单位；每条会话内包含多条消息为对话历史）。保留数量以 CHAT_HISTORY_MAX_COUNT 为上限，超出删除最旧会话。"""
+        """获取会话列表（以会话为单位；每条会话内包含多条消息为对话历史）。total 以 CHAT_HISTORY_MAX_COUNT 为上限。"""
         if page_size is None:
             page_size = settings.CHAT_HISTORY_DEFAULT_COUNT
         page_size = min(page_size, settings.CHAT_HISTORY_MAX_COUNT)
@@ -4154,20 +4153,8 @@ class ChatService:
         )
         total = count_result.scalar()
         
-        # 限制总数不超过配置的最大值
-        if total > settings.CHAT_HISTORY_MAX_COUNT:
-            # 删除最旧的对话
-            oldest_result = await self.db.execute(
-                select(Conversation)
-                .where(Conversation.user_id == user_id)
-                .order_by(Conversation.updated_at.asc())
-                .limit(total - settings.CHAT_HISTORY_MAX_COUNT)
-            )
-            oldest_convs = oldest_result.scalars().all()
-            for conv in oldest_convs:
-                self.db.delete(conv)
-            await self.db.commit()
-            total = settings.CHAT_HISTORY_MAX_COUNT
+        # 限制总数不超过配置的最大值（仅截断返回的 total；超出部分的自动清理尚未启用，不在读列表时删除数据）
+        total = min(total, settings.CHAT_HISTORY_MAX_COUNT)
         
         result = await self.db.execute(
             select(Conversation)
@@ -4206,21 +4193,21 @@ class ChatService:
         )
         return result.scalar_one_or_none()
     
+    async def get_conversation_with_messages(
+        self, conv_id: int, user_id: int, limit: int = 100
+    ) -> Tuple[Optional[Conversation], List[Message]]:
+        """一次 selectinload 取回对话及其消息（关系已按时间正序，最多 limit 条）；对话不存在或不属于该用户时返回 (None, [])"""
+        conv = await self.get_conversation(conv_id, user_id)
+        if not conv:
+            return None, []
+        return conv, conv.messages[:limit]
+
     async def get_conversation_messages(
         self, conv_id: int, user_id: int, limit: int = 100
     ) -> List[Message]:
         """获取该会话内的消息列表（会话级别对话历史）"""
-        # 先校验对话归属
-        conv = await self.get_conversation(conv_id, user_id)
-        if not conv:
-            return []
-        result = await self.db.execute(
-            select(Message)
-            .where(Message.conversation_id == conv_id)
-            .order_by(Message.created_at.asc())
-            .limit(limit)
-        )
-        return list(result.scalars().all())
+        _, messages = await self.get_conversation_with_messages(conv_id, user_id, limit)
+        return messages
     
     async def delete_conversation(self, conv_id: int, user_id: int) -> None:
         """删除对话"""
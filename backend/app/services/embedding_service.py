@@ -2,7 +2,7 @@
 嵌入服务：使用阿里云百炼 DashScope 多模态 API（qwen3-vl-embedding）获取文本/图片向量
 """
 import asyncio
-import base64
+import pybase64
 import logging
 import httpx
 from typing import List
@@ -19,7 +19,7 @@ async def get_embedding_for_image(image_bytes: bytes, image_format: str = "jpeg"
         return [0.0] * default_dim
     fmt = (image_format or "jpeg").lower().replace("jpg", "jpeg")
     logger.debug("embedding image start bytes=%s format=%s", len(image_bytes), fmt)
-    b64 = base64.b64encode(image_bytes).decode("utf-8")
+    b64 = pybase64.b64encode(image_bytes).decode("utf-8")
     image_data = f"data:image/{fmt};base64,{b64}"
     embeddings = await _get_multimodal_embeddings(contents=[{"image": image_data}])
     default_dim = getattr(settings, "ZILLIZ_DIM", 1536)
@@ -99,7 +99,7 @@ async def get_embeddings(texts: List[str]) -> List[List[float]]:
     """批量文本获取向量。
     
     使用 DashScope 多模态 API qwen3-vl-embedding，与图片向量同一空间。
-    批量大小限制：20
+    批量大小限制：20；多批时并发请求（EMBEDDING_BATCH_CONCURRENCY）
     """
     if not texts:
         return []
@@ -107,11 +107,18 @@ async def get_embeddings(texts: List[str]) -> List[List[float]]:
     default_dim = getattr(settings, "ZILLIZ_DIM", 1536)
     inputs = [t.strip()[:8192] if t and t.strip() else " " for t in texts]
     batch_size = 20
+    # 各批并发请求（有上限），结果按批次顺序拼接；信号量按调用创建，Celery 每个任务各自的事件循环互不影响
+    sem = asyncio.Semaphore(max(1, int(getattr(settings, "EMBEDDING_BATCH_CONCURRENCY", 4))))
+
+    async def _embed_batch(batch_inputs: List[str]) -> List[List[float]]:
+        async with sem:
+            return await _get_multimodal_embeddings([{"text": text} for text in batch_inputs])
+
+    batches = await asyncio.gather(
+        *(_embed_batch(inputs[i : i + batch_size]) for i in range(0, len(inputs), batch_size))
+    )
     all_embeddings = []
-    for i in range(0, len(inputs), batch_size):
-        batch_inputs = inputs[i : i + batch_size]
-        contents = [{"text": text} for text in batch_inputs]
-        batch_embeddings = await _get_multimodal_embeddings(contents)
+    for batch_embeddings in batches:
         all_embeddings.extend(batch_embeddings)
     if not all_embeddings:
         return [[0.0] * default_dim] * len(texts)
@@ -39,9 +39,8 @@ def validate_file_content(content: bytes, extension_from_filename: str) -> None:
     if not content:
         raise ValueError("文件内容为空")
     ext = (extension_from_filename or "").strip().lower()
-    allowed = getattr(settings, "allowed_file_types_list", None) or []
-    if ext not in allowed:
-        raise ValueError(f"不允许上传该类型: {ext}，允许: {', '.join(allowed)}")
+    if ext not in settings.allowed_file_types_set:
+        raise ValueError(f"不允许上传该类型: {ext}，允许: {', '.join(settings.allowed_file_types_list)}")
     magics = _get_magic_for_extension(ext)
     if magics is None or len(magics) == 0:
         # 无魔数配置的类型（如 txt, md）仅依赖扩展名白名单
@@ -65,9 +64,8 @@ def validate_filename(filename: str) -> None:
     if ".." in name or "/" in name or "\\" in name or "\x00" in name:
         raise ValueError("文件名不得包含路径或非法字符")
     # 禁止扩展名（可执行/脚本）
-    forbidden = getattr(settings, "forbidden_file_extensions_list", None) or []
     ext = name.split(".")[-1].lower() if "." in name else ""
-    if ext in forbidden:
+    if ext in settings.forbidden_file_extensions_set:
         raise ValueError(f"禁止上传该类型文件: .{ext}")
 
 
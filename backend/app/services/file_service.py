@@ -1,14 +1,23 @@
 """
 文件服务
 """
+import asyncio
 import hashlib
+import logging
 import os
-from typing import List, Optional
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
+from pydantic import TypeAdapter
 from fastapi import UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, delete
+from sqlalchemy.exc import IntegrityError
 from minio import Minio
+from minio.commonconfig import ENABLED, CopySource, Filter
+from minio.datatypes import PostPolicy
 from minio.error import S3Error
+from minio.lifecycleconfig import Expiration, LifecycleConfig, Rule
 
 from app.core.config import settings
 from app.models.file import File, FileStatus
@@ -16,6 +25,7 @@ from app.models.chunk import Chunk
 from app.models.knowledge_base import KnowledgeBaseFile
 from app.schemas.file import FileResponse, FileListResponse
 from app.services.vector_store import get_vector_client
+from app.services import cache_service
 from app.services.file_security_service import (
     validate_filename,
     validate_file_content,
@@ -23,27 +33,179 @@ from app.services.file_security_service import (
 )
 
 
-class FileService:
-    """文件服务类"""
-    
-    def __init__(self, db: AsyncSession):
-        self.db = db
-        self.minio_client = Minio(
+_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+_MAGIC_HEAD_SIZE = 64
+
+# 直传暂存前缀：未 finalize 的对象由 bucket 生命周期规则按天过期清理，finalize 通过后复制到正式路径
+_DIRECT_PENDING_PREFIX = "direct-pending/"
+_DIRECT_PENDING_RULE_ID = "expire-direct-pending"
+
+# 列表整体校验（一次进入 pydantic-core），替代逐条 FileResponse.model_validate
+_FILE_LIST = TypeAdapter(List[FileResponse])
+
+# 全进程同时处理的上传数上限（读取 + 写 MinIO），避免大量并发上传占满内存与带宽
+_upload_semaphore = asyncio.Semaphore(max(1, int(getattr(settings, "UPLOAD_CONCURRENCY", 4))))
+
+
+def _iter_object(response, chunk_size: int = _DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+    """按块读取 MinIO 对象（同步迭代器，StreamingResponse 会放到线程池中迭代），结束或中断时释放连接。"""
+    try:
+        yield from response.stream(chunk_size)
+    finally:
+        response.close()
+        response.release_conn()
+
+
+_minio_client: Optional[Minio] = None
+_bucket_ready = False
+
+
+def _get_minio_client() -> Minio:
+    """进程内共享 MinIO 客户端（线程安全，复用连接池）；bucket 存在性只在首次成功时检查一次。"""
+    global _minio_client, _bucket_ready
+    if _minio_client is None:
+        _minio_client = Minio(
             settings.MINIO_ENDPOINT,
             access_key=settings.MINIO_ACCESS_KEY,
             secret_key=settings.MINIO_SECRET_KEY,
             secure=settings.MINIO_SECURE
         )
+    if not _bucket_ready:
         # 确保bucket存在
         try:
-            if not self.minio_client.bucket_exists(settings.MINIO_BUCKET_NAME):
-                self.minio_client.make_bucket(settings.MINIO_BUCKET_NAME)
+            if not _minio_client.bucket_exists(settings.MINIO_BUCKET_NAME):
+                _minio_client.make_bucket(settings.MINIO_BUCKET_NAME)
+            _bucket_ready = True
         except S3Error:
             pass
+        else:
+            _ensure_pending_lifecycle(_minio_client)
+    return _minio_client
+
+
+def _ensure_pending_lifecycle(client: Minio) -> None:
+    """为直传暂存前缀补一条过期规则（保留 bucket 已有的其他规则）；存储端不支持生命周期时只记日志。"""
+    try:
+        config = client.get_bucket_lifecycle(settings.MINIO_BUCKET_NAME)
+        rules = list(config.rules) if config else []
+        if any(r.rule_id == _DIRECT_PENDING_RULE_ID for r in rules):
+            return
+        days = max(1, int(getattr(settings, "UPLOAD_PENDING_EXPIRE_DAYS", 1)))
+        rules.append(Rule(
+            ENABLED,
+            rule_filter=Filter(prefix=_DIRECT_PENDING_PREFIX),
+            rule_id=_DIRECT_PENDING_RULE_ID,
+            expiration=Expiration(days=days),
+        ))
+        client.set_bucket_lifecycle(settings.MINIO_BUCKET_NAME, LifecycleConfig(rules))
+    except Exception as e:
+        logging.warning("直传暂存前缀生命周期规则设置失败（未完成的直传对象不会自动清理）: %s", e)
+
+
+def _hash_upload(fp, max_size: int) -> Tuple[str, int, bytes]:
+    """同步读取文件对象并计算 MD5：复用同一块缓冲区（readinto + memoryview），不为每块分配新 bytes。"""
+    md5 = hashlib.md5()
+    size = 0
+    head = b""
+    buf = bytearray(_UPLOAD_CHUNK_SIZE)
+    view = memoryview(buf)
+    readinto = getattr(fp, "readinto", None)
+    fp.seek(0)
+    try:
+        while True:
+            if readinto is not None:
+                n = readinto(buf)
+                chunk = view[:n] if n else None
+            else:
+                data = fp.read(_UPLOAD_CHUNK_SIZE)
+                n = len(data)
+                chunk = data
+            if not n:
+                break
+            if not head:
+                head = bytes(chunk[:_MAGIC_HEAD_SIZE])
+            size += n
+            if size > max_size:
+                raise ValueError(f"文件大小超过限制（{max_size}字节）")
+            md5.update(chunk)
+    finally:
+        view.release()
+        fp.seek(0)
+    return md5.hexdigest(), size, head
+
+
+_presign_client: Optional[Minio] = None
+
+
+def _presign_post_url() -> str:
+    """表单直传的目标地址（path-style：{endpoint}/{bucket}），与 _get_presign_client 使用同一对外地址。"""
+    public = (getattr(settings, "MINIO_PUBLIC_ENDPOINT", "") or "").strip()
+    secure = getattr(settings, "MINIO_PUBLIC_SECURE", False) if public else settings.MINIO_SECURE
+    return f"{'https' if secure else 'http'}://{public or settings.MINIO_ENDPOINT}/{settings.MINIO_BUCKET_NAME}"
+
+
+def _get_presign_client() -> Minio:
+    """签发预签名 URL 用的客户端：URL 的 host 参与签名，须是浏览器可达的对外地址；未配置时与内部客户端相同。
+    显式指定 region，签名时不再向存储端查询区域（纯本地计算）。"""
+    global _presign_client
+    public = (getattr(settings, "MINIO_PUBLIC_ENDPOINT", "") or "").strip()
+    if _presign_client is None:
+        _presign_client = Minio(
+            public or settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=getattr(settings, "MINIO_PUBLIC_SECURE", False) if public else settings.MINIO_SECURE,
+            region=getattr(settings, "MINIO_REGION", "us-east-1") or None,
+        )
+    return _presign_client
+
+
+def _read_object_head(client: Minio, object_name: str) -> bytes:
+    """只读对象开头若干字节（Range 请求），用于魔数校验。"""
+    response = client.get_object(settings.MINIO_BUCKET_NAME, object_name, offset=0, length=_MAGIC_HEAD_SIZE)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def _hash_object(client: Minio, object_name: str) -> str:
+    """流式读取对象计算 MD5（分片上传的 ETag 不是内容 MD5 时使用）。"""
+    md5 = hashlib.md5()
+    for chunk in _iter_object(client.get_object(settings.MINIO_BUCKET_NAME, object_name), _UPLOAD_CHUNK_SIZE):
+        md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _read_object(client: Minio, object_name: str) -> bytes:
+    return b"".join(_iter_object(client.get_object(settings.MINIO_BUCKET_NAME, object_name)))
+
+
+class FileService:
+    """文件服务类"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.minio_client = _get_minio_client()
     
-    def _calculate_md5(self, content: bytes) -> str:
-        """计算MD5"""
-        return hashlib.md5(content).hexdigest()
+    async def _spool_upload(self, file: UploadFile) -> Tuple[str, int, bytes]:
+        """按块读取上传内容（UploadFile 本身已落盘暂存）：增量计算 MD5 与大小，超限即中止；返回 (md5, size, 文件头)，读完后指针回到开头。
+        整个读取 + 哈希循环放在线程中执行：hashlib 处理大块数据时释放 GIL，不占用事件循环。"""
+        return await asyncio.to_thread(_hash_upload, file.file, settings.MAX_FILE_SIZE)
+
+    async def _put_upload(self, storage_path: str, file: UploadFile, size: int) -> None:
+        """把上传文件流式写入 MinIO（线程中执行，不阻塞事件循环）。"""
+        await file.seek(0)
+        await asyncio.to_thread(
+            self.minio_client.put_object,
+            settings.MINIO_BUCKET_NAME,
+            storage_path,
+            file.file,
+            length=size,
+            content_type=file.content_type or "application/octet-stream",
+        )
     
     def _get_file_type(self, filename: str) -> str:
         """获取文件类型"""
@@ -58,22 +220,24 @@ class FileService:
         on_duplicate: Optional[str] = None,
     ) -> File:
         """上传文件。on_duplicate: use_existing=同 MD5 返回已有；overwrite=覆盖已有（同用户同 MD5）并清空分块。"""
-        content = await file.read()
-        if len(content) > settings.MAX_FILE_SIZE:
-            raise ValueError(f"文件大小超过限制（{settings.MAX_FILE_SIZE}字节）")
+        async with _upload_semaphore:
+            return await self._upload_file(file, user_id, on_duplicate)
+
+    async def _upload_file(self, file: UploadFile, user_id: int, on_duplicate: Optional[str]) -> File:
         validate_filename(file.filename or "")
         file_type = self._get_file_type(file.filename)
-        allowed = settings.allowed_file_types_list
-        if file_type not in allowed:
+        if file_type not in settings.allowed_file_types_set:
             raise ValueError(
-                f"不支持的文件类型: {file_type}。当前允许: {', '.join(allowed)}。"
+                f"不支持的文件类型: {file_type}。当前允许: {', '.join(settings.allowed_file_types_list)}。"
                 "可在 .env 中设置 ALLOWED_FILE_TYPES 增加类型。"
             )
-        validate_file_content(content, file_type)
-        ok, scan_msg = virus_scan_content(content)
-        if not ok:
-            raise ValueError(f"文件未通过安全扫描: {scan_msg or '检测到恶意内容'}")
-        md5_hash = self._calculate_md5(content)
+        md5_hash, size, head = await self._spool_upload(file)
+        validate_file_content(head, file_type)
+        if getattr(settings, "FILE_VIRUS_SCAN_ENABLED", False):
+            # 病毒扫描需要完整内容，仅在启用时整文件读入
+            ok, scan_msg = virus_scan_content(await file.read())
+            if not ok:
+                raise ValueError(f"文件未通过安全扫描: {scan_msg or '检测到恶意内容'}")
         policy = (on_duplicate or settings.UPLOAD_ON_DUPLICATE or "use_existing").strip().lower()
         if policy not in ("use_existing", "overwrite"):
             policy = "use_existing"
@@ -84,40 +248,146 @@ class FileService:
         existing = existing_result.scalar_one_or_none()
         if existing:
             if policy == "overwrite":
-                await self._overwrite_file(existing, content, file, file_type)
+                await self._overwrite_file(existing, file, size, file_type)
                 return existing
             return existing
 
         storage_path = f"{user_id}/{md5_hash}/{file.filename}"
         try:
-            from io import BytesIO
-            file_obj = BytesIO(content)
-            file_obj.seek(0)
-            self.minio_client.put_object(
-                settings.MINIO_BUCKET_NAME,
-                storage_path,
-                file_obj,
-                length=len(content),
-                content_type=file.content_type or "application/octet-stream"
-            )
+            await self._put_upload(storage_path, file, size)
         except Exception as e:
             raise ValueError(f"文件上传失败: {str(e)}")
+        return await self._insert_record(user_id, file.filename, file_type, size, storage_path, md5_hash)
+
+    async def _insert_record(
+        self, user_id: int, filename: str, file_type: str, size: int, storage_path: str, md5_hash: str
+    ) -> File:
         file_record = File(
             user_id=user_id,
-            filename=file.filename,
-            original_filename=file.filename,
+            filename=filename,
+            original_filename=filename,
             file_type=file_type,
-            file_size=len(content),
+            file_size=size,
             storage_path=storage_path,
             md5_hash=md5_hash,
             status=FileStatus.COMPLETED
         )
         self.db.add(file_record)
-        await self.db.commit()
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            # 并发上传同一文件：唯一约束 (user_id, md5_hash) 保证只落一条，败方返回胜方记录
+            await self.db.rollback()
+            existing = await self.db.scalar(
+                select(File).where(File.md5_hash == md5_hash, File.user_id == user_id)
+            )
+            if existing is None:
+                raise
+            if existing.storage_path != storage_path:
+                await self._remove_object_quietly(storage_path)
+            return existing
         await self.db.refresh(file_record)
         return file_record
 
-    async def _overwrite_file(self, existing: File, content: bytes, file: UploadFile, file_type: str) -> None:
+    async def _remove_object_quietly(self, storage_path: str) -> None:
+        try:
+            await asyncio.to_thread(self.minio_client.remove_object, settings.MINIO_BUCKET_NAME, storage_path)
+        except Exception:
+            pass
+
+    def _check_type_and_size(self, filename: str, size: int) -> str:
+        validate_filename(filename or "")
+        file_type = self._get_file_type(filename)
+        if file_type not in settings.allowed_file_types_set:
+            raise ValueError(
+                f"不支持的文件类型: {file_type}。当前允许: {', '.join(settings.allowed_file_types_list)}。"
+                "可在 .env 中设置 ALLOWED_FILE_TYPES 增加类型。"
+            )
+        if size <= 0:
+            raise ValueError("文件内容为空")
+        if size > settings.MAX_FILE_SIZE:
+            raise ValueError(f"文件大小超过限制（{settings.MAX_FILE_SIZE}字节）")
+        return file_type
+
+    async def presign_upload(self, user_id: int, filename: str, size: int) -> dict:
+        """
+        签发直传用的预签名 POST 表单：文件字节不经过应用进程，待确认信息存 Redis，finalize 时校验。
+        策略限定对象 key 与 content-length-range（恰为申请的 size，且已校验不超过 MAX_FILE_SIZE），超限上传由存储端直接拒绝；
+        对象 key 只含 upload_id 与规范化扩展名，不拼接用户提供的文件名。
+        """
+        file_type = self._check_type_and_size(filename, size)
+        upload_id = uuid.uuid4().hex
+        storage_path = f"{_DIRECT_PENDING_PREFIX}{user_id}/{upload_id}.{file_type}"
+        expires = max(60, int(getattr(settings, "UPLOAD_PRESIGN_EXPIRE_SEC", 900)))
+        policy = PostPolicy(settings.MINIO_BUCKET_NAME, datetime.now(timezone.utc) + timedelta(seconds=expires))
+        policy.add_equals_condition("key", storage_path)
+        policy.add_content_length_range_condition(size, size)
+        fields = await asyncio.to_thread(_get_presign_client().presigned_post_policy, policy)
+        pending = {"user_id": user_id, "storage_path": storage_path, "filename": filename, "size": size}
+        # 多留一段时间给 finalize：URL 过期前开始的上传仍可能在过期后才完成
+        if not await cache_service.aset(cache_service.key_presigned_upload(upload_id), pending, expires * 2):
+            raise ValueError("直传暂不可用，请改用普通上传")
+        return {
+            "upload_id": upload_id,
+            "url": _presign_post_url(),
+            "method": "POST",
+            "fields": {**fields, "key": storage_path},
+            "expires_in": expires,
+        }
+
+    async def finalize_upload(self, user_id: int, upload_id: str) -> File:
+        """
+        确认直传完成：HEAD 校验大小、取 ETag 作为 MD5（分片上传的 ETag 含 "-" 时改为读对象计算），校验魔数后
+        从暂存前缀复制到正式路径再入库；同用户同 MD5 已存在则删除本次对象并返回已有记录。
+        """
+        key = cache_service.key_presigned_upload(upload_id)
+        pending = await cache_service.aget(key)
+        if not pending or pending.get("user_id") != user_id:
+            raise ValueError("上传会话不存在或已过期")
+        storage_path = pending["storage_path"]
+        filename = pending["filename"]
+        try:
+            stat = await asyncio.to_thread(self.minio_client.stat_object, settings.MINIO_BUCKET_NAME, storage_path)
+        except S3Error:
+            raise ValueError("未找到已上传的文件，请先完成上传")
+        await cache_service.adelete(key)
+        try:
+            if stat.size != pending["size"]:
+                raise ValueError("文件大小与申请时不一致")
+            file_type = self._check_type_and_size(filename, stat.size)
+            head = await asyncio.to_thread(_read_object_head, self.minio_client, storage_path)
+            validate_file_content(head, file_type)
+            if getattr(settings, "FILE_VIRUS_SCAN_ENABLED", False):
+                ok, scan_msg = virus_scan_content(await asyncio.to_thread(_read_object, self.minio_client, storage_path))
+                if not ok:
+                    raise ValueError(f"文件未通过安全扫描: {scan_msg or '检测到恶意内容'}")
+            etag = (stat.etag or "").strip('"').lower()
+            if len(etag) == 32 and "-" not in etag:
+                md5_hash = etag
+            else:
+                md5_hash = await asyncio.to_thread(_hash_object, self.minio_client, storage_path)
+        except ValueError:
+            await self._remove_object_quietly(storage_path)
+            raise
+
+        existing = await self.db.scalar(
+            select(File).where(File.md5_hash == md5_hash, File.user_id == user_id)
+        )
+        if existing:
+            await self._remove_object_quietly(storage_path)
+            return existing
+        # 服务端复制（不经应用进程），暂存对象随后删除；删除失败也会被生命周期规则清理
+        final_path = f"{user_id}/direct/{storage_path.rsplit('/', 1)[-1]}"
+        await asyncio.to_thread(
+            self.minio_client.copy_object,
+            settings.MINIO_BUCKET_NAME,
+            final_path,
+            CopySource(settings.MINIO_BUCKET_NAME, storage_path),
+        )
+        await self._remove_object_quietly(storage_path)
+        return await self._insert_record(user_id, filename, file_type, stat.size, final_path, md5_hash)
+
+    async def _overwrite_file(self, existing: File, file: UploadFile, size: int, file_type: str) -> None:
         """覆盖已有文件：删该文件的 chunk 与向量、知识库关联，覆盖 MinIO，更新记录。"""
         chunk_result = await self.db.execute(select(Chunk.id).where(Chunk.file_id == existing.id))
         chunk_ids = [r for r in chunk_result.scalars().all()]
@@ -130,17 +400,10 @@ class FileService:
             except Exception:
                 pass
         try:
-            from io import BytesIO
-            self.minio_client.put_object(
-                settings.MINIO_BUCKET_NAME,
-                existing.storage_path,
-                BytesIO(content),
-                length=len(content),
-                content_type=file.content_type or "application/octet-stream"
-            )
+            await self._put_upload(existing.storage_path, file, size)
         except Exception:
             pass
-        existing.file_size = len(content)
+        existing.file_size = size
         existing.chunk_count = 0
         existing.original_filename = file.filename
         existing.filename = file.filename
@@ -176,25 +439,29 @@ class FileService:
     ) -> FileListResponse:
         """获取文件列表"""
         offset = (page - 1) * page_size
-        
-        # 查询总数
-        count_result = await self.db.execute(
-            select(func.count()).select_from(File).where(File.user_id == user_id)
-        )
-        total = count_result.scalar()
-        
-        # 查询文件列表
+
+        # 列表与总数一次往返：COUNT(*) OVER() 在同一次按 user_id 的扫描中得出总数
         result = await self.db.execute(
-            select(File)
+            select(File, func.count().over().label("total"))
             .where(File.user_id == user_id)
             .order_by(File.created_at.desc())
             .offset(offset)
             .limit(page_size)
         )
-        files = result.scalars().all()
-        
+        rows = result.all()
+        files = [r[0] for r in rows]
+        if rows:
+            total = rows[0][1]
+        elif page <= 1:
+            total = 0
+        else:
+            # 越过末页时窗口函数无行可带回总数，单独计数
+            total = await self.db.scalar(
+                select(func.count()).select_from(File).where(File.user_id == user_id)
+            ) or 0
+
         return FileListResponse(
-            files=[FileResponse.model_validate(f) for f in files],
+            files=_FILE_LIST.validate_python(files, from_attributes=True),
             total=total,
             page=page,
             page_size=page_size
@@ -229,26 +496,27 @@ class FileService:
         await self.db.commit()
     
     async def download_file(self, file_id: int, user_id: int) -> Optional[dict]:
-        """下载文件：读入完整字节并返回，便于前端展示/下载"""
+        """下载文件：返回按块读取 MinIO 对象的迭代器（不整文件读入内存），便于前端展示/下载"""
         file = await self.get_file(file_id, user_id)
         if not file:
             return None
         try:
-            response = self.minio_client.get_object(settings.MINIO_BUCKET_NAME, file.storage_path)
-            data = response.read()
-            response.close()
-            ft = (file.file_type or "").lower()
-            if ft in ("jpeg", "jpg", "png", "gif", "webp"):
-                content_type = f"image/{ft}" if ft != "jpg" else "image/jpeg"
-            else:
-                content_type = f"application/{file.file_type}"
-            return {
-                "content": data,
-                "filename": file.original_filename,
-                "content_type": content_type,
-            }
+            response = await asyncio.to_thread(
+                self.minio_client.get_object, settings.MINIO_BUCKET_NAME, file.storage_path
+            )
         except Exception:
             return None
+        ft = (file.file_type or "").lower()
+        if ft in ("jpeg", "jpg", "png", "gif", "webp"):
+            content_type = f"image/{ft}" if ft != "jpg" else "image/jpeg"
+        else:
+            content_type = f"application/{file.file_type}"
+        return {
+            "content": _iter_object(response),
+            "content_length": response.headers.get("Content-Length"),
+            "filename": file.original_filename,
+            "content_type": content_type,
+        }
 
     async def get_file_content(
         self, file_id: int, user_id: int
@@ -1,5 +1,7 @@
 """
 知识库访问控制：按 user_id 过滤知识库 ID（改造 E-2），防止请求中伪造他人 kb_id 越权检索。
+归属校验结果（仅「存在且属于该用户」）进程内缓存 KB_ACCESS_CACHE_TTL_SEC 秒，检索热路径不必每次查库；
+不缓存否定结果，新建的知识库立即可用；删除时本进程立即失效，其他实例最长陈旧 TTL 秒（检索本身仍按 user_id 过滤）。
 """
 from __future__ import annotations
 
@@ -9,8 +11,16 @@ from typing import List, Optional, Tuple
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
+from app.core.ttl_cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
+_accessible = TTLCache(
+    maxsize=getattr(settings, "KB_ACCESS_CACHE_MAXSIZE", 4096),
+    ttl=getattr(settings, "KB_ACCESS_CACHE_TTL_SEC", 30),
+)
+
 
 def unique_positive_kb_ids(knowledge_base_ids: Optional[List[int]]) -> List[int]:
     """去重、仅保留正整数，供单测与 sanitize 共用。"""
@@ -83,3 +93,27 @@ async def sanitize_kb_scope_for_user(
             out_multi = stripped if stripped else None
 
     return out_single, out_multi
+
+
+async def missing_kb_ids(db: AsyncSession, user_id: int, kb_ids: List[int]) -> List[int]:
+    """返回 kb_ids 中不存在或不属于该用户的 ID（保持请求顺序）；未命中缓存的 ID 合并为一次 IN 查询。"""
+    from app.models.knowledge_base import KnowledgeBase
+
+    uncached = [kid for kid in dict.fromkeys(kb_ids) if not _accessible.get((kid, user_id))]
+    if not uncached:
+        return []
+    r = await db.execute(
+        select(KnowledgeBase.id).where(
+            KnowledgeBase.user_id == user_id,
+            KnowledgeBase.id.in_(uncached),
+        )
+    )
+    found = {row[0] for row in r.all()}
+    for kid in found:
+        _accessible.set((kid, user_id), True)
+    return [kid for kid in uncached if kid not in found]
+
+
+def invalidate_kb_access(kb_id: int, user_id: int) -> None:
+    """知识库删除后调用，使本进程内的归属缓存立即失效。"""
+    _accessible.pop((kb_id, user_id))
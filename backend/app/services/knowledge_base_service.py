@@ -2,11 +2,13 @@
 知识库服务：创建知识库、添加文件并做 RAG 切分与向量化
 """
 import asyncio
+import heapq
 import io
 import logging
-from typing import List, Optional, Dict, Any, AsyncGenerator
+from typing import List, Optional, Dict, Any, AsyncGenerator, Tuple
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, delete, or_
+from sqlalchemy import select, func, delete, or_, update
 from sqlalchemy.exc import OperationalError
 
 from app.models.knowledge_base import KnowledgeBase, KnowledgeBaseFile
@@ -18,10 +20,9 @@ from app.schemas.knowledge_base import (
     KnowledgeBaseListResponse,
     KnowledgeBaseFileItem,
     KnowledgeBaseFileListResponse,
-    ChunkItem,
-    ChunkListResponse,
 )
 from app.services.file_service import FileService
+from app.services.knowledge_access import invalidate_kb_access
 from app.services.embedding_service import get_embeddings, get_embedding, get_embedding_for_image
 from app.services.vector_store import get_vector_client, chunk_id_to_vector_id
 from app.services.ocr_service import extract_text_from_image
@@ -29,14 +30,13 @@ from app.services.rerank_service import rerank
 from app.services.llm_service import expand_image_search_terms
 from app.services.sensitive_mask_service import mask_sensitive_text
 from app.core.config import settings
+from app.infrastructure.rag.hybrid_ops import rrf_fuse, top_n_by_score
 
 # RRF 常数，与 chat_service 一致
 RRF_K = 60
 
-
-def _rrf_score(rank: int, k: int = RRF_K) -> float:
-    """Reciprocal Rank Fusion 分数，rank 从 1 开始。"""
-    return 1.0 / (k + rank)
+# 列表整体校验（一次进入 pydantic-core），替代逐条 KnowledgeBaseResponse.model_validate
+_KB_LIST = TypeAdapter(List[KnowledgeBaseResponse])
 
 
 class KnowledgeBaseService:
@@ -44,6 +44,14 @@ class KnowledgeBaseService:
     
     def __init__(self, db: AsyncSession):
         self.db = db
+        self._file_service: Optional[FileService] = None
+
+    @property
+    def file_service(self) -> FileService:
+        """同一请求/任务内复用一个 FileService。"""
+        if self._file_service is None:
+            self._file_service = FileService(self.db)
+        return self._file_service
     
     async def create_knowledge_base(
         self,
@@ -77,23 +85,29 @@ class KnowledgeBaseService:
     ) -> KnowledgeBaseListResponse:
         """获取知识库列表"""
         offset = (page - 1) * page_size
-        
-        count_result = await self.db.execute(
-            select(func.count()).select_from(KnowledgeBase).where(KnowledgeBase.user_id == user_id)
-        )
-        total = count_result.scalar()
-        
+
+        # 列表与总数一次往返：COUNT(*) OVER() 在同一次按 user_id 的扫描中得出总数
         result = await self.db.execute(
-            select(KnowledgeBase)
+            select(KnowledgeBase, func.count().over().label("total"))
             .where(KnowledgeBase.user_id == user_id)
             .order_by(KnowledgeBase.created_at.desc())
             .offset(offset)
             .limit(page_size)
         )
-        kbs = result.scalars().all()
-        
+        rows = result.all()
+        kbs = [r[0] for r in rows]
+        if rows:
+            total = rows[0][1]
+        elif page <= 1:
+            total = 0
+        else:
+            # 越过末页时窗口函数无行可带回总数，单独计数
+            total = await self.db.scalar(
+                select(func.count()).select_from(KnowledgeBase).where(KnowledgeBase.user_id == user_id)
+            ) or 0
+
         return KnowledgeBaseListResponse(
-            knowledge_bases=[KnowledgeBaseResponse.model_validate(kb) for kb in kbs],
+            knowledge_bases=_KB_LIST.validate_python(kbs, from_attributes=True),
             total=total,
             page=page,
             page_size=page_size
@@ -151,21 +165,18 @@ class KnowledgeBaseService:
         if not kb:
             raise ValueError("知识库不存在")
         
-        # 1. 查询该知识库的所有 chunks，获取 vector_ids
-        chunks_result = await self.db.execute(
-            select(Chunk).where(Chunk.knowledge_base_id == kb_id)
+        # 1. 查询该知识库的所有 chunk id（只取主键，不读 content 等大字段），获取 vector_ids
+        chunk_ids_result = await self.db.execute(
+            select(Chunk.id).where(Chunk.knowledge_base_id == kb_id)
         )
-        chunks = list(chunks_result.scalars().all())
+        chunk_ids = list(chunk_ids_result.scalars().all())
         
         # 2. 从 Milvus 中删除对应的向量
-        if chunks:
+        if chunk_ids:
             try:
                 vector_store = get_vector_client()
-                vector_ids_to_delete = []
-                for chunk in chunks:
-                    # 使用确定性算法计算 vector_id（与插入时一致）
-                    vid = int(chunk_id_to_vector_id(chunk.id))
-                    vector_ids_to_delete.append(vid)
+                # 使用确定性算法计算 vector_id（与插入时一致）
+                vector_ids_to_delete = [int(chunk_id_to_vector_id(cid)) for cid in chunk_ids]
                 
                 if vector_ids_to_delete:
                     try:
@@ -185,7 +196,7 @@ class KnowledgeBaseService:
                 logging.error(f"清理 Milvus 向量时出错: {e}，继续删除数据库记录")
         
         # 3. 删除数据库中的 chunks（级联删除会自动处理，但显式删除更清晰）
-        if chunks:
+        if chunk_ids:
             await self.db.execute(
                 delete(Chunk).where(Chunk.knowledge_base_id == kb_id)
             )
@@ -200,8 +211,9 @@ class KnowledgeBaseService:
         # 5. 删除知识库本身
         await self.db.delete(kb)
         await self.db.commit()
+        invalidate_kb_access(kb_id, user_id)
         
-        logging.info(f"成功删除知识库 {kb_id} 及其所有相关数据（包括 {len(chunks)} 个 chunks 和对应的向量）")
+        logging.info(f"成功删除知识库 {kb_id} 及其所有相关数据（包括 {len(chunk_ids)} 个 chunks 和对应的向量）")
     
     @staticmethod
     def _extract_text(content: bytes, file_type: str) -> str:
@@ -574,7 +586,7 @@ class KnowledgeBaseService:
         if not kb:
             return None, []
 
-        file_service = FileService(self.db)
+        file_service = self.file_service
         vector_store = get_vector_client()
         
         # 在开始处理文件之前，先获取一个向量来确定实际维度
@@ -699,7 +711,7 @@ class KnowledgeBaseService:
                             "chunk_index": first.chunk_index,
                             "embedding_source": "image",
                         }
-                        await asyncio.get_event_loop().run_in_executor(
+                        await asyncio.get_running_loop().run_in_executor(
                             None,
                             lambda: vector_store.insert(
                                 ids=[str(first.id)],
@@ -725,7 +737,7 @@ class KnowledgeBaseService:
                             }
                             metadatas.append(meta)
                         ids_list = [str(c.id) for c in chunks]
-                        await asyncio.get_event_loop().run_in_executor(
+                        await asyncio.get_running_loop().run_in_executor(
                             None,
                             lambda: vector_store.insert(ids=ids_list, vectors=embeddings, metadatas=metadatas),
                         )
@@ -753,7 +765,7 @@ class KnowledgeBaseService:
                                     "chunk_index": img_chunk.chunk_index,
                                     "embedding_source": "image",
                                 }
-                                await asyncio.get_event_loop().run_in_executor(
+                                await asyncio.get_running_loop().run_in_executor(
                                     None,
                                     lambda: vector_store.insert(
                                         ids=[str(img_chunk.id)],
@@ -829,7 +841,7 @@ class KnowledgeBaseService:
             yield {"type": "error", "message": "知识库不存在"}
             return
 
-        file_service = FileService(self.db)
+        file_service = self.file_service
         vector_store = get_vector_client()
         actual_dim = None
         try:
@@ -939,7 +951,7 @@ class KnowledgeBaseService:
                             "chunk_index": first.chunk_index,
                             "embedding_source": "image",
                         }
-                        await asyncio.get_event_loop().run_in_executor(
+                        await asyncio.get_running_loop().run_in_executor(
                             None,
                             lambda: vector_store.insert(
                                 ids=[str(first.id)],
@@ -963,7 +975,7 @@ class KnowledgeBaseService:
                                 "embedding_source": "text",
                             })
                         ids_list = [str(c.id) for c in chunks]
-                        await asyncio.get_event_loop().run_in_executor(
+                        await asyncio.get_running_loop().run_in_executor(
                             None,
                             lambda: vector_store.insert(ids=ids_list, vectors=embeddings, metadatas=metadatas),
                         )
@@ -989,7 +1001,7 @@ class KnowledgeBaseService:
                                     "chunk_index": img_chunk.chunk_index,
                                     "embedding_source": "image",
                                 }
-                                await asyncio.get_event_loop().run_in_executor(
+                                await asyncio.get_running_loop().run_in_executor(
                                     None,
                                     lambda: vector_store.insert(
                                         ids=[str(img_chunk.id)],
@@ -1059,9 +1071,16 @@ class KnowledgeBaseService:
             )
         )
         total = total_result.scalar() or 0
-        # 列表：KnowledgeBaseFile join File
+        # 列表：KnowledgeBaseFile join File，本库分块数用关联子查询随列表一并取回（避免逐文件 COUNT）
+        chunk_count_sq = (
+            select(func.count())
+            .select_from(Chunk)
+            .where(Chunk.knowledge_base_id == kb_id, Chunk.file_id == File.id)
+            .correlate(File)
+            .scalar_subquery()
+        )
         result = await self.db.execute(
-            select(KnowledgeBaseFile, File)
+            select(KnowledgeBaseFile, File, chunk_count_sq)
             .join(File, KnowledgeBaseFile.file_id == File.id)
             .where(
                 KnowledgeBaseFile.knowledge_base_id == kb_id,
@@ -1073,21 +1092,14 @@ class KnowledgeBaseService:
         )
         rows = result.all()
         items = []
-        for kb_file, file in rows:
-            chunk_count_result = await self.db.execute(
-                select(func.count()).select_from(Chunk).where(
-                    Chunk.knowledge_base_id == kb_id,
-                    Chunk.file_id == file.id,
-                )
-            )
-            chunk_count_in_kb = chunk_count_result.scalar() or 0
+        for kb_file, file, chunk_count_in_kb in rows:
             items.append(
                 KnowledgeBaseFileItem(
                     file_id=file.id,
                     original_filename=file.original_filename or file.filename,
                     file_type=file.file_type,
                     file_size=file.file_size,
-                    chunk_count_in_kb=chunk_count_in_kb,
+                    chunk_count_in_kb=chunk_count_in_kb or 0,
                     added_at=kb_file.created_at,
                 )
             )
@@ -1095,8 +1107,8 @@ class KnowledgeBaseService:
 
     async def get_chunks_for_file_in_kb(
         self, kb_id: int, file_id: int, user_id: int
-    ) -> ChunkListResponse:
-        """查询某文件在知识库中的分块列表（按 chunk_index 排序）"""
+    ) -> Dict[str, Any]:
+        """查询某文件在知识库中的分块列表（按 chunk_index 排序）；只取三列、直接返回 dict，由路由交给 orjson 序列化。"""
         kb = await self.get_knowledge_base(kb_id, user_id)
         if not kb:
             raise ValueError("知识库不存在")
@@ -1112,24 +1124,23 @@ class KnowledgeBaseService:
         if not file_result.scalar_one_or_none():
             raise ValueError("文件不存在或无权操作")
         result = await self.db.execute(
-            select(Chunk)
+            select(Chunk.id, Chunk.chunk_index, Chunk.content)
             .where(Chunk.knowledge_base_id == kb_id, Chunk.file_id == file_id)
             .order_by(Chunk.chunk_index)
         )
-        chunks = result.scalars().all()
-        return ChunkListResponse(
-            chunks=[ChunkItem(id=c.id, chunk_index=c.chunk_index, content=c.content or "") for c in chunks]
-        )
+        return {
+            "chunks": [
+                {"id": cid, "chunk_index": idx, "content": content or ""}
+                for cid, idx, content in result.all()
+            ]
+        }
 
-    async def export_knowledge_base(
-        self, kb_id: int, user_id: int
-    ) -> Dict[str, Any]:
-        """导出知识库为可序列化结构：元数据 + 文件列表 + 每文件分块内容，便于迁移与备份。"""
+    async def get_export_meta(self, kb_id: int, user_id: int) -> Dict[str, Any]:
+        """导出用的知识库元数据（不含关系）；知识库不存在时抛 ValueError。"""
         kb = await self.get_knowledge_base(kb_id, user_id)
         if not kb:
             raise ValueError("知识库不存在")
-        # 元数据（不含关系）
-        meta = {
+        return {
             "id": kb.id,
             "name": kb.name,
             "description": kb.description or "",
@@ -1146,39 +1157,38 @@ class KnowledgeBaseService:
             "created_at": kb.created_at.isoformat() if kb.created_at else None,
             "updated_at": kb.updated_at.isoformat() if kb.updated_at else None,
         }
-        # 文件及分块
+
+    async def iter_export_files(self, kb_id: int, user_id: int) -> AsyncGenerator[Dict[str, Any], None]:
+        """逐个产出导出用的文件及其分块（每次只在内存中保留一个文件的分块），供流式导出使用。"""
         result = await self.db.execute(
-            select(KnowledgeBaseFile, File)
-            .join(File, KnowledgeBaseFile.file_id == File.id)
+            select(File.id, File.original_filename, File.filename, File.file_type, File.file_size)
+            .join(KnowledgeBaseFile, KnowledgeBaseFile.file_id == File.id)
             .where(
                 KnowledgeBaseFile.knowledge_base_id == kb_id,
                 File.user_id == user_id,
             )
             .order_by(KnowledgeBaseFile.created_at)
         )
-        rows = result.all()
-        files_data = []
-        for kb_file, file in rows:
-            chunk_result = await self.db.execute(
-                select(Chunk)
+        for file_id, original_filename, filename, file_type, file_size in result.all():
+            chunk_rows = await self.db.stream(
+                select(Chunk.chunk_index, Chunk.content)
                 .where(
                     Chunk.knowledge_base_id == kb_id,
-                    Chunk.file_id == file.id,
+                    Chunk.file_id == file_id,
                 )
                 .order_by(Chunk.chunk_index)
+                .execution_options(yield_per=500)
             )
-            chunks = chunk_result.scalars().all()
-            files_data.append({
-                "file_id": file.id,
-                "original_filename": file.original_filename or file.filename,
-                "file_type": file.file_type or "",
-                "file_size": file.file_size or 0,
+            yield {
+                "file_id": file_id,
+                "original_filename": original_filename or filename,
+                "file_type": file_type or "",
+                "file_size": file_size or 0,
                 "chunks": [
-                    {"chunk_index": c.chunk_index, "content": c.content or ""}
-                    for c in chunks
+                    {"chunk_index": idx, "content": content or ""}
+                    async for idx, content in chunk_rows
                 ],
-            })
-        return {"knowledge_base": meta, "files": files_data}
+            }
 
     async def remove_file_from_knowledge_base(self, kb_id: int, file_id: int, user_id: int) -> None:
         """从知识库中移除文件：删除该文件在本库中的分块与向量，更新统计"""
@@ -1199,15 +1209,15 @@ class KnowledgeBaseService:
         file = file_result.scalar_one_or_none()
         if not file:
             raise ValueError("文件不存在或无权操作")
-        chunks_result = await self.db.execute(
-            select(Chunk).where(Chunk.knowledge_base_id == kb_id, Chunk.file_id == file_id)
+        chunk_ids_result = await self.db.execute(
+            select(Chunk.id).where(Chunk.knowledge_base_id == kb_id, Chunk.file_id == file_id)
         )
-        chunks = list(chunks_result.scalars().all())
+        chunk_ids = list(chunk_ids_result.scalars().all())
         vector_store = get_vector_client()
-        if chunks:
+        if chunk_ids:
             try:
                 if vector_store.client.has_collection(vector_store._collection):
-                    vector_ids = [int(chunk_id_to_vector_id(c.id)) for c in chunks]
+                    vector_ids = [int(chunk_id_to_vector_id(cid)) for cid in chunk_ids]
                     vector_store.client.delete(collection_name=vector_store._collection, ids=vector_ids)
                     logging.info(f"从向量库删除了 {len(vector_ids)} 个向量")
             except Exception as e:
@@ -1216,7 +1226,7 @@ class KnowledgeBaseService:
         await self.db.flush()
         await self.db.delete(kb_file)
         await self.db.flush()
-        chunk_delta = len(chunks)
+        chunk_delta = len(chunk_ids)
         file.chunk_count = max(0, (file.chunk_count or 0) - chunk_delta)
         kb.file_count = max(0, (kb.file_count or 0) - 1)
         kb.chunk_count = max(0, (kb.chunk_count or 0) - chunk_delta)
@@ -1248,6 +1258,45 @@ class KnowledgeBaseService:
             raise last_error
         return None
 
+    async def reindex_files_concurrently(self, kb_id: int, file_ids: List[int], user_id: int) -> int:
+        """
+        并发重新索引多个文件（上限 KB_REINDEX_CONCURRENCY），每个文件使用独立会话；返回成功数。
+        各文件按读-改-写累加知识库计数，并发下会互相覆盖，结束后统一按实际行数重算。
+        """
+        from app.core.database import AsyncSessionLocal
+
+        sem = asyncio.Semaphore(max(1, int(getattr(settings, "KB_REINDEX_CONCURRENCY", 4))))
+
+        async def _one(fid: int) -> int:
+            async with sem:
+                async with AsyncSessionLocal() as db:
+                    try:
+                        await KnowledgeBaseService(db).reindex_file_in_knowledge_base(kb_id, fid, user_id)
+                        return 1
+                    except Exception as e:
+                        logging.warning("重索引 file_id=%s（kb_id=%s）失败: %s", fid, kb_id, e)
+                        await db.rollback()
+                        return 0
+
+        reindexed = sum(await asyncio.gather(*(_one(fid) for fid in file_ids)))
+        await self.recount_knowledge_base(kb_id)
+        return reindexed
+
+    async def recount_knowledge_base(self, kb_id: int) -> None:
+        """按 knowledge_base_files / chunks 实际行数重算知识库的 file_count、chunk_count。"""
+        file_count = select(func.count()).select_from(KnowledgeBaseFile).where(
+            KnowledgeBaseFile.knowledge_base_id == kb_id
+        ).scalar_subquery()
+        chunk_count = select(func.count()).select_from(Chunk).where(
+            Chunk.knowledge_base_id == kb_id
+        ).scalar_subquery()
+        await self.db.execute(
+            update(KnowledgeBase)
+            .where(KnowledgeBase.id == kb_id)
+            .values(file_count=file_count, chunk_count=chunk_count)
+        )
+        await self.db.commit()
+
     def _tokenize_for_keywords(self, text: str, min_len: int = 1, max_len: int = 8) -> List[str]:
         """把句子切分为可用于 LIKE 的关键词（按标点/空格），过滤长度。"""
         import re
@@ -1313,25 +1362,39 @@ class KnowledgeBaseService:
         knowledge_base_id: Optional[int] = None,
         knowledge_base_ids: Optional[List[int]] = None,
         top_k: int = 20,
+        query_vec: Optional[List[float]] = None,
     ) -> List[Dict[str, Any]]:
-        """以文搜图：向量检索 + 全文检索 → RRF 混排 → Rerank → 返回图片文件列表。支持多选知识库。"""
+        """以文搜图：向量检索 + 全文检索 → RRF 混排 → Rerank → 返回图片文件列表。支持多选知识库。
+        query_vec 为调用方已算好的查询向量（如语义缓存取到的），不传则在此向量化。
+        """
         if not (query and query.strip()):
             return []
         kb_ids = knowledge_base_ids if knowledge_base_ids else ([knowledge_base_id] if knowledge_base_id is not None else None)
         q = query.strip()
         k = RRF_K
-        file_rrf: Dict[int, float] = {}
+        ranked: List[Tuple[int, int]] = []  # 向量与全文两路的 (file_id, rank)，最后统一做 RRF 融合
         file_info: Dict[int, tuple] = {}  # file_id -> (File, Chunk, snippet)
 
+        # 全文检索用的 LLM 扩词与向量检索互不依赖：先启动扩词，与「向量化 → 向量库 → 映射查库」并发，
+        # 两路总耗时从相加变为取较长者（全文检索本身与映射查库共用 self.db 会话，仍按顺序执行）
+        expand_task = (
+            asyncio.create_task(expand_image_search_terms(q, max_terms=6))
+            if getattr(settings, "RAG_IMAGE_SEARCH_EXPAND_TERMS", True)
+            else None
+        )
+
         # 1) 向量检索（提高召回量，避免相关图排太靠后被截断）
         try:
-            query_vec = await get_embedding(q)
+            if query_vec is None:
+                query_vec = await get_embedding(q)
             vs = get_vector_client()
             if kb_ids:
                 filter_expr = f"knowledge_base_id in [{','.join(str(i) for i in kb_ids)}]" if len(kb_ids) > 1 else f"knowledge_base_id == {kb_ids[0]}"
             else:
                 filter_expr = None
-            hits = vs.search(
+            # 向量 SDK 为同步调用，放线程池执行，避免阻塞事件循环（否则扩词请求也会被一起卡住）
+            hits = await asyncio.to_thread(
+                vs.search,
                 query_vector=query_vec,
                 top_k=min(500, top_k * 25),
                 filter_expr=filter_expr,
@@ -1359,18 +1422,22 @@ class KnowledgeBaseService:
             )
             if kb_ids is not None:
                 stmt = stmt.where(Chunk.knowledge_base_id.in_(kb_ids))
-            result = await self.db.execute(stmt)
+            try:
+                result = await self.db.execute(stmt)
+            except BaseException:
+                if expand_task is not None:
+                    expand_task.cancel()
+                raise
             for chunk, file in result.all():
-                rank = vid_to_rank.get(str(chunk.vector_id or ""), 9999)
-                file_rrf[file.id] = file_rrf.get(file.id, 0.0) + _rrf_score(rank, k)
+                ranked.append((file.id, vid_to_rank.get(str(chunk.vector_id or ""), 9999)))
                 if file.id not in file_info:
                     file_info[file.id] = (file, chunk, (chunk.content or "")[:300])
 
         # 2) 全文检索（仅图片），用 LLM 扩展同义/相关词以提高召回（狗→哈士奇/犬，森林→树林，太阳→阳光）
         extra_keywords: List[str] = []
-        if getattr(settings, "RAG_IMAGE_SEARCH_EXPAND_TERMS", True):
+        if expand_task is not None:
             try:
-                extra_keywords = await expand_image_search_terms(q, max_terms=6)
+                extra_keywords = await expand_task
             except Exception as e:
                 logging.debug("以文搜图 expand_image_search_terms 跳过: %s", e)
         try:
@@ -1379,21 +1446,18 @@ class KnowledgeBaseService:
                 top_k=top_k * 2, extra_keywords=extra_keywords or None,
             )
             for chunk, file, rank in ft_tuples:
-                file_rrf[file.id] = file_rrf.get(file.id, 0.0) + _rrf_score(rank, k)
+                ranked.append((file.id, rank))
                 if file.id not in file_info:
                     file_info[file.id] = (file, chunk, (chunk.content or "")[:300])
         except Exception as e:
             logging.warning(f"以文搜图全文检索失败: {e}")
 
-        if not file_rrf:
+        if not ranked:
             return []
 
-        # 3) 按 RRF 总分排序，取前 top_k*2 作为 rerank 候选
-        sorted_file_ids = sorted(
-            file_rrf.keys(),
-            key=lambda fid: file_rrf[fid],
-            reverse=True,
-        )[: min(top_k * 2, len(file_rrf))]
+        # 3) 两路 (file_id, rank) 一次融合为 RRF 总分，部分排序取前 top_k*2 作为 rerank 候选
+        file_rrf = rrf_fuse(ranked, k)
+        sorted_file_ids = top_n_by_score(file_rrf, top_k * 2)
         candidates = []
         for fid in sorted_file_ids:
             if fid not in file_info:
@@ -1432,26 +1496,29 @@ class KnowledgeBaseService:
         knowledge_base_id: Optional[int] = None,
         knowledge_base_ids: Optional[List[int]] = None,
         top_k: int = 30,
+        query_vec: Optional[List[float]] = None,
     ) -> List[Dict[str, Any]]:
         """多模态检索统一：以文或以图一次查询，同时返回文档与图片（同一向量空间）。
-        若提供 image_bytes 则用图向量，否则用 query 文本向量。支持多选知识库。
+        若提供 image_bytes 则用图向量，否则用 query 文本向量（调用方已算好时经 query_vec 传入）。支持多选知识库。
         """
         if image_bytes:
             query_vec = await get_embedding_for_image(
                 image_bytes,
                 image_format="jpeg",
             )
-        elif query and query.strip():
+        elif query_vec is None:
+            if not (query and query.strip()):
+                return []
             query_vec = await get_embedding(query.strip())
-        else:
-            return []
         kb_ids = knowledge_base_ids if knowledge_base_ids else ([knowledge_base_id] if knowledge_base_id is not None else None)
         vs = get_vector_client()
         if kb_ids:
             filter_expr = f"knowledge_base_id in [{','.join(str(i) for i in kb_ids)}]" if len(kb_ids) > 1 else f"knowledge_base_id == {kb_ids[0]}"
         else:
             filter_expr = None
-        hits = vs.search(query_vector=query_vec, top_k=min(80, top_k * 2), filter_expr=filter_expr) or []
+        hits = await asyncio.to_thread(
+            vs.search, query_vector=query_vec, top_k=min(80, top_k * 2), filter_expr=filter_expr
+        ) or []
         vector_ids = []
         id_to_score = {}
         for rank, h in enumerate(hits if isinstance(hits, list) else []):
@@ -1482,10 +1549,14 @@ class KnowledgeBaseService:
         result = await self.db.execute(stmt)
         rows = result.all()
         vid_to_rank = {vid: i for i, vid in enumerate(vector_ids)}
+        # 先按 (向量排名, 行序) 部分排序取前 top_k，只为最终返回的行组装结果 dict
+        ranked_rows = heapq.nsmallest(
+            top_k,
+            ((vid_to_rank.get(str(chunk.vector_id), 9999), i) for i, (chunk, _) in enumerate(rows)),
+        )
         items = []
-        for chunk, file in rows:
-            rank = vid_to_rank.get(str(chunk.vector_id), 9999)
-            score = id_to_score.get(str(chunk.vector_id), 1.0 - rank / 100)
+        for rank, i in ranked_rows:
+            chunk, file = rows[i]
             items.append({
                 "chunk_id": chunk.id,
                 "file_id": file.id,
@@ -1493,14 +1564,10 @@ class KnowledgeBaseService:
                 "original_filename": file.original_filename or file.filename,
                 "file_type": file.file_type or "",
                 "snippet": (chunk.content or "")[:300],
-                "score": score,
+                "score": id_to_score.get(str(chunk.vector_id), 1.0 - rank / 100),
                 "is_image": (file.file_type or "").lower() in ("jpeg", "jpg", "png"),
-                "_rank": rank,
             })
-        items.sort(key=lambda x: x["_rank"])
-        for x in items:
-            del x["_rank"]
-        return items[:top_k]
+        return items
 
     async def search_images_by_image(
         self,
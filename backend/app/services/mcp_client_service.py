@@ -12,7 +12,7 @@ import json
 import logging
 import os
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 logger = logging.getLogger(__name__)
 
@@ -221,9 +221,12 @@ def _wrap_client_timeout(client: Any, read_timeout: float) -> Any:
     return client
 
 
-def _parse_config(config_json: str) -> Dict[str, Any]:
+def _parse_config(config_json: Union[str, Dict[str, Any], None]) -> Dict[str, Any]:
+    """config 列已是 JSON 类型时直接返回 dict；兼容旧调用方传入的 JSON 字符串。"""
     if not config_json:
         return {}
+    if isinstance(config_json, dict):
+        return config_json
     try:
         return json.loads(config_json)
     except json.JSONDecodeError:
@@ -244,7 +247,7 @@ def _is_dashscope_mcp_url(url: str) -> bool:
     return "dashscope.aliyuncs.com" in u and "/mcps/" in u and "/mcp" in u
 
 
-async def _list_tools_once(transport_type: str, config_json: str) -> List[Dict[str, Any]]:
+async def _list_tools_once(transport_type: str, config_json: Union[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
     """单次列举工具，不做重试。"""
     config = _parse_config(config_json)
     async with _session_for_server(transport_type, config) as streams:
@@ -264,7 +267,7 @@ async def _list_tools_once(transport_type: str, config_json: str) -> List[Dict[s
 
 async def _call_tool_once(
     transport_type: str,
-    config_json: str,
+    config_json: Union[str, Dict[str, Any]],
     tool_name: str,
     arguments: Optional[Dict[str, Any]] = None,
 ) -> str:
@@ -357,7 +360,7 @@ def _session_for_server(transport_type: str, config: Dict[str, Any]):
     raise ValueError(f"不支持的 transport_type: {transport_type}")
 
 
-async def list_tools_from_server(transport_type: str, config_json: str) -> List[Dict[str, Any]]:
+async def list_tools_from_server(transport_type: str, config_json: Union[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     连接 MCP 服务并返回工具列表。
     返回格式: [ {"name": str, "description": str, "inputSchema": dict}, ... ]
@@ -379,7 +382,7 @@ async def list_tools_from_server(transport_type: str, config_json: str) -> List[
 
 async def call_tool_on_server(
     transport_type: str,
-    config_json: str,
+    config_json: Union[str, Dict[str, Any]],
     tool_name: str,
     arguments: Optional[Dict[str, Any]] = None,
 ) -> str:
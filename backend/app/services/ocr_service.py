@@ -2,7 +2,7 @@
 图片 OCR 服务：用 LLM 从图片中提取文字；若无文字则让 LLM 描述图片。
 目标：返回一段用于检索的文本（有字则 OCR 结果，无字则描述），供后续分块与向量化。
 """
-import base64
+import pybase64
 import logging
 import re
 
@@ -79,7 +79,7 @@ async def extract_text_from_image(content: bytes, file_type: str) -> str:
         return ""
 
     mime = _mime_for_ext(file_type)
-    b64 = base64.standard_b64encode(content).decode("ascii")
+    b64 = pybase64.standard_b64encode(content).decode("ascii")
     data_url = f"data:{mime};base64,{b64}"
 
     api_key = settings.DASHSCOPE_API_KEY or settings.OPENAI_API_KEY
@@ -1,5 +1,6 @@
 """
 用量与限流：按用户限制上传量、对话条数、检索 QPS，使用 Redis 计数
+限流判定走 redis.asyncio + Lua（INCR/EXPIRE 原子一次往返），不阻塞事件循环
 """
 import time
 import logging
@@ -10,44 +11,71 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-_redis_client = None
+# INCR + 首次 EXPIRE 原子执行，一次 EVALSHA 往返
+_INCR_EXPIRE_LUA = """
+local n = redis.call('INCR', KEYS[1])
+if n == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return n
+"""
+
+_async_redis_client = None
+_incr_expire_script = None
 
 
-def _get_redis():
-    """获取 Redis 客户端（懒加载）"""
-    global _redis_client
-    if _redis_client is None:
+def _get_async_redis():
+    """获取 redis.asyncio 客户端（懒加载），限流路径不阻塞事件循环。"""
+    global _async_redis_client
+    if _async_redis_client is None:
         try:
-            import redis
-            _redis_client = redis.Redis.from_url(
+            import redis.asyncio as aioredis
+            # 阻塞式连接池：连接数到上限时短暂等待空闲连接，而不是直接报 Too many connections
+            pool = aioredis.BlockingConnectionPool.from_url(
                 settings.REDIS_URL,
                 decode_responses=True,
+                max_connections=int(getattr(settings, "REDIS_MAX_CONNECTIONS", 50)),
+                timeout=float(getattr(settings, "REDIS_SOCKET_TIMEOUT_SEC", 3.0)),
                 socket_connect_timeout=float(getattr(settings, "REDIS_SOCKET_CONNECT_TIMEOUT_SEC", 2.5)),
                 socket_timeout=float(getattr(settings, "REDIS_SOCKET_TIMEOUT_SEC", 3.0)),
             )
+            _async_redis_client = aioredis.Redis(connection_pool=pool)
         except Exception as e:
-            logger.warning("Redis 连接失败，限流将不生效: %s", e)
-    return _redis_client
+            logger.warning("异步 Redis 连接失败，限流将不生效: %s", e)
+    return _async_redis_client
+
+
+async def _incr_with_expire(key: str, expire_sec: int) -> Optional[int]:
+    """原子自增计数并在首次写入时设置过期；Redis 不可用返回 None。"""
+    global _incr_expire_script
+    r = _get_async_redis()
+    if not r:
+        return None
+    if _incr_expire_script is None:
+        _incr_expire_script = r.register_script(_INCR_EXPIRE_LUA)
+    return int(await _incr_expire_script(keys=[key], args=[expire_sec]))
 
 
-def check_and_incr_upload(user_id: int) -> tuple[bool, int, int]:
+def seconds_until_utc_midnight() -> int:
+    """距 UTC 次日零点的秒数（每日计数的重置时间）。"""
+    now = datetime.now(timezone.utc)
+    return max(1, 86400 - (now.hour * 3600 + now.minute * 60 + now.second))
+
+
+async def check_and_incr_upload(user_id: int) -> tuple[bool, int, int]:
     """
     检查并增加当日上传计数。返回 (是否允许, 当前计数, 每日上限)。
     若未启用限流或 Redis 不可用，返回 (True, 0, limit)。
     """
-    if not getattr(settings, "RATE_LIMIT_ENABLED", True):
-        return True, 0, getattr(settings, "RATE_LIMIT_UPLOAD_PER_DAY", 500)
     limit = getattr(settings, "RATE_LIMIT_UPLOAD_PER_DAY", 500)
-    r = _get_redis()
-    if not r:
+    if not getattr(settings, "RATE_LIMIT_ENABLED", True):
         return True, 0, limit
-    from datetime import datetime
     day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     key = f"rate:upload:user:{user_id}:day:{day}"
     try:
-        n = r.incr(key)
-        if n == 1:
-            r.expire(key, 86400 * 2)
+        n = await _incr_with_expire(key, 86400 * 2)
+        if n is None:
+            return True, 0, limit
         logger.debug("rate upload user_id=%s count=%s limit=%s allowed=%s", user_id, n, limit, n <= limit)
         return (n <= limit, n, limit)
     except Exception as e:
@@ -55,21 +83,17 @@ def check_and_incr_upload(user_id: int) -> tuple[bool, int, int]:
         return True, 0, limit
 
 
-def check_and_incr_conversation(user_id: int) -> tuple[bool, int, int]:
+async def check_and_incr_conversation(user_id: int) -> tuple[bool, int, int]:
     """检查并增加当日对话条数。返回 (是否允许, 当前计数, 每日上限)。"""
-    if not getattr(settings, "RATE_LIMIT_ENABLED", True):
-        return True, 0, getattr(settings, "RATE_LIMIT_CONVERSATION_PER_DAY", 200)
     limit = getattr(settings, "RATE_LIMIT_CONVERSATION_PER_DAY", 200)
-    r = _get_redis()
-    if not r:
+    if not getattr(settings, "RATE_LIMIT_ENABLED", True):
         return True, 0, limit
-    from datetime import datetime
     day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     key = f"rate:chat:user:{user_id}:day:{day}"
     try:
-        n = r.incr(key)
-        if n == 1:
-            r.expire(key, 86400 * 2)
+        n = await _incr_with_expire(key, 86400 * 2)
+        if n is None:
+            return True, 0, limit
         logger.debug("rate conversation user_id=%s count=%s limit=%s allowed=%s", user_id, n, limit, n <= limit)
         return (n <= limit, n, limit)
     except Exception as e:
@@ -77,21 +101,18 @@ def check_and_incr_conversation(user_id: int) -> tuple[bool, int, int]:
         return True, 0, limit
 
 
-def check_and_incr_search_qps(user_id: int) -> tuple[bool, int, float]:
+async def check_and_incr_search_qps(user_id: int) -> tuple[bool, int, float]:
     """检查并增加当前秒检索计数（QPS）。返回 (是否允许, 当前秒内请求数, QPS 上限)。"""
-    if not getattr(settings, "RATE_LIMIT_ENABLED", True):
-        return True, 0, getattr(settings, "RATE_LIMIT_SEARCH_QPS", 10.0)
     limit_qps = getattr(settings, "RATE_LIMIT_SEARCH_QPS", 10.0)
-    limit = int(limit_qps) if limit_qps >= 1 else 1
-    r = _get_redis()
-    if not r:
+    if not getattr(settings, "RATE_LIMIT_ENABLED", True):
         return True, 0, limit_qps
+    limit = int(limit_qps) if limit_qps >= 1 else 1
     sec = int(time.time())
     key = f"rate:search:user:{user_id}:sec:{sec}"
     try:
-        n = r.incr(key)
-        if n == 1:
-            r.expire(key, 2)
+        n = await _incr_with_expire(key, 2)
+        if n is None:
+            return True, 0, limit_qps
         logger.debug("rate search_qps user_id=%s count=%s limit=%s allowed=%s", user_id, n, limit_qps, n <= limit)
         return (n <= limit, n, limit_qps)
     except Exception as e:
@@ -99,23 +120,22 @@ def check_and_incr_search_qps(user_id: int) -> tuple[bool, int, float]:
         return True, 0, limit_qps
 
 
-def get_usage_snapshot(user_id: int) -> dict:
-    """获取当前用户用量快照（用于仪表盘）：当日上传数、当日对话数、当前秒检索数及对应上限。"""
-    from datetime import datetime
+async def aget_usage_snapshot(user_id: int) -> dict:
+    """获取当前用量快照（用于仪表盘）：当日上传数、当日对话数、当前秒检索数及对应上限。三个计数一次 MGET 读取。"""
     day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     sec = int(time.time())
-    r = _get_redis()
-    upload_key = f"rate:upload:user:{user_id}:day:{day}"
-    chat_key = f"rate:chat:user:{user_id}:day:{day}"
-    search_key = f"rate:search:user:{user_id}:sec:{sec}"
+    r = _get_async_redis()
+    keys = [
+        f"rate:upload:user:{user_id}:day:{day}",
+        f"rate:chat:user:{user_id}:day:{day}",
+        f"rate:search:user:{user_id}:sec:{sec}",
+    ]
     upload_count = 0
     chat_count = 0
     search_count = 0
     if r:
         try:
-            upload_count = int(r.get(upload_key) or 0)
-            chat_count = int(r.get(chat_key) or 0)
-            search_count = int(r.get(search_key) or 0)
+            upload_count, chat_count, search_count = (int(v or 0) for v in await r.mget(keys))
         except Exception:
             pass
     out = {
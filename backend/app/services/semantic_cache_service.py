@@ -0,0 +1,143 @@
+"""
+检索语义缓存：以文搜图 / 统一检索按「查询向量」复用近期结果，命中时省掉向量库、全文检索与 Rerank 往返。
+- 查询向量：按 (模型, 查询文本) 哈希存 Redis（cache:sem:emb:*），相同问题跨实例复用，不再调 Embedding API
+- 结果：按 (检索类型, user_id, 知识库范围, top_k) 划分命名空间，行数据存 Redis（cache:sem:rows:*，TTL=CACHE_TTL_DETAIL）；
+  进程内只保留各命名空间最近的查询向量（TTLCache 按命名空间数 LRU 淘汰，单命名空间按条数 LRU），余弦相似度 >= 阈值即视为命中
+命名空间含 user_id，不同用户之间不会串结果；知识库内容变更后最长陈旧时间为 CACHE_TTL_DETAIL。
+"""
+import hashlib
+import logging
+import math
+import operator
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.core.ttl_cache import TTLCache
+from app.services import cache_service
+from app.services.embedding_service import get_embedding
+
+logger = logging.getLogger(__name__)
+
+
+def _enabled() -> bool:
+    return bool(getattr(settings, "SEMANTIC_CACHE_ENABLED", True)) and bool(getattr(settings, "CACHE_ENABLED", True))
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "CACHE_TTL_DETAIL", 60))
+
+
+def _norm(vec: Sequence[float]) -> float:
+    return math.sqrt(sum(map(operator.mul, vec, vec)))
+
+
+class SemanticQueryCache:
+    """按命名空间维护近期查询向量的小型索引；结果行存 Redis，索引只存向量与条目 id。"""
+
+    def __init__(self, max_namespaces: int, max_entries: int, threshold: float, ttl: float):
+        self.max_entries = max(1, int(max_entries))
+        self.threshold = float(threshold)
+        # 命名空间 -> OrderedDict[entry_id, (vec, norm)]；整个命名空间随 TTL 过期，与 Redis 中的行数据同寿命
+        self._index = TTLCache(maxsize=max_namespaces, ttl=ttl)
+
+    @staticmethod
+    def namespace(kind: str, user_id: int, kb_ids: Optional[Sequence[int]], top_k: int) -> str:
+        scope = ",".join(str(i) for i in sorted(kb_ids)) if kb_ids else "all"
+        return f"{kind}:u{user_id}:kb{scope}:k{top_k}"
+
+    def _best_match(self, ns: str, vec: Sequence[float]) -> Optional[str]:
+        entries: Optional["OrderedDict[str, tuple]"] = self._index.get(ns)
+        if not entries:
+            return None
+        norm = _norm(vec)
+        if norm == 0.0:
+            return None
+        best_id, best_sim = None, self.threshold
+        for entry_id, (cached_vec, cached_norm) in entries.items():
+            if len(cached_vec) != len(vec) or cached_norm == 0.0:
+                continue
+            sim = sum(map(operator.mul, vec, cached_vec)) / (norm * cached_norm)
+            if sim >= best_sim:
+                best_id, best_sim = entry_id, sim
+        if best_id is not None:
+            entries.move_to_end(best_id)
+            logger.debug("语义缓存 hit ns=%s sim=%.4f", ns, best_sim)
+        return best_id
+
+    async def alookup(self, ns: str, vec: Optional[Sequence[float]]) -> Optional[List[Dict[str, Any]]]:
+        """相似查询命中且 Redis 中行数据仍在时返回缓存行，否则 None。"""
+        if not vec or not _enabled():
+            return None
+        entry_id = self._best_match(ns, vec)
+        if entry_id is None:
+            return None
+        rows = await cache_service.aget(key_sem_rows(ns, entry_id))
+        if rows is None:
+            entries = self._index.get(ns)
+            if entries is not None:
+                entries.pop(entry_id, None)
+        return rows
+
+    async def astore(self, ns: str, vec: Optional[Sequence[float]], rows: List[Dict[str, Any]]) -> None:
+        """写入一条 (查询向量, 结果行)；单命名空间超过 max_entries 时淘汰最久未命中的条目。"""
+        if not vec or not _enabled():
+            return
+        norm = _norm(vec)
+        if norm == 0.0:
+            return
+        entry_id = uuid.uuid4().hex[:16]
+        if not await cache_service.aset(key_sem_rows(ns, entry_id), rows, ttl=_ttl()):
+            return
+        entries = self._index.get(ns)
+        if entries is None:
+            entries = OrderedDict()
+            self._index.set(ns, entries)
+        entries[entry_id] = (list(vec), norm)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._index.clear()
+
+
+semantic_query_cache = SemanticQueryCache(
+    max_namespaces=getattr(settings, "SEMANTIC_CACHE_MAX_NAMESPACES", 2000),
+    max_entries=getattr(settings, "SEMANTIC_CACHE_MAX_ENTRIES", 32),
+    threshold=getattr(settings, "SEMANTIC_CACHE_THRESHOLD", 0.97),
+    ttl=_ttl(),
+)
+
+
+async def aget_query_embedding(text: str) -> Optional[List[float]]:
+    """
+    查询文本向量（先查 Redis，未命中再调 Embedding 并回写）。失败返回 None，由检索服务自行向量化。
+    """
+    q = (text or "").strip()
+    if not q:
+        return None
+    key = key_sem_embedding(q)
+    if _enabled():
+        cached = await cache_service.aget(key)
+        if isinstance(cached, list) and cached:
+            return cached
+    try:
+        vec = await get_embedding(q)
+    except Exception as e:
+        logger.warning("检索查询向量化失败: %s", e)
+        return None
+    if _enabled() and vec and any(vec):
+        await cache_service.aset(key, vec, ttl=int(getattr(settings, "SEMANTIC_CACHE_EMBEDDING_TTL", 3600)))
+    return vec
+
+
+# ---------- key 约定（均位于 CACHE_KEY_PREFIX 之下，即 cache:sem:*） ---------- #
+def key_sem_embedding(text: str) -> str:
+    model = getattr(settings, "EMBEDDING_MODEL", "")
+    digest = hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()[:32]
+    return f"sem:emb:{digest}"
+
+
+def key_sem_rows(ns: str, entry_id: str) -> str:
+    return f"sem:rows:{ns}:{entry_id}"
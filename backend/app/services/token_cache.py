@@ -0,0 +1,53 @@
+"""
+鉴权结果进程内缓存：按 token 哈希缓存已校验的 UserResponse，避免每个请求都做 JWT 验签 + 查库。
+条目过期时间取 min(AUTH_TOKEN_CACHE_TTL_SEC, token 剩余有效期)；校验失败的 token 不缓存。
+"""
+import hashlib
+import logging
+import time
+from typing import Optional
+
+from jose import jwt
+
+from app.core.config import settings
+from app.core.ttl_cache import TTLCache
+from app.schemas.auth import UserResponse
+
+logger = logging.getLogger(__name__)
+
+_cache = TTLCache(
+    maxsize=getattr(settings, "AUTH_TOKEN_CACHE_MAXSIZE", 10000),
+    ttl=getattr(settings, "AUTH_TOKEN_CACHE_TTL_SEC", 30),
+)
+
+
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()[:16]
+
+
+def get_cached_user(token: str) -> Optional[UserResponse]:
+    """命中返回缓存的 UserResponse，未命中或未启用返回 None。"""
+    if not token or _cache.ttl <= 0:
+        return None
+    return _cache.get(_token_key(token))
+
+
+def cache_user(token: str, user: UserResponse) -> None:
+    """缓存已通过校验的用户；过期时间不超过 JWT exp。"""
+    if not token or _cache.ttl <= 0:
+        return
+    ttl = _cache.ttl
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+        if exp is not None:
+            ttl = min(ttl, float(exp) - time.time())
+    except Exception as e:
+        logger.debug("token exp 解析失败，按默认 TTL 缓存: %s", e)
+    if ttl > 0:
+        _cache.set(_token_key(token), user, ttl)
+
+
+def invalidate_token_cache(token: str) -> None:
+    """凭据变更（如修改密码）后清除该 token 的缓存条目。"""
+    if token:
+        _cache.pop(_token_key(token))
@@ -2,7 +2,7 @@
 视频内容理解：直接调用 qwen3-vl-plus 等原生支持视频的 VL 模型理解整段视频，
 无需 OpenCV 抽帧，支持至少 1 分钟及更长视频。
 """
-import base64
+import pybase64
 import logging
 
 from openai import AsyncOpenAI
@@ -35,7 +35,7 @@ async def extract_text_from_video(content: bytes, file_type: str) -> str:
         return "视频内容：未配置 API Key，无法解析。"
 
     mime = _mime_for_video_ext(file_type)
-    b64 = base64.standard_b64encode(content).decode("ascii")
+    b64 = pybase64.standard_b64encode(content).decode("ascii")
     data_url = f"data:{mime};base64,{b64}"
 
     client = AsyncOpenAI(
@@ -6,12 +6,14 @@
 """
 import asyncio
 import logging
+import traceback
 from typing import List, Any, Dict
 
 from app.core.database import create_async_engine_and_session_for_celery
 from app.services.knowledge_base_service import KnowledgeBaseService
 from app.models.knowledge_base import KnowledgeBaseFile
 from sqlalchemy import select
+from celery import states
 
 from app.celery_app import celery_app
 from app.services import cache_service
@@ -29,6 +31,25 @@ def _run_async(coro):
         loop.close()
 
 
+def _record_outcome(task, run):
+    """
+    执行 run() 并返回结果。以 ignore_result 投递的任务（send_without_result_wait）Worker 不会自动保存结果，
+    这里显式写入 STARTED / SUCCESS / FAILURE，GET /tasks/{task_id} 轮询照常可用。
+    """
+    record = bool(getattr(task.request, "ignore_result", False))
+    if record:
+        task.update_state(state=states.STARTED)
+    try:
+        result = run()
+    except Exception as e:
+        if record:
+            task.backend.mark_as_failure(task.request.id, e, traceback=traceback.format_exc(), request=task.request)
+        raise
+    if record:
+        task.backend.mark_as_done(task.request.id, result, request=task.request)
+    return result
+
+
 def _with_celery_db(async_fn):
     """在任务内创建当前 loop 的 engine/session，执行 async_fn(db)，用完后 dispose engine。"""
     async def _run():
@@ -52,9 +73,9 @@ def add_files_to_kb_task(self, kb_id: int, file_ids: List[int], user_id: int) ->
             await db.commit()
             await db.refresh(kb)
         try:
-            cache_service.delete(cache_service.key_kb_detail(kb_id))
-            cache_service.delete_by_prefix(cache_service.prefix_user_kb_list(user_id))
-            cache_service.delete(cache_service.key_dashboard_stats(user_id))
+            cache_service.delete_many(
+                [cache_service.key_kb_detail(kb_id), cache_service.key_dashboard_stats(user_id), *cache_service.kb_list_keys(user_id)]
+            )
         except Exception as ce:
             logger.debug("Celery 任务后缓存失效失败（不影响结果）: %s", ce)
         return {
@@ -92,7 +113,7 @@ def reindex_file_in_kb_task(self, kb_id: int, file_id: int, user_id: int) -> Dic
         }
 
     try:
-        return _run_async(_with_celery_db(_run)())
+        return _record_outcome(self, lambda: _run_async(_with_celery_db(_run)()))
     except Exception as e:
         logger.exception("reindex_file_in_kb_task failed: %s", e)
         raise
@@ -140,7 +161,7 @@ def reindex_all_in_kb_task(self, kb_id: int, user_id: int) -> Dict[str, Any]:
         }
 
     try:
-        return _run_async(_with_celery_db(_run)())
+        return _record_outcome(self, lambda: _run_async(_with_celery_db(_run)()))
     except Exception as e:
         logger.exception("reindex_all_in_kb_task failed: %s", e)
         raise
@@ -0,0 +1,46 @@
+"""
+在 API 进程中提交 Celery 任务：task.delay() 是阻塞调用（连接 broker / result backend），
+放到专用的小线程池中执行，Broker 抖动时堆积的提交不会占满默认线程池、拖慢其他 to_thread 调用。
+"""
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.celery_app import celery_app
+from app.core.config import settings
+
+# 提交 Celery 任务时的超时（秒），避免 delay() 连接 result backend 时无限阻塞
+CELERY_SUBMIT_TIMEOUT = float(getattr(settings, "CELERY_SUBMIT_TIMEOUT_SEC", 10.0))
+
+_executor = ThreadPoolExecutor(
+    max_workers=max(1, int(getattr(settings, "CELERY_SUBMIT_MAX_WORKERS", 4))),
+    thread_name_prefix="celery-submit",
+)
+
+
+async def submit_celery_task(submit_fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    在专用线程池中执行 submit_fn(*args)（如 task.delay、send_without_result_wait），超时则抛 asyncio.TimeoutError。
+    参数直接交给 run_in_executor，调用方无需再包一层 lambda。
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(_executor, submit_fn, *args),
+        timeout=CELERY_SUBMIT_TIMEOUT,
+    )
+
+
+def send_without_result_wait(task, *args: Any) -> str:
+    """
+    以 ignore_result 方式投递（send_task）：不在提交端订阅结果频道，少一次 result backend 往返；
+    task_id 在本端生成并返回供轮询，结果由 Worker 侧显式写入（见 kb_tasks._record_outcome）。
+    """
+    task_id = str(uuid.uuid4())
+    celery_app.send_task(task.name, args=args, task_id=task_id, ignore_result=True)
+    return task_id
+
+
+def shutdown_submit_executor() -> None:
+    """应用关闭时调用：不等待仍卡在 broker 上的提交，未开始的直接取消。"""
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,5 @@
+-- messages 表增加 agent_trace（智能体执行轨迹）、thinking_seconds（思考耗时）列
+-- MySQL；PostgreSQL 将 LONGTEXT 改为 TEXT、DOUBLE 改为 DOUBLE PRECISION。列已存在时可忽略报错。
+
+ALTER TABLE messages ADD COLUMN agent_trace LONGTEXT NULL;
+ALTER TABLE messages ADD COLUMN thinking_seconds DOUBLE NULL;
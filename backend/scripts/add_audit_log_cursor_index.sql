@@ -0,0 +1,4 @@
+-- audit_logs 游标分页复合索引（按用户、时间倒序翻页）
+-- MySQL / PostgreSQL 通用；索引已存在时可忽略报错（PostgreSQL 可改为 CREATE INDEX IF NOT EXISTS）。
+
+CREATE INDEX ix_audit_logs_user_created_id ON audit_logs (user_id, created_at, id);
@@ -0,0 +1,7 @@
+-- 分页 / 排序谓词对应的复合索引（会话列表、会话消息、用量统计、按文件取分块）
+-- MySQL / PostgreSQL 通用片段；若索引已存在可忽略对应报错（PostgreSQL 可改为 CREATE INDEX IF NOT EXISTS）。
+
+CREATE INDEX ix_conversations_user_updated ON conversations (user_id, updated_at);
+CREATE INDEX ix_messages_conv_created_id ON messages (conversation_id, created_at, id);
+CREATE INDEX ix_usage_records_user_created ON usage_records (user_id, created_at);
+CREATE INDEX ix_chunks_file_chunk_index ON chunks (file_id, chunk_index);
@@ -0,0 +1,5 @@
+-- files / knowledge_bases 按 user_id 计数与过滤的单列索引（早于模型声明 index=True 建的旧表缺失）
+-- MySQL / PostgreSQL 通用；索引已存在时可忽略报错（PostgreSQL 可改为 CREATE INDEX IF NOT EXISTS）。
+
+CREATE INDEX ix_files_user_id ON files (user_id);
+CREATE INDEX ix_knowledge_bases_user_id ON knowledge_bases (user_id);
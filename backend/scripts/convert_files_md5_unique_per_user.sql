@@ -0,0 +1,10 @@
+-- files.md5_hash 由全局唯一改为 (user_id, md5_hash) 唯一：不同用户上传相同文件各自保留一条记录
+-- 先建复合唯一索引，再删除旧的单列唯一约束；按数据库类型执行对应段落。
+
+CREATE UNIQUE INDEX uq_files_user_md5 ON files (user_id, md5_hash);
+
+-- PostgreSQL（约束名以 \d files 实际显示为准）
+ALTER TABLE files DROP CONSTRAINT IF EXISTS files_md5_hash_key;
+
+-- MySQL（索引名以 SHOW INDEX FROM files 实际显示为准）
+-- ALTER TABLE files DROP INDEX md5_hash;
@@ -0,0 +1,10 @@
+-- mcp_servers.config 由 TEXT（JSON 字符串）改为原生 JSON（PostgreSQL 为 JSONB）
+-- 按数据库类型执行对应段落；列已是目标类型时无需执行。
+
+UPDATE mcp_servers SET config = '{}' WHERE config IS NULL OR config = '';
+
+-- PostgreSQL
+ALTER TABLE mcp_servers ALTER COLUMN config TYPE JSONB USING config::jsonb;
+
+-- MySQL
+-- ALTER TABLE mcp_servers MODIFY COLUMN config JSON NOT NULL;
@@ -0,0 +1,13 @@
+-- messages.sources 由 TEXT（JSON 字符串）改为原生 JSON，confidence 由 TEXT 改为浮点
+-- 按数据库类型执行对应段落；列已是目标类型时无需执行。
+
+UPDATE messages SET sources = NULL WHERE sources = '';
+
+-- PostgreSQL
+ALTER TABLE messages ALTER COLUMN sources TYPE JSONB USING sources::jsonb;
+ALTER TABLE messages ALTER COLUMN confidence TYPE DOUBLE PRECISION USING NULLIF(confidence, '')::double precision;
+
+-- MySQL
+-- UPDATE messages SET confidence = NULL WHERE confidence = '';
+-- ALTER TABLE messages MODIFY COLUMN sources JSON NULL;
+-- ALTER TABLE messages MODIFY COLUMN confidence DOUBLE NULL;
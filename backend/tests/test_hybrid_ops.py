@@ -1,7 +1,7 @@
 """混合检索公共算子单测（改造 C-3）。"""
 import unittest
 
-from app.infrastructure.rag.hybrid_ops import rrf_score
+from app.infrastructure.rag.hybrid_ops import rrf_fuse, rrf_score, top_n_by_score
 
 
 class TestHybridOps(unittest.TestCase):
@@ -11,6 +11,17 @@ class TestHybridOps(unittest.TestCase):
     def test_rrf_score_higher_rank_lower_score(self):
         self.assertGreater(rrf_score(1, 60), rrf_score(5, 60))
 
+    def test_rrf_fuse_sums_across_lists(self):
+        scores = rrf_fuse([("a", 1), ("b", 2), ("b", 1)], k=60)
+        self.assertAlmostEqual(scores["a"], rrf_score(1, 60))
+        self.assertAlmostEqual(scores["b"], rrf_score(2, 60) + rrf_score(1, 60))
+
+    def test_top_n_by_score_matches_full_sort(self):
+        scores = {"a": 0.1, "b": 0.3, "c": 0.3, "d": 0.2}
+        expected = sorted(scores, key=lambda x: scores[x], reverse=True)[:3]
+        self.assertEqual(top_n_by_score(scores, 3), expected)
+        self.assertEqual(top_n_by_score(scores, 0), [])
+
 
 if __name__ == "__main__":
     unittest.main()
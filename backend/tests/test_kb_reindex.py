@@ -0,0 +1,45 @@
+"""批量重索引：单个文件失败不影响其余文件计数，结束后仍按实际行数重算（依赖 DB 栈导入）。"""
+import unittest
+from unittest import mock
+
+from app.services.knowledge_base_service import KnowledgeBaseService
+
+
+class _FakeSession:
+    def __init__(self):
+        self.rollback = mock.AsyncMock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class TestReindexFilesConcurrently(unittest.IsolatedAsyncioTestCase):
+    async def test_one_failure_is_isolated(self):
+        sessions = []
+
+        def _session_factory():
+            s = _FakeSession()
+            sessions.append(s)
+            return s
+
+        async def _reindex(self, kb_id, file_id, user_id):
+            if file_id == 2:
+                raise RuntimeError("boom")
+            return None
+
+        svc = KnowledgeBaseService(mock.MagicMock())
+        with mock.patch("app.core.database.AsyncSessionLocal", _session_factory), mock.patch.object(
+            KnowledgeBaseService, "reindex_file_in_knowledge_base", _reindex
+        ), mock.patch.object(KnowledgeBaseService, "recount_knowledge_base", mock.AsyncMock()) as recount:
+            n = await svc.reindex_files_concurrently(7, [1, 2, 3], user_id=1)
+
+        self.assertEqual(n, 2)
+        recount.assert_awaited_once_with(7)
+        self.assertEqual(sum(s.rollback.await_count for s in sessions), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,20 @@
+"""请求 ID 生成（无外部依赖）。"""
+import re
+import unittest
+
+from app.core.reqid import new_request_id
+
+
+class TestNewRequestId(unittest.TestCase):
+    def test_format(self):
+        rid = new_request_id()
+        self.assertIsInstance(rid, bytes)
+        self.assertRegex(rid.decode("ascii"), re.compile(r"^[0-9a-f]{32}$"))
+
+    def test_unique_across_refills(self):
+        ids = [new_request_id() for _ in range(64 * 3 + 5)]
+        self.assertEqual(len(set(ids)), len(ids))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -237,19 +237,14 @@ export default function ImageSearch() {
     setUnifiedResults([])
     try {
       if (file) {
-        const reader = new FileReader()
-        const base64 = await new Promise<string>((resolve, reject) => {
-          reader.onload = () => {
-            const result = reader.result
-            resolve(typeof result === 'string' ? result : '')
-          }
-          reader.onerror = reject
-          reader.readAsDataURL(file)
-        })
-        const res = await api.post<UnifiedSearchResponse>('/search/unified', {
-          image_base64: base64,
-          knowledge_base_ids: selectedKbIds.length ? selectedKbIds : null,
-          top_k: 30,
+        // 以图检索走 multipart 上传，免 base64 编码（请求体小约 1/3，服务端也不必再解码）
+        const fd = new FormData()
+        fd.append('file', file)
+        const params: Record<string, number | number[]> = { top_k: 30 }
+        if (selectedKbIds.length) params.knowledge_base_ids = selectedKbIds
+        const res = await api.post<UnifiedSearchResponse>('/search/unified/upload', fd, {
+          params,
+          paramsSerializer: { indexes: null },
         })
         setUnifiedResults(res.items || [])
         if (!(res.items?.length)) message.info('未找到相关内容')
@@ -30,7 +30,6 @@ export default function KnowledgeBases() {
   const [contentDrawerVisible, setContentDrawerVisible] = useState(false)
   const [kbFiles, setKbFiles] = useState<KnowledgeBaseFileItem[]>([])
   const [kbFilesLoading, setKbFilesLoading] = useState(false)
-  const [reindexingFileId, setReindexingFileId] = useState<number | null>(null)
   const [chunksModalVisible, setChunksModalVisible] = useState(false)
   const [chunksLoading, setChunksLoading] = useState(false)
   const [chunks, setChunks] = useState<ChunkItem[]>([])
@@ -165,7 +164,7 @@ export default function KnowledgeBases() {
       return
     }
     try {
-      const res = await api.get<TaskStatusResponse>(`/tasks/${tid}`)
+      const res = await api.get<TaskStatusResponse>(`/tasks/${tid}`, { params: { status_only: true } })
       setTaskStatus(res)
       if (res.status === 'SUCCESS') {
         if (pollRef.current) clearInterval(pollRef.current)
@@ -375,22 +374,6 @@ export default function KnowledgeBases() {
     }
   }
 
-  const handleReindexFile = async (fileId: number) => {
-    if (!currentKb) return
-    setReindexingFileId(fileId)
-    try {
-      await api.post(`/knowledge-bases/${currentKb.id}/files/${fileId}/reindex`)
-      message.success('已重新索引，分块与向量已更新')
-      fetchKbFiles(currentKb.id)
-      fetchKnowledgeBases()
-    } catch (e: unknown) {
-      const err = e as { response?: { data?: { detail?: string } } }
-      message.error(err.response?.data?.detail || '重新索引失败')
-    } finally {
-      setReindexingFileId(null)
-    }
-  }
-
   const handleReindexFileAsync = async (fileId: number) => {
     if (!currentKb) return
     try {
@@ -818,18 +801,10 @@ export default function KnowledgeBases() {
                     type="link"
                     size="small"
                     icon={<ReloadOutlined />}
-                    loading={reindexingFileId === row.file_id}
-                    onClick={() => handleReindexFile(row.file_id)}
-                  >
-                    重新索引
-                  </Button>
-                  <Button
-                    type="link"
-                    size="small"
                     loading={reindexFileTaskId !== null && reindexFileId === row.file_id}
                     onClick={() => handleReindexFileAsync(row.file_id)}
                   >
-                    重新索引（后台）
+                    重新索引
                   </Button>
                   <Popconfirm
                     title="确定从本知识库移除该文件？分块与向量将被删除。"